@@ -1,493 +1,1175 @@
+import os
+from datetime import timedelta
+
 import streamlit as st
 import pandas as pd
-from io import BytesIO
-
-from modules.data_loader import load_csv
-from modules.analyzer import apply_filters, compute_statistics
-from modules.plotter import generate_plot
 
-from database import init_db, save_dataset, list_datasets, load_dataset, save_history
+from modules.data_loader import load_csv, load_many, align_schemas
+from modules.analyzer import (apply_filters, filter_positions, compute_statistics, aggregate, summarize,
+                              statistics_from_summary, rollup, aggregate_from_rollup, RESAMPLE_FREQUENCIES,
+                              choose_frequency, resample_rollup, resample_from_rollup, resample_aggregate,
+                              profile_dataset)
+from modules.plotter import generate_plot, plot_correlation, plot_histograms
+from modules import exporter
+from modules.compression import available_codecs
+from modules.metrics import PerfRecorder, ProfileCapture
+from modules.pager import ResultPager, SqlResultPager
+from modules.categorical import ValueDictionary
+from modules.sampling import SAMPLE_SIZE, SAMPLE_THRESHOLD, get_executor
+
+from modules.history import record_operation
+from modules.registry import get_registry
+from database import (init_db, save_dataset_version, save_partitioned_dataset, list_datasets, load_dataset,
+                      get_dataset_info, list_versions, list_partitions, dataset_schema, query_dataset,
+                      query_statistics, query_aggregate, query_resample, iter_query_dataset, column_bounds,
+                      value_counts, count_rows, load_sample,
+                      save_cache, load_cache, query_history, save_metrics, BASE_DIR, STORAGE_FORMATS, DEFAULT_STORAGE,
+                      DEFAULT_CODEC)
 
 
 # ======================================================
 # FUNZIONI DI EXPORT
 # ======================================================
-def export_to_pdf_chart(fig, filename):
-    """Esporta un grafico Matplotlib in formato PDF.
+def _show_export(exported):
+    """Mostra l'eventuale errore di un export e ne restituisce i byte.
 
     Args:
-        fig (matplotlib.figure.Figure): Figura Matplotlib da esportare.
-        filename (str): Nome file suggerito (usato solo per metadata/nomi di download).
+        exported (tuple): Coppia ``(data, error)`` restituita da ``modules.exporter``.
 
     Returns:
-        bytes | None: Contenuto PDF in byte se l'operazione ha successo, altrimenti ``None``.
+        bytes | None: Contenuto del file se l'export ha successo, altrimenti ``None``.
     """
-    try:
-        buf = BytesIO()
-        fig.savefig(buf, format='pdf', bbox_inches='tight')
-        buf.seek(0)
-        return buf.getvalue()
-    except Exception as e:
-        st.error(f"Errore nell'export PDF: {e}")
-        return None
+    data, err = exported
+    if err:
+        st.error(err)
+    return data
+
+
+def export_to_csv(df):
+    """Esporta un DataFrame in CSV (vedi ``modules.exporter.export_to_csv``)."""
+    with perf.span("export_csv", rows=len(df)):
+        return _show_export(exporter.export_to_csv(df))
+
+
+def export_to_png(fig):
+    """Esporta un grafico in PNG (vedi ``modules.exporter.export_to_png``)."""
+    with perf.span("export_png"):
+        return _show_export(exporter.export_to_png(fig))
+
+
+def export_to_pdf_chart(fig, filename):
+    """Esporta un grafico in PDF (vedi ``modules.exporter.export_to_pdf_chart``)."""
+    with perf.span("export_pdf"):
+        return _show_export(exporter.export_to_pdf_chart(fig, filename))
 
 
 def export_to_excel(df, filename):
-    """Esporta un ``pandas.DataFrame`` in un file Excel (.xlsx).
+    """Esporta un DataFrame (o un dizionario di fogli) in Excel (vedi ``modules.exporter.export_to_excel``)."""
+    rows = sum(len(sheet) for sheet in df.values()) if isinstance(df, dict) else len(df)
+    with perf.span("export_excel", rows=rows):
+        return _show_export(exporter.export_to_excel(df, filename))
+
+
+def export_pdf_report(df, fig, title, filename, max_rows=15):
+    """Crea un report PDF tabella + grafici (vedi ``modules.exporter.export_pdf_report``)."""
+    with perf.span("export_report", rows=len(df)):
+        return _show_export(exporter.export_pdf_report(df, fig, title, filename, max_rows))
 
-    Effettua una formattazione di base (larghezza colonne) usando ``openpyxl``.
+
+def _table_exports(signature, columns, filters, rows, filename_base):
+    """Export CSV/Excel del risultato di un dataset ``table``, preparati solo su richiesta.
+
+    Il risultato viene letto dal database a blocchi (``iter_query_dataset``) e scritto
+    direttamente nel file: in memoria ci sono un blocco alla volta e i byte del file,
+    conservati in sessione finché il risultato non cambia.
 
     Args:
-        df (pandas.DataFrame): DataFrame da esportare.
-        filename (str): Nome file suggerito (usato solo per metadata/nomi di download).
+        signature (str): Identifica il risultato (dataset, versione, colonne, filtri).
+        columns (list): Colonne da esportare.
+        filters (list): Filtri del risultato.
+        rows (int): Righe del risultato.
+        filename_base (str): Base del nome dei file.
+    """
+    prepared = st.session_state.get("_table_exports")
+    if prepared is None or prepared[0] != signature:
+        prepared = (signature, {})
+        st.session_state["_table_exports"] = prepared
+    files = prepared[1]
+
+    def chunks():
+        return iter_query_dataset(dataset_id, dataset_version, columns, filters)
+
+    count = f"{rows:,}".replace(",", ".")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        if "csv" not in files and st.button(f"Prepara CSV (filtrato, {count} righe)"):
+            with perf.span("export_csv", rows=rows):
+                data = _show_export(exporter.export_chunks_to_csv(chunks()))
+            if data:
+                files["csv"] = data
+        if "csv" in files and st.download_button(label="Download CSV (filtrato)", data=files["csv"],
+                                                 file_name=f"{filename_base}_filtered.csv", mime="text/csv"):
+            _record_history("export_csv", columns, {"target": "filtered"}, dedupe=False)
+    with col2:
+        if "excel" not in files and st.button(f"Prepara Excel (filtrato, {count} righe)"):
+            with perf.span("export_excel", rows=rows):
+                data = _show_export(exporter.export_chunks_to_excel(chunks(), f"{filename_base}_filtered.xlsx"))
+            if data:
+                files["excel"] = data
+        if "excel" in files and st.download_button(
+            label="Download Excel (filtrato)",
+            data=files["excel"],
+            file_name=f"{filename_base}_filtered.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        ):
+            _record_history("export_excel", columns, {"target": "filtered"}, dedupe=False)
 
-    Returns:
-        bytes | None: Conteuto del file .xlsx in memoria se ha successo, altrimenti ``None``.
+
+# ======================================================
+# CRONOLOGIA
+# ======================================================
+def _record_history(operation, columns, details=None, dedupe=True):
+    """Registra un'operazione sul dataset attuale nella cronologia (scrittura in background).
+
+    Con ``dedupe=True`` l'operazione viene registrata solo se è cambiata rispetto
+    all'ultima dello stesso tipo in questa sessione: ogni interazione provoca un
+    rerun completo dello script e non vogliamo un record per ogni rerun.
+
+    Args:
+        operation (str): Tipo di operazione (es. ``'filter'``, ``'stats'``, ``'aggregate'``, ``'export_csv'``).
+        columns (list): Colonne coinvolte.
+        details (dict, optional): Parametri dell'operazione.
+        dedupe (bool, optional): Evita record ripetuti identici. Default True.
     """
-    try:
-        from openpyxl.utils import get_column_letter
-        buf = BytesIO()
-        with pd.ExcelWriter(buf, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Data', index=False)
-            # Formattazione basilare: autowidth delle colonne
-            worksheet = writer.sheets['Data']
-            for idx, col in enumerate(df.columns, 1):
-                max_length = max(df[col].astype(str).apply(len).max(), len(col)) + 2
-                col_letter = get_column_letter(idx)
-                worksheet.column_dimensions[col_letter].width = min(max_length, 50)
-        buf.seek(0)
-        return buf.getvalue()
-    except Exception as e:
-        st.error(f"Errore nell'export Excel: {e}")
-        return None
+    if dataset_id is None:
+        return
+    if dedupe:
+        signature = repr((dataset_id, list(columns), details))
+        key = f"_history_last_{operation}"
+        if st.session_state.get(key) == signature:
+            return
+        st.session_state[key] = signature
+    record_operation(dataset_id, columns, operation, details)
 
 
-def export_pdf_report(df, fig, title, filename):
-    """Crea ed esporta un report PDF con tabella dati e grafico.
+# ======================================================
+# PAGINAZIONE RISULTATI
+# ======================================================
+def _result_pager(signature, build, slot="result"):
+    """Restituisce il pager del risultato, riusando quello in sessione se il risultato non è cambiato.
 
-    Usa ``reportlab`` per assemblare un PDF in landscape contenente una
-    tabella (preview limitata delle righe) e il grafico fornito come immagine.
+    In questo modo gli ordinamenti già calcolati (e il conteggio delle righe dei
+    dataset ``table``) restano validi fra un rerun e l'altro.
 
     Args:
-        df (pandas.DataFrame): DataFrame di cui includere la tabella.
-        fig (matplotlib.figure.Figure): Figura Matplotlib da includere nel report.
-        title (str): Titolo del report.
-        filename (str): Nome file suggerito (usato solo per metadata/nomi di download).
+        signature (str): Identifica il risultato (dataset, versione, colonne, filtri).
+        build (callable): Crea il pager (``ResultPager`` o ``SqlResultPager``) se il risultato è cambiato.
+        slot (str, optional): Nome del pager in sessione (uno per tabella mostrata). Default ``'result'``.
 
     Returns:
-        bytes | None: Contenuto PDF se l'operazione ha successo, altrimenti ``None``.
+        ResultPager | SqlResultPager: Pager del risultato.
     """
-    try:
-        from reportlab.lib.pagesizes import A4, landscape
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import inch
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, PageBreak
-        from reportlab.lib import colors
-        from datetime import datetime
-        
-        # Salva il grafico in PNG per includerlo nel PDF
-        img_buf = BytesIO()
-        fig.savefig(img_buf, format='png', bbox_inches='tight', dpi=100)
-        img_buf.seek(0)
-        
-        # Crea PDF su landscape per grafici larghi
-        pdf_buf = BytesIO()
-        doc = SimpleDocTemplate(pdf_buf, pagesize=landscape(A4), topMargin=0.4*inch, bottomMargin=0.4*inch, leftMargin=0.4*inch, rightMargin=0.4*inch)
-        
-        # Stili
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            textColor=colors.HexColor('#1f77b4'),
-            spaceAfter=8,
-            alignment=1  # centrato
-        )
-        normal_style = ParagraphStyle(
-            'CustomNormal',
-            parent=styles['Normal'],
-            fontSize=8,
-            spaceAfter=4
-        )
-        
-        # Contenuto del report
-        story = []
-        
-        # Titolo e timestamp
-        story.append(Paragraph(title, title_style))
-        story.append(Paragraph(f"<b>Generato il:</b> {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", normal_style))
-        story.append(Spacer(1, 0.15*inch))
-        
-        # Tabella dati (con scroll orizzontale se molte colonne)
-        story.append(Paragraph("<b>Dati</b>", styles['Heading2']))
-        
-        # Converti DataFrame in lista per la tabella
-        data = [list(df.columns)] + df.values.tolist()
-        
-        # Limita il numero di righe per leggibilità (max 15 + header su landscape)
-        if len(data) > 16:
-            data_display = data[:16]
-            story.append(Paragraph(f"<i>(Visualizzati 15 record su {len(df)} totali)</i>", normal_style))
-        else:
-            data_display = data
-        
-        # Crea tabella con colonne ridimensionate dinamicamente
-        n_cols = len(df.columns)
-        # Massima larghezza disponibile su landscape A4: ~10 inches
-        max_width = 10 * inch
-        col_widths = [max_width / max(1, n_cols)] * n_cols
-        
-        table = Table(data_display, colWidths=col_widths)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f77b4')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('FONTSIZE', (0, 1), (-1, -1), 7),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
-            ('TOPPADDING', (0, 1), (-1, -1), 2),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 2),
-        ]))
-        story.append(table)
-        story.append(Spacer(1, 0.2*inch))
-        
-        # Grafico
-        story.append(Paragraph("<b>Grafico</b>", styles['Heading2']))
-        
-        # Ridimensiona l'immagine per adattarla bene al landscape
-        # Larghezza: quasi tutta la pagina, altezza proporzionale
-        img_width = 9.5 * inch
-        img_height = 4.5 * inch
-        img = Image(img_buf, width=img_width, height=img_height)
-        story.append(img)
-        
-        # Build PDF
-        doc.build(story)
-        pdf_buf.seek(0)
-        return pdf_buf.getvalue()
-    
-    except Exception as e:
-        st.error(f"Errore nell'export PDF report: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
+    cached = st.session_state.get(f"_pager_{slot}")
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    pager = build()
+    st.session_state[f"_pager_{slot}"] = (signature, pager)
+    return pager
 
 
-# ======================================================
-# INIZIALIZZA DATABASE
-# ======================================================
-init_db()
+def _show_paged(pager, key):
+    """Mostra solo la pagina visibile del risultato, con ordinamento e navigazione.
 
-st.set_page_config(page_title="CSV Analyzer", layout="wide")
-st.title("CSV Analyzer")
+    Args:
+        pager (ResultPager | SqlResultPager): Risultato da mostrare.
+        key (str): Prefisso delle chiavi dei widget.
+    """
+    col1, col2, col3, col4 = st.columns([3, 2, 2, 2])
+    sort_by = col1.selectbox("Ordina per", ["-- Ordine originale --"] + pager.columns, key=f"{key}_sort")
+    ascending = col2.radio("Ordine", ["Crescente", "Decrescente"], horizontal=True, key=f"{key}_asc") == "Crescente"
+    page_size = col3.selectbox("Righe per pagina", [25, 50, 100, 500], index=1, key=f"{key}_size")
+    pages = pager.page_count(page_size)
+    # Nessun max_value: la pagina richiesta viene limitata se il risultato si accorcia
+    number = min(int(col4.number_input("Pagina", min_value=1, value=1, step=1, key=f"{key}_page")), pages)
 
-df = None  # DataFrame attuale
+    with perf.span("page", rows=len(pager)):
+        page_df = pager.page(number, page_size, None if sort_by == "-- Ordine originale --" else sort_by, ascending)
+    st.dataframe(page_df)
+    st.caption(f"{len(pager):,} righe filtrate su {pager.total_rows:,} · pagina {number} di {pages}".replace(",", "."))
 
 
 # ======================================================
-# 1) UPLOAD CSV
+# FILTRI CATEGORICI
 # ======================================================
-st.header("Carica un file CSV")
-upload_file = st.file_uploader("Seleziona un CSV", type="csv")
+# Oltre questa soglia di valori distinti il filtro usa ricerca + top-K
+# invece di elencare (e preselezionare) tutti i valori
+HIGH_CARDINALITY = 200
+TOP_K = 50
 
-if upload_file is not None:
 
-    df, err = load_csv(upload_file)
+def _value_dictionary(col):
+    """Dizionario dei valori di ``col`` nel dataset attuale, calcolato una volta sola.
 
-    if err:
-        st.error(err)
-    else:
-        st.success("File caricato correttamente!")
-        st.dataframe(df.head())
+    Per i dataset salvati viene conservato in `dataset_cache` (e aggiornato in modo
+    incrementale dalle nuove versioni); in sessione evita di rileggerlo ad ogni rerun.
 
-        # Salvataggio nel DB (evita duplicati per nome)
-        try:
-            dataset_id, created = save_dataset(upload_file.name, df)
-            if dataset_id is None:
-                st.error("Errore nel salvataggio del dataset (vedi console).")
-            elif not created:
-                st.info("Dataset già presente: caricamento del dataset esistente.")
-                # Carichiamo quello esistente nel DataFrame
-                df = load_dataset(dataset_id)
-                st.dataframe(df.head())
+    Args:
+        col (str): Colonna categorica.
+
+    Returns:
+        ValueDictionary: Valori distinti ordinati con le occorrenze.
+    """
+    key = f"_values_{result_source}_{col}"
+    if key in st.session_state:
+        return st.session_state[key]
+    dictionary = load_cache(dataset_id, dataset_version, "values", col) if dataset_id is not None else None
+    if dictionary is None:
+        with perf.span("value_dictionary"):
+            if sql_mode:
+                pairs = value_counts(dataset_id, dataset_version, col)
+                dictionary = ValueDictionary([v for v, _ in pairs], [n for _, n in pairs])
             else:
-                st.success("✓ Dataset salvato nel database.")
-        except Exception as e:
-            st.error(f"Errore nel salvataggio: {e}")
-        
+                dictionary = ValueDictionary.from_series(df[col])
+        # Il dizionario di un campione non descrive l'intero dataset: resta solo in sessione
+        if dataset_id is not None and sample is None:
+            save_cache(dataset_id, dataset_version, "values", col, dictionary)
+    st.session_state[key] = dictionary
+    return dictionary
+
+
+def _categorical_filter(col):
+    """Mostra il filtro per una colonna categorica e restituisce la tupla del filtro.
+
+    Con pochi valori distinti è un multiselect con tutti i valori; altrimenti si
+    sceglie fra tutti i valori, solo alcuni o tutti tranne alcuni, cercando i valori
+    per prefisso o sottostringa (senza ricerca vengono proposti i più frequenti).
+    "Tutti" e "tutti tranne" usano l'operatore ``'not_in'``: l'elenco completo
+    dei valori non viene mai costruito.
+
+    Args:
+        col (str): Colonna categorica.
+
+    Returns:
+        tuple: Filtro ``(col, 'in' | 'not_in', valori)``.
+    """
+    dictionary = _value_dictionary(col)
+    if len(dictionary) <= HIGH_CARDINALITY:
+        values = dictionary.values.tolist()
+        sel_vals = st.multiselect(
+            f"Filtro valori per {col}",
+            values,
+            default=values
+        )
+        if len(sel_vals) == len(values):
+            # Tutti i valori: equivale a "tutti i non mancanti", anche quelli assenti
+            # da un campione o aggiunti da una versione successiva
+            return (col, 'not_in', [])
+        return (col, 'in', sel_vals)
+
+    st.write(f"Filtro valori per {col} ({len(dictionary):,} valori distinti)".replace(",", "."))
+    mode = st.radio("Valori", ["Tutti", "Solo i selezionati", "Tutti tranne i selezionati"],
+                    horizontal=True, key=f"hc_mode_{col}")
+    if mode == "Tutti":
+        return (col, 'not_in', [])
+
+    col1, col2 = st.columns([4, 1])
+    query = col1.text_input("Cerca valori", key=f"hc_query_{col}", placeholder=f"vuoto: i {TOP_K} più frequenti")
+    substring = col2.checkbox("Contiene", key=f"hc_sub_{col}", help="Cerca ovunque nel valore, non solo all'inizio")
+    found = dictionary.search(query, substring=substring, limit=TOP_K) if query else dictionary.top(TOP_K)
+    # I valori già selezionati restano tra le opzioni quando la ricerca cambia
+    sel_key = f"hc_sel_{col}"
+    options = list(dict.fromkeys(st.session_state.get(sel_key, []) + found))
+    sel_vals = st.multiselect("Seleziona", options, key=sel_key,
+                              format_func=lambda v: f"{v} ({dictionary.count(v)})")
+    return (col, 'in' if mode == "Solo i selezionati" else 'not_in', sel_vals)
 
 
 # ======================================================
-# 2) CARICAMENTO DA DATABASE
+# CAMPIONAMENTO E CALCOLO ESATTO
 # ======================================================
-st.subheader("Dataset salvati")
+def _dataset_sample(strata=None):
+    """Campione del dataset attuale (salvato nel DB, in sessione fra un rerun e l'altro).
+
+    Args:
+        strata (str, optional): Colonna per il campione stratificato.
+
+    Returns:
+        modules.sampling.Sample: Il campione.
+    """
+    key = f"_sample_{dataset_id}_{dataset_version}_{sample_size}_{strata}"
+    if key not in st.session_state:
+        with perf.span("load_sample"):
+            st.session_state[key] = load_sample(dataset_id, dataset_version, int(sample_size), strata)
+    return st.session_state[key]
+
+
+def _column_range(col):
+    """Minimo e massimo di ``col`` sull'intero dataset (non solo sul campione o sullo schema)."""
+    if sql_mode:
+        return column_bounds(dataset_id, dataset_version, col)
+    if sample is not None and col in sample.bounds:
+        return sample.bounds[col]
+    return df[col].min(), df[col].max()
 
-datasets = list_datasets()
 
-if datasets:
-    dataset_names = ["-- Seleziona --"] + [
-        f"{d[0]} - {d[1]} ({d[2]})" for d in datasets
-    ]
+def _exact_results(dataset_id, version, table, columns, filters, operation, agg_request, ts_request):
+    """Ripete sull'intero dataset le operazioni svolte sul campione (eseguita in background).
 
-    selected_dataset = st.selectbox("Carica dataset salvato", dataset_names)
+    Non usa Streamlit: gira in un thread di ``modules.sampling.get_executor``.
+
+    Returns:
+        dict: ``rows`` (righe filtrate), ``stats``, ``aggregate`` e ``resample``
+            (``None`` se l'operazione non è stata richiesta).
+    """
+    agg_df = ts_df = None
+    if table:
+        rows = count_rows(dataset_id, version, filters)
+        stats = query_statistics(dataset_id, version, columns, operation, filters)
+        if agg_request:
+            agg_df = query_aggregate(dataset_id, version, *agg_request, filters)
+        if ts_request:
+            ts_df = query_resample(dataset_id, version, *ts_request, filters)
+    else:
+        # Dataset completo dal registro condiviso: se un'altra sessione lo ha già aperto
+        # non viene caricato una seconda volta, e dopo il calcolo resta entro il budget
+        lease = get_registry().acquire(dataset_id, version)
+        if lease is None:
+            raise ValueError(f"Dataset {dataset_id} non trovato")
+        try:
+            full = lease.df
+            positions = filter_positions(full, filters, partitions=list_partitions(dataset_id, version))
+            filtered = full if len(positions) == len(full) else full.iloc[positions]
+            rows = len(filtered)
+            stats = compute_statistics(filtered, columns, operation)
+            if agg_request:
+                agg_df = aggregate(filtered, *agg_request)
+            if ts_request:
+                time_col, value_cols, freq, op = ts_request
+                ts_df = resample_aggregate(filtered, time_col, value_cols, freq, op)
+        finally:
+            lease.release()
+    return {"rows": rows, "stats": stats, "aggregate": agg_df, "resample": ts_df}
+
+
+def _exact_section(signature, job):
+    """Avvia su richiesta il calcolo esatto in background e ne mostra i risultati quando è pronto.
 
-    if selected_dataset != "-- Seleziona --":
-        dataset_id = int(selected_dataset.split(" - ")[0])
-        df = load_dataset(dataset_id)
-        st.success("Dataset caricato dal database.")
-        st.dataframe(df.head())
+    Args:
+        signature (str): Identifica le operazioni correnti (colonne, filtri, statistica, aggregazioni).
+        job (tuple): Argomenti di ``_exact_results``.
+    """
+    st.subheader("Risultati esatti")
+    running = st.session_state.get("_exact")
+    if st.button("Calcola esatto sul dataset completo"):
+        running = (signature, get_executor().submit(_exact_results, *job))
+        st.session_state["_exact"] = running
+        _record_history("exact", job[3], {"operation": job[5], "filters": job[4]}, dedupe=False)
+    if running is None or running[0] != signature:
+        st.caption("Statistiche, aggregazioni e grafici qui sopra sono calcolati sul campione.")
+        return
+    future = running[1]
+    if not future.done():
+        st.info("Calcolo esatto in corso in background: puoi continuare a esplorare il campione.")
+        st.button("Aggiorna risultati esatti")
+        return
+    try:
+        exact = future.result()
+    except Exception as e:
+        st.error(f"Errore durante il calcolo esatto: {e}")
+        return
+    st.write(f"Righe filtrate: {exact['rows']:,}".replace(",", "."))
+    if exact["stats"]:
+        st.table(exact["stats"])
+    if exact["aggregate"] is not None:
+        st.write("Tabella aggregata")
+        st.dataframe(exact["aggregate"])
+    if exact["resample"] is not None:
+        st.write("Serie temporale")
+        st.dataframe(exact["resample"])
 
 
 # ======================================================
-# 3) SELEZIONE COLONNE E FILTRI
+# DATASET CONDIVISI FRA LE SESSIONI
 # ======================================================
-if df is not None:
+def _shared_dataset(dataset_id, version):
+    """Dataset dal registro del processo: una sola copia (di sola lettura) per tutte le sessioni.
 
-    st.header("Seleziona colonne e applica filtri")
+    La sessione tiene un riferimento al dataset aperto e lo rilascia quando ne
+    apre un altro; alla chiusura della sessione il riferimento viene eliminato
+    con lo stato. Il DataFrame non va modificato sul posto.
 
-    columns = df.columns.tolist()
-    selected_cols = st.multiselect("Colonne da analizzare", columns)
+    Returns:
+        pandas.DataFrame | None: Il dataset, oppure ``None`` se l'ID non esiste.
+    """
+    global shared_key
+    lease = st.session_state.get("_dataset_lease")
+    if lease is None or lease.released or lease.key != (dataset_id, version):
+        _release_shared_dataset()
+        lease = get_registry().acquire(dataset_id, version)
+        if lease is None:
+            return None
+        st.session_state["_dataset_lease"] = lease
+    shared_key = lease.key
+    return lease.df
 
-    if selected_cols:
 
-        # --- Filtri dinamici ---
-        filters = []
-        st.subheader("Filtri")
+def _release_shared_dataset():
+    """Rilascia il dataset del registro tenuto dalla sessione (se presente)."""
+    lease = st.session_state.pop("_dataset_lease", None)
+    if lease is not None:
+        lease.release()
 
-        for col in selected_cols:
 
-            if pd.api.types.is_numeric_dtype(df[col]):
-                min_val = float(df[col].min())
-                max_val = float(df[col].max())
+# ======================================================
+# PROFILO DEL DATASET
+# ======================================================
+def _profile_exports(profile, figures):
+    """Fogli Excel e report PDF del profilo (calcolati una volta, non ad ogni rerun)."""
+    columns = profile["columns"].reset_index()
+    sheets = {"Colonne": columns}
+    if not profile["correlation"].empty:
+        sheets["Correlazioni"] = profile["correlation"].rename_axis("colonna").reset_index()
+    if profile["top_values"]:
+        sheets["Valori frequenti"] = pd.concat(
+            [top.assign(colonna=col)[["colonna", "valore", "conteggio"]] for col, top in profile["top_values"].items()],
+            ignore_index=True
+        )
+    excel_data = export_to_excel(sheets, "profilo.xlsx")
+    report_data = export_pdf_report(columns.round(4), figures, "Profilo del dataset", "profilo.pdf",
+                                    max_rows=len(columns))
+    return excel_data, report_data
 
-                sel_min, sel_max = st.slider(
-                    f"Filtro numerico per {col}",
-                    min_val, max_val, (min_val, max_val)
-                )
 
-                filters.append((col, 'between', (sel_min, sel_max)))
+def _dataset_profile(compute=False):
+    """Profilo del dataset attuale con grafici ed export, o ``None`` se non ancora calcolato.
 
-            else:
-                values = df[col].dropna().unique().tolist()
-                sel_vals = st.multiselect(
-                    f"Filtro valori per {col}",
-                    values,
-                    default=values
-                )
+    Il profilo di un dataset salvato viene conservato nella cache del dataset
+    (tipo ``'profile'``) e riletto senza ricalcolo; quello di un file caricato o
+    di un campione resta solo in sessione.
 
-                filters.append((col, 'in', sel_vals))
-
-        # --- Applica i filtri ---
-        filtered_df = apply_filters(df, selected_cols, filters)
-        st.write("### Risultato filtrato:")
-        st.dataframe(filtered_df)
-
-        # --- Aggregazione rapida (opzionale) ---
-        # Se tra le colonne selezionate ci sono categoriche, offriamo
-        # una semplice UI per raggruppare il risultato filtrato.
-        cat_selected = [c for c in selected_cols if not pd.api.types.is_numeric_dtype(df[c])]
-        num_all = [c for c in df.columns.tolist() if pd.api.types.is_numeric_dtype(df[c])]
-        if cat_selected:
-            st.subheader("Aggregazione rapida (opzionale)")
-            # chiave unica per evitare StreamlitDuplicateElementId
-            cat_key = "_".join([c.replace(' ', '_') for c in cat_selected])[:200]
-            group_col = st.selectbox("Raggruppa per (colonna categorica)", ["-- Nessuna --"] + cat_selected, key=f"group_col_{cat_key}")
-            if group_col and group_col != "-- Nessuna --":
-                # Permetti di scegliere colonne numeriche da aggregare (dalla tabella completa)
-                value_cols = st.multiselect("Colonne numeriche da aggregare", num_all, default=(num_all[:1] if num_all else []), key=f"vals_{cat_key}")
-                agg_op = st.selectbox("Operazione di aggregazione", ["sum", "mean", "count", "max", "min"], key=f"aggop_{cat_key}") 
-
-                if value_cols:
-                        try:
-                            if agg_op == "count":
-                                agg_df = filtered_df.groupby(group_col)[value_cols].count().reset_index()
-                            else:
-                                agg_df = filtered_df.groupby(group_col)[value_cols].agg(agg_op).reset_index()
+    Args:
+        compute (bool, optional): Calcola il profilo se non è disponibile. Default False.
 
-                            # Ordina per la prima colonna di valore (discendente)
-                            sort_by = value_cols[0]
-                            agg_df = agg_df.sort_values(by=sort_by, ascending=False)
+    Returns:
+        dict | None: ``profile``, ``figures`` (heatmap e istogrammi) ed ``exports``
+            (byte di Excel e PDF).
+    """
+    key = f"_profile_{result_source}"
+    if key in st.session_state:
+        return st.session_state[key]
+    # Tabelle: il profilo è calcolato sul campione (l'intera tabella non viene caricata)
+    persistent = dataset_id is not None and sample is None and not sql_mode
+    profile = load_cache(dataset_id, dataset_version, "profile") if persistent else None
+    if profile is None:
+        if not compute:
+            return None
+        if sample is not None:
+            frame = sample.df
+        elif sql_mode:
+            frame = _dataset_sample().df
+        else:
+            frame = df
+        with perf.span("profile", rows=len(frame)):
+            profile = profile_dataset(frame)
+        if persistent:
+            save_cache(dataset_id, dataset_version, "profile", "", profile)
+        _record_history("profile", frame.columns.tolist(), {"source": result_source[0]}, dedupe=False)
+    figures = [f for f in (plot_correlation(profile["correlation"]), plot_histograms(profile["histograms"]))
+               if f is not None]
+    st.session_state[key] = {"profile": profile, "figures": figures,
+                             "exports": _profile_exports(profile, figures)}
+    return st.session_state[key]
 
-                            st.write("### Tabella aggregata")
-                            st.dataframe(agg_df)
 
-                            # Export CSV
-                            try:
-                                csv_bytes = agg_df.to_csv(index=False).encode('utf-8')
-                                filename_base = 'aggregated'
-                                if upload_file is not None and hasattr(upload_file, 'name'):
-                                    filename_base = upload_file.name.replace('.csv', '')
-                                col1, col2, col3 = st.columns(3)
-                                with col1:
-                                    st.download_button(label="Download CSV (aggregato)", data=csv_bytes, file_name=f"{filename_base}_aggregated.csv", mime="text/csv")
-                                with col2:
-                                    excel_data = export_to_excel(agg_df, f"{filename_base}_aggregated.xlsx")
-                                    if excel_data:
-                                        st.download_button(label="Download Excel (aggregato)", data=excel_data, file_name=f"{filename_base}_aggregated.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-                            except Exception:
-                                pass
-
-                            # Grafico della tabella aggregata
-                            st.subheader("Grafico aggregato")
-                            chart_type = st.selectbox("Tipo di grafico:", ["Barre", "Linee", "Torta"], key=f"agg_chart_{group_col}")
-                            fig = generate_plot(agg_df, [group_col] + value_cols, chart_type)
-                            if fig:
-                                st.pyplot(fig)
-                                # Export grafico aggregato
-                                col1, col2, col3 = st.columns(3)
-                                with col1:
-                                    try:
-                                        buf = BytesIO()
-                                        fig.savefig(buf, format='png', bbox_inches='tight')
-                                        buf.seek(0)
-                                        st.download_button(label='Download grafico PNG (aggregato)', data=buf.getvalue(), file_name=f"{filename_base}_aggregated_{chart_type}.png", mime='image/png')
-                                    except Exception:
-                                        pass
-                                with col2:
-                                    try:
-                                        pdf_data = export_to_pdf_chart(fig, f"{filename_base}_aggregated_{chart_type}.pdf")
-                                        if pdf_data:
-                                            st.download_button(label='Download grafico PDF (aggregato)', data=pdf_data, file_name=f"{filename_base}_aggregated_{chart_type}.pdf", mime='application/pdf')
-                                    except Exception:
-                                        pass
-                                with col3:
-                                    try:
-                                        report_data = export_pdf_report(agg_df, fig, f"Report Aggregato: {chart_type}", f"{filename_base}_report_aggregated_{chart_type}.pdf")
-                                        if report_data:
-                                            st.download_button(label='Download Report PDF (aggregato)', data=report_data, file_name=f"{filename_base}_report_aggregated_{chart_type}.pdf", mime='application/pdf')
-                                    except Exception:
-                                        pass
-                        except Exception as e:
-                            st.error(f"Errore durante l'aggregazione rapida: {e}")
-
-        # --- Export dei dati filtrati ---
-        csv_bytes = None
-        try:
-            csv_bytes = filtered_df.to_csv(index=False).encode('utf-8')
-        except Exception:
-            csv_bytes = None
+# ======================================================
+# INIZIALIZZA DATABASE
+# ======================================================
+init_db()
 
-        # Determina base per il nome file (upload, oppure dataset selezionato, altrimenti 'dataset')
-        filename_base = 'dataset'
-        try:
-            if upload_file is not None and hasattr(upload_file, 'name'):
-                filename_base = upload_file.name
-            elif 'selected_dataset' in locals() and selected_dataset and selected_dataset != "-- Seleziona --":
-                # selected_dataset ha formato: "{id} - {name} ({date})"
-                try:
-                    name_part = selected_dataset.split(' - ', 1)[1]
-                    # rimuovi la parte tra parentesi finale
-                    name_only = name_part.rsplit(' (', 1)[0]
-                    filename_base = name_only
-                except Exception:
-                    filename_base = selected_dataset
-        except Exception:
-            filename_base = 'dataset'
+st.set_page_config(page_title="CSV Analyzer", layout="wide")
+st.title("CSV Analyzer")
 
-        if csv_bytes is not None and not filtered_df.empty:
-            col1, col2 = st.columns(2)
-            with col1:
-                st.download_button(
-                    label="Download CSV (filtrato)",
-                    data=csv_bytes,
-                    file_name=f"{filename_base}_filtered.csv",
-                    mime="text/csv"
-                )
-            with col2:
-                try:
-                    excel_data = export_to_excel(filtered_df, f"{filename_base}_filtered.xlsx")
-                    if excel_data:
-                        st.download_button(
-                            label="Download Excel (filtrato)",
-                            data=excel_data,
-                            file_name=f"{filename_base}_filtered.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
-                except Exception:
-                    st.info('Impossibile esportare come Excel.')
+df = None  # DataFrame attuale
+dataset_id = None  # ID del dataset attuale nel DB
+dataset_version = None  # Versione del dataset attuale
+partitions = None  # Partizioni del dataset attuale (per saltarle nei filtri)
+sql_mode = False  # Dataset archiviato come tabella: filtri e calcoli eseguiti in SQL
+sample = None  # Campione del dataset attuale (esplorazione dei dataset grandi)
+shared_key = None  # (id, versione) del dataset preso dal registro condiviso in questa esecuzione
+
+
+# ======================================================
+# PERFORMANCE (strumentazione per rerun)
+# ======================================================
+perf = PerfRecorder()
+
+st.sidebar.header("Performance")
+show_perf = st.sidebar.checkbox("Mostra pannello performance", value=False)
+perf_target = st.sidebar.selectbox("Salva metriche", ["Nessuno", "Tabella metrics", "File JSONL"])
+# Il bottone vale True solo nel rerun che ha provocato: la cattura riguarda quel rerun
+profile_run = st.sidebar.button("Profila questo rerun (cProfile + tracemalloc)")
+capture = ProfileCapture().start() if profile_run else None
+# Da qui alla fine del rerun la cattura va fermata anche con eccezioni, st.stop() o st.rerun()
+try:
+    st.sidebar.header("Archiviazione")
+    storage_labels = {"blob": "SQLite (BLOB pickle)", "arrow": "File Arrow (memory-map)",
+                      "table": "Tabella SQLite (query in SQL)"}
+    storage = st.sidebar.selectbox(
+        "Formato dei nuovi dataset",
+        list(STORAGE_FORMATS),
+        index=list(STORAGE_FORMATS).index(DEFAULT_STORAGE) if DEFAULT_STORAGE in STORAGE_FORMATS else 0,
+        format_func=storage_labels.get
+    )
+    codecs = available_codecs()
+    codec = st.sidebar.selectbox(
+        "Compressione dei nuovi dataset",
+        codecs,
+        index=codecs.index(DEFAULT_CODEC) if DEFAULT_CODEC in codecs else 0,
+        format_func=lambda c: "Nessuna" if c == "none" else c,
+        help="zstd e lz4 sono veloci; lzma e bz2 più compatti ma lenti. Per i file Arrow solo lz4 e zstd; "
+             "le tabelle SQLite non vengono compresse. Confronto su un dataset: python cli.py codecs <id>"
+    )
+
+    st.sidebar.header("Campionamento")
+    use_sampling = st.sidebar.checkbox("Esplora i dataset grandi su un campione", value=True)
+    sample_threshold = st.sidebar.number_input("Dataset grandi: oltre (righe)", min_value=1000,
+                                               value=SAMPLE_THRESHOLD, step=100_000)
+    sample_size = st.sidebar.number_input("Righe del campione", min_value=1000, value=SAMPLE_SIZE, step=10_000)
+
+
+    # ======================================================
+    # 1) UPLOAD CSV
+    # ======================================================
+    st.header("Carica un file CSV")
+    upload_file = st.file_uploader("Seleziona un CSV", type="csv")
+
+    if upload_file is not None:
+
+        with perf.span("load") as span:
+            df, err = load_csv(upload_file)
+            span["rows"] = len(df) if df is not None else None
+
+        if err:
+            st.error(err)
         else:
-            st.button("Download CSV (filtrato)", disabled=True)
+            st.success("File caricato correttamente!")
+            st.dataframe(df.head())
+
+            # Salvataggio nel DB (evita duplicati per nome, salva solo le righe aggiunte)
+            try:
+                with perf.span("save_dedup", rows=len(df)):
+                    dataset_id, status = save_dataset_version(upload_file.name, df, storage=storage, codec=codec)
+                if dataset_id is None:
+                    st.error("Errore nel salvataggio del dataset (vedi console).")
+                elif status == "duplicate":
+                    st.info("Dataset già presente: caricamento del dataset esistente.")
+                    # Carichiamo quello esistente nel DataFrame
+                    with perf.span("load_dataset"):
+                        df = _shared_dataset(dataset_id, get_dataset_info(dataset_id)["version"])
+                    st.dataframe(df.head())
+                elif status == "appended":
+                    st.success("✓ Il file estende un dataset esistente: salvate solo le righe nuove come nuova versione.")
+                else:
+                    st.success("✓ Dataset salvato nel database.")
+                if dataset_id is not None:
+                    dataset_version = get_dataset_info(dataset_id)["version"]
+                    if use_sampling and len(df) >= sample_threshold:
+                        sample = _dataset_sample()
+            except Exception as e:
+                st.error(f"Errore nel salvataggio: {e}")
+
+    with st.expander("Importa più file come un unico dataset (partizioni)"):
+        shard_files = st.file_uploader("Seleziona i CSV", type="csv", accept_multiple_files=True)
+        shard_name = st.text_input("Nome del dataset", value="dataset_partizionato")
+
+        # Import solo su richiesta: non ad ogni rerun
+        if shard_files and st.button(f"Importa {len(shard_files)} file"):
+            with perf.span("load_many") as span:
+                loaded = load_many(sorted(shard_files, key=lambda f: f.name))
+                span["rows"] = sum(len(d) for _, d, _ in loaded if d is not None)
+            errors = [f"{name}: {err}" for name, _, err in loaded if err]
+            frames, err = (None, "; ".join(errors)) if errors else align_schemas([d for _, d, _ in loaded])
+            if err:
+                st.error(err)
+            else:
+                with perf.span("save_partitioned", rows=span["rows"]):
+                    new_id, status = save_partitioned_dataset(shard_name, frames, [name for name, _, _ in loaded],
+                                                              storage=storage, codec=codec)
+                if new_id is None:
+                    st.error("Errore nel salvataggio del dataset (vedi console).")
+                elif status == "duplicate":
+                    st.info(f"Dataset già presente (id={new_id}).")
+                else:
+                    st.success(f"✓ {len(frames)} file salvati come partizioni del dataset id={new_id}: "
+                               "selezionalo tra i dataset salvati.")
+
+
+
+    # ======================================================
+    # 2) CARICAMENTO DA DATABASE
+    # ======================================================
+    st.subheader("Dataset salvati")
+
+    datasets = list_datasets()
+
+    if datasets:
+        dataset_names = ["-- Seleziona --"] + [
+            f"{d[0]} - {d[1]} ({d[2]})" for d in datasets
+        ]
+
+        selected_dataset = st.selectbox("Carica dataset salvato", dataset_names)
+
+        if selected_dataset != "-- Seleziona --":
+            dataset_id = int(selected_dataset.split(" - ")[0])
+            dataset_info = get_dataset_info(dataset_id)
+            dataset_version = dataset_info["version"]
+            if dataset_version > 1:
+                versions = list_versions(dataset_id)
+                dataset_version = st.selectbox(
+                    "Versione",
+                    [v[0] for v in reversed(versions)],
+                    format_func=lambda v: f"v{v} ({sum(x[1] or 0 for x in versions if x[0] <= v)} righe)"
+                )
+            sample, sql_mode = None, False
+            if use_sampling and (dataset_info["row_count"] or 0) >= sample_threshold:
+                # Dataset grande: si legge solo il campione salvato con il dataset
+                sample = _dataset_sample()
+                st.dataframe(sample.df.head())
+            elif dataset_info["storage"] == "table":
+                # Nessun caricamento: solo lo schema; le righe escono dal DB filtrate
+                sql_mode = True
+                with perf.span("load_schema"):
+                    df = dataset_schema(dataset_id)
+                st.success("Dataset aperto dal database (filtri, statistiche e aggregazioni eseguiti in SQL).")
+                st.dataframe(query_dataset(dataset_id, dataset_version, limit=5))
+            else:
+                with perf.span("load_dataset"):
+                    df = _shared_dataset(dataset_id, dataset_version)
+                    partitions = list_partitions(dataset_id, dataset_version)
+                st.success("Dataset caricato dal database.")
+                st.dataframe(df.head())
 
 
-        # ======================================================
-        # 4) ANALISI STATISTICHE
-        # ======================================================
-        st.header("Analisi statistiche")
+    # Il dataset del registro tenuto da un'esecuzione precedente non serve più
+    if shared_key is None:
+        _release_shared_dataset()
+
+
+    # ======================================================
+    # CAMPIONE (dataset grandi)
+    # ======================================================
+    if sample is not None:
+        strata_options = [c for c in sample.df.columns
+                          if not pd.api.types.is_numeric_dtype(sample.df[c])
+                          and not pd.api.types.is_datetime64_any_dtype(sample.df[c])]
+        strata = st.selectbox("Campione", ["-- Uniforme --"] + strata_options, key="sample_strata",
+                              format_func=lambda c: c if c == "-- Uniforme --" else f"Stratificato per {c}")
+        if strata != "-- Uniforme --":
+            try:
+                sample = _dataset_sample(strata)
+            except ValueError as e:
+                st.error(str(e))
+                strata = None
+        else:
+            strata = None
+        df = sample.df
+        st.info(f"Esplorazione su un campione di {len(sample):,} righe su {sample.population:,}: "
+                "le statistiche sono stime con intervallo di confidenza al 95%.".replace(",", "."))
 
-        operation = st.selectbox(
-            "Tipo di analisi:",
-            ["Media", "Somma", "Conteggio", "Massimo", "Minimo"]
-        )
 
-        stats = compute_statistics(filtered_df, selected_cols, operation)
+    # ======================================================
+    # 3) SELEZIONE COLONNE E FILTRI
+    # ======================================================
+    if df is not None:
 
-        if stats:
-            st.write("### Risultati:")
-            st.table(stats)
+        st.header("Seleziona colonne e applica filtri")
+
+        # Identifica i dati attuali (per le cache in sessione: dizionari dei valori, pager)
+        if sample is not None:
+            result_source = ("sample", dataset_id, dataset_version, int(sample_size), strata)
+        elif dataset_id is not None:
+            result_source = ("db", dataset_id, dataset_version)
         else:
-            st.info("Seleziona almeno una colonna numerica.")
+            result_source = ("upload", upload_file.name, upload_file.size)
+
+        # --- Profilo del dataset ---
+        with st.expander("Profilo del dataset"):
+            profiled = _dataset_profile()
+            if profiled is None:
+                st.caption("Statistiche di tutte le colonne, valori mancanti e duplicati, correlazioni e distribuzioni.")
+                if st.button("Calcola profilo", key="profile_compute"):
+                    with st.spinner("Calcolo del profilo..."):
+                        profiled = _dataset_profile(compute=True)
+            if profiled is not None:
+                profile = profiled["profile"]
+                if sample is not None or sql_mode:
+                    st.caption("Profilo calcolato sul campione.")
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Righe", f"{profile['rows']:,}".replace(",", "."))
+                col2.metric("Colonne", len(profile["columns"]))
+                col3.metric("Righe duplicate", f"{profile['duplicates']:,}".replace(",", "."))
+                st.dataframe(profile["columns"])
+                for fig in profiled["figures"]:
+                    st.pyplot(fig)
+                if profile["top_values"]:
+                    top_col = st.selectbox("Valori più frequenti di", list(profile["top_values"]), key="profile_top")
+                    st.dataframe(profile["top_values"][top_col], hide_index=True)
+                excel_data, report_data = profiled["exports"]
+                col1, col2 = st.columns(2)
+                with col1:
+                    if excel_data and st.download_button(
+                        label="Download Excel (profilo)",
+                        data=excel_data,
+                        file_name="profilo.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    ):
+                        _record_history("export_excel", df.columns.tolist(), {"target": "profile"}, dedupe=False)
+                with col2:
+                    if report_data and st.download_button(
+                        label="Download Report PDF (profilo)",
+                        data=report_data,
+                        file_name="profilo.pdf",
+                        mime="application/pdf"
+                    ):
+                        _record_history("export_report", df.columns.tolist(), {"target": "profile"}, dedupe=False)
+
+        columns = df.columns.tolist()
+        selected_cols = st.multiselect("Colonne da analizzare", columns)
+
+        if selected_cols:
+
+            # --- Filtri dinamici ---
+            filters = []
+            st.subheader("Filtri")
+
+            for col in selected_cols:
+
+                if pd.api.types.is_datetime64_any_dtype(df[col]):
+                    min_t, max_t = _column_range(col)
+                    if pd.isna(min_t) or min_t == max_t:
+                        # Un solo istante (o nessuna data): non c'è un intervallo da scegliere
+                        continue
+                    min_t, max_t = min_t.to_pydatetime(), max_t.to_pydatetime()
+                    # Circa mille posizioni del cursore, al secondo intero
+                    step = timedelta(seconds=max(1, int((max_t - min_t).total_seconds() // 1000)))
+
+                    sel_min, sel_max = st.slider(
+                        f"Intervallo di date per {col}",
+                        min_t, max_t, (min_t, max_t), step=step, format="DD/MM/YYYY HH:mm"
+                    )
 
+                    filters.append((col, 'between', (pd.Timestamp(sel_min), pd.Timestamp(sel_max))))
 
-        # ======================================================
-        # 5) GENERAZIONE GRAFICI
-        # ======================================================
-        st.header("Genera grafico")
+                elif pd.api.types.is_numeric_dtype(df[col]):
+                    min_val, max_val = _column_range(col)
+                    if pd.isna(min_val) or pd.isna(max_val):
+                        # Colonna senza valori: non c'è un intervallo da scegliere
+                        continue
+                    min_val, max_val = float(min_val), float(max_val)
 
-        chart_type = st.selectbox(
-            "Tipo di grafico:",
-            ["Barre", "Linee", "Istogramma", "Torta"]
-        )
-
-        fig = generate_plot(filtered_df, selected_cols, chart_type)
+                    sel_min, sel_max = st.slider(
+                        f"Filtro numerico per {col}",
+                        min_val, max_val, (min_val, max_val)
+                    )
 
-        if fig:
-            st.pyplot(fig)
-            # --- Export grafico ---
-            col1, col2, col3 = st.columns(3)
-            with col1:
+                    filters.append((col, 'between', (sel_min, sel_max)))
+
+                else:
+                    filters.append(_categorical_filter(col))
+
+            # --- Applica i filtri ---
+            # Righe della versione selezionata (row_count del record è quello dell'ultima versione)
+            total_rows = count_rows(dataset_id, dataset_version) if sql_mode else len(df)
+            signature = repr((result_source, selected_cols, filters))
+            with perf.span("filter", rows=total_rows):
+                if sql_mode:
+                    # Solo il conteggio: le righe escono dal DB una pagina alla volta e
+                    # le righe filtrate non vengono mai caricate tutte insieme
+                    filtered_df = None
+                    pager = _result_pager(signature, lambda: SqlResultPager(dataset_id, dataset_version,
+                                                                            selected_cols, filters, total_rows))
+                else:
+                    # Filtri valutati solo quando cambia la firma: il pager conserva le
+                    # posizioni delle righe, non una copia del DataFrame filtrato
+                    pager = _result_pager(signature, lambda: ResultPager(
+                        df, total_rows, filter_positions(df, filters, partitions=partitions)))
+                    filtered_df = pager.frame()
+            _record_history("filter", selected_cols, {"filters": filters, "rows": len(pager)})
+            st.write("### Risultato filtrato:")
+            _show_paged(pager, "result")
+            filtered_rows = len(pager)
+
+            # Operazioni richieste, da ripetere nel calcolo esatto (modalità campione)
+            agg_request = ts_request = None
+
+            # --- Aggregazione rapida (opzionale) ---
+            # Se tra le colonne selezionate ci sono categoriche, offriamo
+            # una semplice UI per raggruppare il risultato filtrato.
+            cat_selected = [c for c in selected_cols if not pd.api.types.is_numeric_dtype(df[c])]
+            num_all = [c for c in df.columns.tolist() if pd.api.types.is_numeric_dtype(df[c])]
+            if cat_selected:
+                st.subheader("Aggregazione rapida (opzionale)")
+                # chiave unica per evitare StreamlitDuplicateElementId
+                cat_key = "_".join([c.replace(' ', '_') for c in cat_selected])[:200]
+                group_col = st.selectbox("Raggruppa per (colonna categorica)", ["-- Nessuna --"] + cat_selected, key=f"group_col_{cat_key}")
+                if group_col and group_col != "-- Nessuna --":
+                    # Permetti di scegliere colonne numeriche da aggregare (dalla tabella completa)
+                    value_cols = st.multiselect("Colonne numeriche da aggregare", num_all, default=(num_all[:1] if num_all else []), key=f"vals_{cat_key}")
+                    agg_op = st.selectbox("Operazione di aggregazione", ["sum", "mean", "count", "max", "min"], key=f"aggop_{cat_key}") 
+
+                    if value_cols:
+                            try:
+                                agg_request = (group_col, value_cols, agg_op)
+                                with perf.span("aggregation", rows=filtered_rows):
+                                    if sample is not None:
+                                        agg_df = sample.aggregate(filtered_df, group_col, value_cols, agg_op)
+                                    elif sql_mode:
+                                        agg_df = query_aggregate(dataset_id, dataset_version, group_col, value_cols,
+                                                                 agg_op, filters)
+                                    elif dataset_id is not None and len(filtered_df) == len(df):
+                                        # Nessuna riga esclusa dai filtri: usiamo il rollup precalcolato
+                                        # della versione (aggiornato in modo incrementale dagli append)
+                                        rolled = load_cache(dataset_id, dataset_version, "rollup", group_col)
+                                        if rolled is None:
+                                            rolled = rollup(df, group_col)
+                                            save_cache(dataset_id, dataset_version, "rollup", group_col, rolled)
+                                        agg_df = aggregate_from_rollup(rolled, group_col, value_cols, agg_op)
+                                    else:
+                                        agg_df = aggregate(filtered_df, group_col, value_cols, agg_op)
+                                _record_history("aggregate", [group_col] + value_cols, {"op": agg_op, "filters": filters})
+
+                                st.write("### Tabella aggregata")
+                                st.dataframe(agg_df)
+
+                                # Export CSV
+                                try:
+                                    csv_bytes = export_to_csv(agg_df)
+                                    filename_base = 'aggregated'
+                                    if upload_file is not None and hasattr(upload_file, 'name'):
+                                        filename_base = upload_file.name.replace('.csv', '')
+                                    col1, col2, col3 = st.columns(3)
+                                    with col1:
+                                        if st.download_button(label="Download CSV (aggregato)", data=csv_bytes, file_name=f"{filename_base}_aggregated.csv", mime="text/csv"):
+                                            _record_history("export_csv", [group_col] + value_cols, {"target": "aggregated"}, dedupe=False)
+                                    with col2:
+                                        excel_data = export_to_excel(agg_df, f"{filename_base}_aggregated.xlsx")
+                                        if excel_data:
+                                            if st.download_button(label="Download Excel (aggregato)", data=excel_data, file_name=f"{filename_base}_aggregated.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"):
+                                                _record_history("export_excel", [group_col] + value_cols, {"target": "aggregated"}, dedupe=False)
+                                except Exception:
+                                    pass
+
+                                # Grafico della tabella aggregata
+                                st.subheader("Grafico aggregato")
+                                chart_type = st.selectbox("Tipo di grafico:", ["Barre", "Linee", "Torta"], key=f"agg_chart_{group_col}")
+                                with perf.span("plot_aggregated", rows=len(agg_df)):
+                                    fig = generate_plot(agg_df, [group_col] + value_cols, chart_type)
+                                if fig:
+                                    st.pyplot(fig)
+                                    # Export grafico aggregato
+                                    col1, col2, col3 = st.columns(3)
+                                    with col1:
+                                        try:
+                                            png_data = export_to_png(fig)
+                                            if png_data:
+                                                if st.download_button(label='Download grafico PNG (aggregato)', data=png_data, file_name=f"{filename_base}_aggregated_{chart_type}.png", mime='image/png'):
+                                                    _record_history("export_png", [group_col] + value_cols, {"target": "aggregated"}, dedupe=False)
+                                        except Exception:
+                                            pass
+                                    with col2:
+                                        try:
+                                            pdf_data = export_to_pdf_chart(fig, f"{filename_base}_aggregated_{chart_type}.pdf")
+                                            if pdf_data:
+                                                if st.download_button(label='Download grafico PDF (aggregato)', data=pdf_data, file_name=f"{filename_base}_aggregated_{chart_type}.pdf", mime='application/pdf'):
+                                                    _record_history("export_pdf", [group_col] + value_cols, {"target": "aggregated"}, dedupe=False)
+                                        except Exception:
+                                            pass
+                                    with col3:
+                                        try:
+                                            report_data = export_pdf_report(agg_df, fig, f"Report Aggregato: {chart_type}", f"{filename_base}_report_aggregated_{chart_type}.pdf")
+                                            if report_data:
+                                                if st.download_button(label='Download Report PDF (aggregato)', data=report_data, file_name=f"{filename_base}_report_aggregated_{chart_type}.pdf", mime='application/pdf'):
+                                                    _record_history("export_report", [group_col] + value_cols, {"target": "aggregated"}, dedupe=False)
+                                        except Exception:
+                                            pass
+                            except Exception as e:
+                                st.error(f"Errore durante l'aggregazione rapida: {e}")
+
+            # --- Serie temporale (opzionale) ---
+            # Con una colonna di date e colonne numeriche selezionate, aggrega per
+            # intervalli di tempo (minuto, ora, giorno, mese).
+            time_selected = [c for c in selected_cols if pd.api.types.is_datetime64_any_dtype(df[c])]
+            num_selected = [c for c in selected_cols if pd.api.types.is_numeric_dtype(df[c])]
+            if time_selected and num_selected:
+                st.subheader("Serie temporale (opzionale)")
+                col1, col2, col3 = st.columns(3)
+                time_col = col1.selectbox("Colonna di date", time_selected, key="ts_col")
+                freq_label = col2.selectbox("Intervallo", ["Automatico"] + list(RESAMPLE_FREQUENCIES), key="ts_freq")
+                ts_op = col3.selectbox("Operazione", ["sum", "mean", "count", "max", "min"], key="ts_op")
+                ts_values = st.multiselect("Colonne da aggregare nel tempo", num_selected, default=num_selected, key="ts_values")
+
+                if ts_values and filtered_rows:
+                    try:
+                        if freq_label == "Automatico":
+                            if sql_mode:
+                                # Solo gli estremi delle date filtrate, letti dal database
+                                freq = choose_frequency(pd.Series(column_bounds(dataset_id, dataset_version,
+                                                                                time_col, filters)))
+                            else:
+                                freq = choose_frequency(filtered_df[time_col])
+                        else:
+                            freq = RESAMPLE_FREQUENCIES[freq_label]
+                        ts_request = (time_col, ts_values, freq, ts_op)
+                        with perf.span("resample", rows=filtered_rows):
+                            if sample is not None:
+                                ts_df = sample.aggregate(filtered_df, time_col, ts_values, ts_op, freq=freq)
+                            elif sql_mode:
+                                ts_df = query_resample(dataset_id, dataset_version, time_col, ts_values, freq,
+                                                       ts_op, filters)
+                            elif not sql_mode and dataset_id is not None and len(filtered_df) == len(df):
+                                # Nessuna riga esclusa dai filtri: rollup per intervallo della versione
+                                # (aggiornato in modo incrementale dagli append, come quello per categoria)
+                                cache_key = f"{time_col}|{freq}"
+                                rolled = load_cache(dataset_id, dataset_version, "resample", cache_key)
+                                if rolled is None:
+                                    rolled = resample_rollup(df, time_col, freq)
+                                    save_cache(dataset_id, dataset_version, "resample", cache_key, rolled)
+                                ts_df = resample_from_rollup(rolled, time_col, ts_values, ts_op)
+                            else:
+                                ts_df = resample_aggregate(filtered_df, time_col, ts_values, freq, ts_op)
+                        _record_history("resample", [time_col] + ts_values, {"freq": freq, "op": ts_op, "filters": filters})
+
+                        with perf.span("plot_resampled", rows=len(ts_df)):
+                            ts_fig = generate_plot(ts_df, [time_col] + ts_values, "Linee")
+                        if ts_fig:
+                            st.pyplot(ts_fig)
+                        _show_paged(_result_pager(repr((result_source, selected_cols, filters, time_col, freq, ts_values, ts_op)),
+                                                  lambda: ResultPager(ts_df), slot="ts"), "ts")
+                    except Exception as e:
+                        st.error(f"Errore durante l'aggregazione temporale: {e}")
+
+            # --- Export dei dati filtrati ---
+            csv_bytes = None
+            if not sql_mode:
                 try:
-                    buf = BytesIO()
-                    fig.savefig(buf, format='png', bbox_inches='tight')
-                    buf.seek(0)
-                    st.download_button(
-                        label='Download grafico PNG',
-                        data=buf.getvalue(),
-                        file_name=f"{filename_base}_{chart_type}.png",
-                        mime='image/png'
-                    )
+                    csv_bytes = export_to_csv(filtered_df)
                 except Exception:
-                    st.info('Impossibile esportare il grafico come PNG.')
+                    csv_bytes = None
+
+            # Determina base per il nome file (upload, oppure dataset selezionato, altrimenti 'dataset')
+            filename_base = 'dataset'
+            try:
+                if upload_file is not None and hasattr(upload_file, 'name'):
+                    filename_base = upload_file.name
+                elif 'selected_dataset' in locals() and selected_dataset and selected_dataset != "-- Seleziona --":
+                    # selected_dataset ha formato: "{id} - {name} ({date})"
+                    try:
+                        name_part = selected_dataset.split(' - ', 1)[1]
+                        # rimuovi la parte tra parentesi finale
+                        name_only = name_part.rsplit(' (', 1)[0]
+                        filename_base = name_only
+                    except Exception:
+                        filename_base = selected_dataset
+            except Exception:
+                filename_base = 'dataset'
+
+            if sql_mode and filtered_rows:
+                _table_exports(signature, selected_cols, filters, filtered_rows, filename_base)
+            elif csv_bytes is not None and not filtered_df.empty:
+                col1, col2 = st.columns(2)
+                with col1:
+                    if st.download_button(
+                        label="Download CSV (filtrato)",
+                        data=csv_bytes,
+                        file_name=f"{filename_base}_filtered.csv",
+                        mime="text/csv"
+                    ):
+                        _record_history("export_csv", selected_cols, {"target": "filtered"}, dedupe=False)
+                with col2:
+                    try:
+                        excel_data = export_to_excel(filtered_df, f"{filename_base}_filtered.xlsx")
+                        if excel_data:
+                            if st.download_button(
+                                label="Download Excel (filtrato)",
+                                data=excel_data,
+                                file_name=f"{filename_base}_filtered.xlsx",
+                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                            ):
+                                _record_history("export_excel", selected_cols, {"target": "filtered"}, dedupe=False)
+                    except Exception:
+                        st.info('Impossibile esportare come Excel.')
+            else:
+                st.button("Download CSV (filtrato)", disabled=True)
+
+
+            # ======================================================
+            # 4) ANALISI STATISTICHE
+            # ======================================================
+            st.header("Analisi statistiche")
+
+            operation = st.selectbox(
+                "Tipo di analisi:",
+                ["Media", "Somma", "Conteggio", "Massimo", "Minimo"]
+            )
+
+            with perf.span("stats", rows=filtered_rows):
+                if sample is not None:
+                    stats = sample.statistics(filtered_df, selected_cols, operation)
+                elif sql_mode:
+                    stats = query_statistics(dataset_id, dataset_version, selected_cols, operation, filters)
+                elif dataset_id is not None and len(filtered_df) == len(df):
+                    # Nessuna riga esclusa dai filtri: statistiche dal riepilogo della versione
+                    summary = load_cache(dataset_id, dataset_version, "summary")
+                    if summary is None:
+                        summary = summarize(df)
+                        save_cache(dataset_id, dataset_version, "summary", "", summary)
+                    stats = statistics_from_summary(summary, selected_cols, operation)
+                else:
+                    stats = compute_statistics(filtered_df, selected_cols, operation)
+            _record_history("stats", selected_cols, {"operation": operation, "filters": filters})
+
+            if stats:
+                st.write("### Risultati:")
+                st.table(stats)
+            else:
+                st.info("Seleziona almeno una colonna numerica.")
+
+            # --- Calcolo esatto (solo su campione) ---
+            if sample is not None:
+                _exact_section(repr((result_source, selected_cols, filters, operation, agg_request, ts_request)),
+                               (dataset_id, dataset_version, get_dataset_info(dataset_id)["storage"] == "table", selected_cols,
+                                filters, operation, agg_request, ts_request))
+
+
+            # ======================================================
+            # 5) GENERAZIONE GRAFICI
+            # ======================================================
+            st.header("Genera grafico")
+
+            chart_type = st.selectbox(
+                "Tipo di grafico:",
+                ["Barre", "Linee", "Istogramma", "Torta"]
+            )
+
+            if sql_mode:
+                # Il grafico non richiede tutte le righe: quelle filtrate del campione del dataset
+                plot_sample = _dataset_sample()
+                plot_df = apply_filters(plot_sample.df, selected_cols, filters)
+                report_df = pager.page(1, 15)
+                st.caption(f"Grafico calcolato su {len(plot_df):,} righe di un campione di "
+                           f"{len(plot_sample):,} su {plot_sample.population:,}.".replace(",", "."))
+            else:
+                plot_df = report_df = filtered_df
+            with perf.span("plot", rows=len(plot_df)):
+                fig = generate_plot(plot_df, selected_cols, chart_type)
+
+            if fig:
+                st.pyplot(fig)
+                # --- Export grafico ---
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    try:
+                        png_data = export_to_png(fig)
+                        if png_data:
+                            if st.download_button(
+                                label='Download grafico PNG',
+                                data=png_data,
+                                file_name=f"{filename_base}_{chart_type}.png",
+                                mime='image/png'
+                            ):
+                                _record_history("export_png", selected_cols, {"target": "filtered"}, dedupe=False)
+                    except Exception:
+                        st.info('Impossibile esportare il grafico come PNG.')
             
-            with col2:
-                try:
-                    pdf_data = export_to_pdf_chart(fig, f"{filename_base}_{chart_type}.pdf")
-                    if pdf_data:
-                        st.download_button(
-                            label='Download grafico PDF',
-                            data=pdf_data,
-                            file_name=f"{filename_base}_{chart_type}.pdf",
-                            mime='application/pdf'
-                        )
-                except Exception:
-                    st.info('Impossibile esportare il grafico come PDF.')
+                with col2:
+                    try:
+                        pdf_data = export_to_pdf_chart(fig, f"{filename_base}_{chart_type}.pdf")
+                        if pdf_data:
+                            if st.download_button(
+                                label='Download grafico PDF',
+                                data=pdf_data,
+                                file_name=f"{filename_base}_{chart_type}.pdf",
+                                mime='application/pdf'
+                            ):
+                                _record_history("export_pdf", selected_cols, {"target": "filtered"}, dedupe=False)
+                    except Exception:
+                        st.info('Impossibile esportare il grafico come PDF.')
             
-            with col3:
-                try:
-                    report_data = export_pdf_report(filtered_df, fig, f"Report: {chart_type}", f"{filename_base}_report_{chart_type}.pdf")
-                    if report_data:
-                        st.download_button(
-                            label='Download Report PDF',
-                            data=report_data,
-                            file_name=f"{filename_base}_report_{chart_type}.pdf",
-                            mime='application/pdf'
-                        )
-                except Exception:
-                    st.info('Impossibile esportare il report PDF.')
-        else:
-            st.warning("Impossibile generare un grafico con i dati selezionati.")
\ No newline at end of file
+                with col3:
+                    try:
+                        report_data = export_pdf_report(report_df, fig, f"Report: {chart_type}", f"{filename_base}_report_{chart_type}.pdf")
+                        if report_data:
+                            if st.download_button(
+                                label='Download Report PDF',
+                                data=report_data,
+                                file_name=f"{filename_base}_report_{chart_type}.pdf",
+                                mime='application/pdf'
+                            ):
+                                _record_history("export_report", selected_cols, {"target": "filtered"}, dedupe=False)
+                    except Exception:
+                        st.info('Impossibile esportare il report PDF.')
+            else:
+                st.warning("Impossibile generare un grafico con i dati selezionati.")
+
+
+    # ======================================================
+    # 6) CRONOLOGIA OPERAZIONI
+    # ======================================================
+    if dataset_id is not None:
+        with st.expander("Cronologia operazioni del dataset"):
+            # Pila di cursori (timestamp, id): uno per pagina visitata
+            cursors = st.session_state.setdefault(f"history_cursors_{dataset_id}", [None])
+            history_rows, next_cursor = query_history(dataset_id, limit=20, before=cursors[-1])
+            if history_rows:
+                st.dataframe(
+                    pd.DataFrame(history_rows, columns=["id", "dataset", "colonne", "operazione", "dettagli", "timestamp"]),
+                    hide_index=True
+                )
+            else:
+                st.caption("Nessuna operazione registrata.")
+            st.caption("Le operazioni vengono salvate in background: le più recenti compaiono entro circa un secondo.")
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("◀ Più recenti", disabled=len(cursors) == 1, key="history_newer"):
+                    cursors.pop()
+                    st.rerun()
+            with col2:
+                if st.button("Più vecchie ▶", disabled=next_cursor is None, key="history_older"):
+                    cursors.append(next_cursor)
+                    st.rerun()
+finally:
+    if capture is not None:
+        capture.stop()
+
+
+# ======================================================
+# 7) PANNELLO PERFORMANCE
+# ======================================================
+if show_perf:
+    if perf.spans:
+        st.sidebar.dataframe(pd.DataFrame(perf.spans), hide_index=True)
+        st.sidebar.caption(f"Totale misurato: {perf.total_seconds():.3f}s (rerun {perf.run_id})")
+    else:
+        st.sidebar.caption("Nessuna fase misurata in questo rerun.")
+
+    registry = get_registry()
+    if registry.stats():
+        st.sidebar.caption(f"Dataset condivisi in memoria: {registry.total_bytes / 1024 ** 2:.1f} MB "
+                           f"(budget {registry.budget_bytes / 1024 ** 2:.0f} MB)")
+        st.sidebar.dataframe(pd.DataFrame(registry.stats()), hide_index=True)
+
+if capture is not None:
+    with st.sidebar.expander("Profilo del rerun", expanded=True):
+        st.code(capture.report())
+
+if perf_target == "Tabella metrics":
+    try:
+        save_metrics(perf.rows())
+    except Exception as e:
+        print(f"[PERF] Impossibile salvare le metriche: {e}")
+elif perf_target == "File JSONL":
+    try:
+        perf.save_jsonl(os.path.join(BASE_DIR, "metrics.jsonl"))
+    except Exception as e:
+        print(f"[PERF] Impossibile salvare le metriche: {e}")
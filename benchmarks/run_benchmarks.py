@@ -0,0 +1,297 @@
+"""
+run_benchmarks.py
+-----------------
+Misura tempo e picco di memoria di ogni fase della pipeline su dataset sintetici.
+
+Fasi: ``load_csv``, ``save_dataset``/``load_dataset`` (BLOB, BLOB compresso zstd, Arrow e tabella SQLite),
+``apply_filters``, ``compute_statistics``, ``aggregate`` (in pandas e in SQL), ``generate_plot`` ed export
+(CSV, Excel, PNG, PDF, report PDF). I risultati vengono scritti in JSON;
+con ``--compare`` si confrontano con un'esecuzione precedente e il comando
+termina con codice 1 se una fase rallenta (o usa più memoria) oltre la soglia.
+
+Esempi::
+
+    python -m benchmarks.run_benchmarks --sizes 10000,100000,1000000 --out bench_base.json
+    python -m benchmarks.run_benchmarks --sizes 10000,100000,1000000 --out bench_new.json \\
+        --compare bench_base.json --threshold 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import pandas as pd
+
+import database
+from benchmarks.synthetic import write_csv, DEFAULT_DTYPES
+from modules.data_loader import load_csv
+from modules.analyzer import apply_filters, compute_statistics, aggregate
+from modules.plotter import generate_plot
+from modules import exporter
+
+
+DEFAULT_SIZES = "10000,100000,1000000"
+# Excel accetta al massimo 1.048.576 righe per foglio (header incluso)
+EXCEL_MAX_ROWS = 1_048_575
+
+
+def _measure(fn, memory: bool, repeat: int):
+    """Esegue ``fn`` ``repeat`` volte e restituisce (risultato, secondi minimi, picco MB)."""
+    best, peak, result = None, 0.0, None
+    for _ in range(repeat):
+        if memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        if memory:
+            peak = max(peak, tracemalloc.get_traced_memory()[1] / 1024 ** 2)
+            tracemalloc.stop()
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best, peak
+
+
+@contextmanager
+def temporary_database(workdir: str, name: str):
+    """Usa un database temporaneo in ``workdir`` per la durata del blocco ``with``.
+
+    Non tocca csv_analyzer.db (né db_init.log): ``database.BASE_DIR`` e
+    ``database.DB_PATH`` vengono ripristinati all'uscita, anche in caso di errore,
+    e i file del database temporaneo (WAL e file Arrow inclusi) vengono rimossi.
+
+    Args:
+        workdir (str): Cartella temporanea.
+        name (str): Nome del file del database.
+
+    Yields:
+        str: Percorso del database temporaneo.
+    """
+    saved = database.BASE_DIR, database.DB_PATH
+    database.BASE_DIR, database.DB_PATH = workdir, os.path.join(workdir, name)
+    try:
+        database.init_db()
+        yield database.DB_PATH
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(database.DB_PATH + suffix)
+            except OSError:
+                pass
+        shutil.rmtree(os.path.join(workdir, "csv_analyzer_data"), ignore_errors=True)
+        database.BASE_DIR, database.DB_PATH = saved
+
+
+def run_size(rows: int, workdir: str, dtypes: str, cardinality: int, seed: int,
+             memory: bool = True, repeat: int = 1) -> dict:
+    """Esegue tutte le fasi su un dataset sintetico di ``rows`` righe.
+
+    Args:
+        rows (int): Numero di righe del dataset.
+        workdir (str): Cartella temporanea per CSV e database.
+        dtypes (str): Mix di tipi di colonna (vedi ``benchmarks.synthetic``).
+        cardinality (int): Valori distinti delle colonne categoriche.
+        seed (int): Seed del generatore.
+        memory (bool, optional): Misura il picco di memoria con ``tracemalloc``. Default True.
+        repeat (int, optional): Ripetizioni per fase (si tiene il tempo minimo). Default 1.
+            Le fasi di salvataggio vengono eseguite una sola volta: dalla seconda
+            ripetizione finirebbero nella deduplicazione invece di scrivere.
+
+    Returns:
+        dict: Mappa fase → ``{"seconds": ..., "peak_mb": ...}`` (o ``{"skipped": motivo}``).
+    """
+    stages = {}
+
+    def stage(name, fn, once=False):
+        result, seconds, peak = _measure(fn, memory, 1 if once else repeat)
+        stages[name] = {"seconds": round(seconds, 6), "peak_mb": round(peak, 3)}
+        print(f"[BENCH] {rows:>10} righe  {name:<20} {seconds:10.4f}s  {peak:10.1f} MB")
+        return result
+
+    csv_path = os.path.join(workdir, f"bench_{rows}.csv")
+    write_csv(csv_path, rows, dtypes=dtypes, cardinality=cardinality, seed=seed)
+
+    def _load():
+        with open(csv_path, "rb") as f:
+            return load_csv(f)[0]
+
+    df = stage("load_csv", _load)
+
+    with temporary_database(workdir, f"bench_{rows}.db"):
+        dataset_id = stage("save_dataset", lambda: database.save_dataset(f"bench_{rows}", df)[0], once=True)
+        # Secondo salvataggio identico: misura la deduplicazione
+        stage("save_dataset_dedup", lambda: database.save_dataset(f"bench_{rows}", df)[0])
+        stage("load_dataset", lambda: database.load_dataset(dataset_id))
+        # Upload dello stesso file con l'1% di righe in più: salva solo il delta
+        extended = pd.concat([df, df.iloc[: max(1, rows // 100)]], ignore_index=True)
+        stage("save_dataset_append", lambda: database.save_dataset_version(f"bench_{rows}", extended)[0], once=True)
+        stage("load_dataset_versioned", lambda: database.load_dataset(dataset_id))
+        arrow_id = stage("save_dataset_arrow",
+                         lambda: database.save_dataset(f"bench_{rows}_arrow", df, storage="arrow")[0], once=True)
+        stage("load_dataset_arrow", lambda: database.load_dataset(arrow_id))
+        zstd_id = stage("save_dataset_zstd", lambda: database.save_dataset(f"bench_{rows}_zstd", df, codec="zstd")[0],
+                        once=True)
+        stage("load_dataset_zstd", lambda: database.load_dataset(zstd_id))
+        table_id = stage("save_dataset_table",
+                         lambda: database.save_dataset(f"bench_{rows}_table", df, storage="table")[0], once=True)
+
+        numeric = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
+        categorical = [c for c in df.columns if c not in numeric]
+        filters = []
+        if numeric:
+            q1, q3 = df[numeric[0]].quantile([0.25, 0.75])
+            filters.append((numeric[0], "between", (q1, q3)))
+        if categorical:
+            values = df[categorical[0]].dropna().unique().tolist()
+            filters.append((categorical[0], "in", values[: max(1, len(values) // 2)]))
+        columns = df.columns.tolist()
+
+        filtered = stage("apply_filters", lambda: apply_filters(df, columns, filters))
+        stage("compute_statistics", lambda: [compute_statistics(filtered, columns, op)
+                                             for op in ["Media", "Somma", "Conteggio", "Massimo", "Minimo"]])
+        # Stesse operazioni eseguite da SQLite sul dataset in formato tabella
+        stage("sql_filter", lambda: database.query_dataset(table_id, columns=columns, filters=filters))
+        stage("sql_statistics", lambda: [database.query_statistics(table_id, None, columns, op, filters)
+                                         for op in ["Media", "Somma", "Conteggio", "Massimo", "Minimo"]])
+
+        agg_df = None
+        if numeric and categorical:
+            agg_df = stage("aggregate", lambda: aggregate(filtered, categorical[0], numeric, "sum"))
+            stage("sql_aggregate",
+                  lambda: database.query_aggregate(table_id, None, categorical[0], numeric, "sum", filters))
+        else:
+            stages["aggregate"] = {"skipped": "servono colonne numeriche e categoriche"}
+
+        def _plot():
+            fig = generate_plot(filtered, numeric or columns, "Istogramma")
+            plt.close(fig)
+            return fig
+
+        stage("generate_plot", _plot)
+        fig = generate_plot(agg_df if agg_df is not None else filtered.head(50),
+                            ([categorical[0]] + numeric) if agg_df is not None else columns, "Barre")
+
+        stage("export_csv", lambda: exporter.export_to_csv(filtered))
+        if len(filtered) <= EXCEL_MAX_ROWS:
+            stage("export_excel", lambda: exporter.export_to_excel(filtered, "bench.xlsx"))
+        else:
+            stages["export_excel"] = {"skipped": "oltre il limite di righe di Excel"}
+        if fig is not None:
+            stage("export_png", lambda: exporter.export_to_png(fig))
+            stage("export_pdf", lambda: exporter.export_to_pdf_chart(fig, "bench.pdf"))
+            stage("export_report", lambda: exporter.export_pdf_report(filtered, fig, "Benchmark", "bench_report.pdf"))
+            plt.close(fig)
+
+    try:
+        os.remove(csv_path)
+    except OSError:
+        pass
+    return stages
+
+
+def compare(current: dict, baseline: dict, threshold: float, min_seconds: float = 0.01,
+            memory_threshold: float = None, min_mb: float = 1.0) -> list:
+    """Confronta due risultati e restituisce le fasi che hanno subito una regressione.
+
+    Una fase regredisce se il tempo o il picco di memoria crescono oltre la soglia.
+    Il picco di memoria viene confrontato solo se misurato in entrambe le esecuzioni
+    (non con ``--no-memory``).
+
+    Args:
+        current (dict): Risultati dell'esecuzione corrente (formato di ``run_benchmarks``).
+        baseline (dict): Risultati di riferimento.
+        threshold (float): Rallentamento relativo tollerato (es. ``0.2`` = +20%).
+        min_seconds (float, optional): Le fasi più veloci di così nel riferimento vengono
+            ignorate perché dominate dal rumore. Default 0.01.
+        memory_threshold (float, optional): Aumento relativo del picco di memoria tollerato
+            (default: ``threshold``).
+        min_mb (float, optional): Picchi di memoria inferiori nel riferimento vengono
+            ignorati. Default 1.0.
+
+    Returns:
+        list[tuple]: Tuple ``(righe, fase, metrica, base, corrente, rapporto)`` per le regressioni,
+            con metrica ``'seconds'`` o ``'peak_mb'``.
+    """
+    if memory_threshold is None:
+        memory_threshold = threshold
+    limits = [("seconds", threshold, min_seconds, "s"), ("peak_mb", memory_threshold, min_mb, " MB")]
+    regressions = []
+    for size, stages in current["results"].items():
+        base_stages = baseline.get("results", {}).get(size, {})
+        for name, cur in stages.items():
+            base = base_stages.get(name) or {}
+            for metric, limit, minimum, unit in limits:
+                # peak_mb è 0 quando la memoria non è stata misurata
+                if metric not in base or metric not in cur or base[metric] < minimum or cur[metric] == 0:
+                    continue
+                ratio = cur[metric] / base[metric]
+                flag = "REGRESSIONE" if ratio > 1 + limit else ""
+                print(f"[BENCH] {size:>10} righe  {name:<20} {base[metric]:10.4f}{unit} -> "
+                      f"{cur[metric]:10.4f}{unit}  x{ratio:5.2f} {flag}")
+                if flag:
+                    regressions.append((size, name, metric, base[metric], cur[metric], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark delle fasi della pipeline CSV Analyzer")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"Numero di righe separate da virgola, fino a 50000000 (default: {DEFAULT_SIZES})")
+    parser.add_argument("--dtypes", default=DEFAULT_DTYPES, help=f"Mix di tipi (default: {DEFAULT_DTYPES})")
+    parser.add_argument("--cardinality", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="Ripetizioni per fase (si tiene il minimo; i salvataggi una volta sola)")
+    parser.add_argument("--no-memory", action="store_true", help="Non misura il picco di memoria (più veloce)")
+    parser.add_argument("--out", default="bench_results.json", help="File JSON dei risultati")
+    parser.add_argument("--compare", help="File JSON di un'esecuzione precedente da confrontare")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Rallentamento tollerato (default: 0.2 = +20%%)")
+    parser.add_argument("--memory-threshold", type=float, default=None,
+                        help="Aumento del picco di memoria tollerato (default: come --threshold)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="csv_analyzer_bench_") as workdir:
+        for rows in sizes:
+            results[str(rows)] = run_size(rows, workdir, args.dtypes, args.cardinality, args.seed,
+                                          memory=not args.no_memory, repeat=args.repeat)
+
+    output = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "dtypes": args.dtypes,
+            "cardinality": args.cardinality,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2)
+    print(f"[BENCH] Risultati scritti in: {args.out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(output, baseline, args.threshold, memory_threshold=args.memory_threshold)
+        if regressions:
+            print(f"[BENCH] {len(regressions)} misure oltre la soglia")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+synthetic.py
+------------
+Generatore deterministico di dataset CSV sintetici per i benchmark.
+
+Lo stesso ``seed`` produce sempre gli stessi dati, così due esecuzioni dei
+benchmark lavorano sullo stesso input. Il mix di tipi si descrive con una
+stringa ``"tipo:numero"`` separata da virgole, ad esempio
+``"int:2,float:3,cat:2,str:1"``.
+
+Uso da riga di comando::
+
+    python -m benchmarks.synthetic out.csv --rows 1000000 --dtypes int:2,float:3,cat:2 --encoding latin1
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+
+DTYPES = ("int", "float", "cat", "str", "bool")
+DEFAULT_DTYPES = "int:2,float:3,cat:2,str:1"
+
+
+def parse_dtypes(spec: str) -> list:
+    """Converte una specifica ``"int:2,float:3"`` nella lista ordinata dei tipi di colonna.
+
+    Args:
+        spec (str): Mix di tipi, ``tipo:numero`` separati da virgola.
+
+    Returns:
+        list[str]: Un elemento per colonna (es. ``['int', 'int', 'float', ...]``).
+
+    Raises:
+        ValueError: Se un tipo non è supportato.
+    """
+    kinds = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        kind, _, count = part.partition(":")
+        if kind not in DTYPES:
+            raise ValueError(f"Tipo di colonna non supportato: {kind!r} (ammessi: {', '.join(DTYPES)})")
+        kinds.extend([kind] * int(count or 1))
+    return kinds
+
+
+def _column(kind: str, rows: int, cardinality: int, rng: np.random.Generator, offset: int):
+    if kind == "int":
+        return rng.integers(0, 1_000_000, rows)
+    if kind == "float":
+        return rng.normal(1000.0, 250.0, rows).round(4)
+    if kind == "bool":
+        return rng.random(rows) < 0.5
+    if kind == "cat":
+        # Caratteri accentati per esercitare gli encoding non UTF-8
+        labels = np.array([f"città_{i}" for i in range(cardinality)], dtype=object)
+        return labels[rng.integers(0, cardinality, rows)]
+    # str: valori quasi unici (es. identificativi)
+    return np.char.add("id_", (np.arange(rows) + offset).astype(str)).astype(object)
+
+
+def generate_dataframe(rows: int, dtypes: str = DEFAULT_DTYPES, cardinality: int = 50,
+                       null_ratio: float = 0.0, seed: int = 0, offset: int = 0) -> pd.DataFrame:
+    """Genera un ``DataFrame`` sintetico deterministico.
+
+    Args:
+        rows (int): Numero di righe.
+        dtypes (str, optional): Mix di tipi di colonna (vedi ``parse_dtypes``).
+        cardinality (int, optional): Numero di valori distinti delle colonne ``cat``. Default 50.
+        null_ratio (float, optional): Frazione di valori mancanti nelle colonne numeriche. Default 0.
+        seed (int, optional): Seed del generatore casuale. Default 0.
+        offset (int, optional): Indice della prima riga (usato per generare a blocchi). Default 0.
+
+    Returns:
+        pandas.DataFrame: Dataset con colonne ``<tipo>_<n>``.
+    """
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i, kind in enumerate(parse_dtypes(dtypes)):
+        values = _column(kind, rows, cardinality, rng, offset)
+        if null_ratio and kind in ("int", "float"):
+            values = values.astype(float)
+            values[rng.random(rows) < null_ratio] = np.nan
+        data[f"{kind}_{i}"] = values
+    return pd.DataFrame(data)
+
+
+def write_csv(path: str, rows: int, dtypes: str = DEFAULT_DTYPES, cardinality: int = 50,
+              null_ratio: float = 0.0, seed: int = 0, encoding: str = "utf-8", sep: str = ",",
+              chunk_rows: int = 1_000_000) -> str:
+    """Scrive su disco un CSV sintetico, a blocchi per contenere la memoria.
+
+    Ogni blocco usa un seed derivato da ``seed`` e dall'indice del blocco, quindi
+    il file risultante è identico a parità di parametri.
+
+    Args:
+        path (str): Percorso del file da scrivere.
+        rows (int): Numero totale di righe.
+        dtypes (str, optional): Mix di tipi di colonna.
+        cardinality (int, optional): Valori distinti delle colonne ``cat``.
+        null_ratio (float, optional): Frazione di valori mancanti nelle colonne numeriche.
+        seed (int, optional): Seed di base.
+        encoding (str, optional): Encoding del file (es. ``utf-8``, ``latin1``, ``cp1252``).
+        sep (str, optional): Separatore di campo. Default ``,``.
+        chunk_rows (int, optional): Righe per blocco. Default 1.000.000.
+
+    Returns:
+        str: Il percorso del file scritto.
+    """
+    with open(path, "w", encoding=encoding, newline="") as f:
+        for n, start in enumerate(range(0, rows, chunk_rows)):
+            size = min(chunk_rows, rows - start)
+            chunk = generate_dataframe(size, dtypes, cardinality, null_ratio, seed=[seed, n], offset=start)
+            chunk.to_csv(f, index=False, header=(n == 0), sep=sep)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera un CSV sintetico deterministico")
+    parser.add_argument("path", help="File CSV da creare")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dtypes", default=DEFAULT_DTYPES, help=f"Mix di tipi (default: {DEFAULT_DTYPES})")
+    parser.add_argument("--cardinality", type=int, default=50, help="Valori distinti delle colonne 'cat'")
+    parser.add_argument("--null-ratio", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--encoding", default="utf-8")
+    parser.add_argument("--sep", default=",")
+    args = parser.parse_args(argv)
+    write_csv(args.path, args.rows, args.dtypes, args.cardinality, args.null_ratio, args.seed, args.encoding, args.sep)
+    print(f"[BENCH] Scritto {args.path} ({args.rows} righe)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+cli.py
+------
+Punto d'ingresso a riga di comando (senza interfaccia Streamlit).
+
+Esempi::
+
+    python cli.py batch data/ --spec spec.json --out output/ --workers 4 --persist
+    python cli.py ingest "data/vendite_*.csv" --name vendite --workers 8 --codec zstd
+    python cli.py codecs 3 --repeat 5
+    python cli.py serve --port 8765
+"""
+
+import argparse
+import sys
+
+
+def _cmd_batch(args):
+    from modules.batch import load_spec, collect_inputs, run_batch
+
+    inputs = collect_inputs(args.source)
+    if not inputs:
+        print(f"[BATCH] Nessun CSV trovato in: {args.source}")
+        return 1
+
+    spec = load_spec(args.spec)
+    results = run_batch(inputs, spec, args.out, workers=args.workers, persist=args.persist)
+    return 0 if all(r["status"] != "error" for r in results) else 1
+
+
+def _cmd_ingest(args):
+    from modules.batch import collect_inputs
+    from modules.data_loader import load_many, align_schemas
+    from database import init_db, save_partitioned_dataset
+
+    inputs = collect_inputs(args.source)
+    if not inputs:
+        print(f"[INGEST] Nessun CSV trovato in: {args.source}")
+        return 1
+
+    # Processo a riga di comando: i file vengono letti in processi separati (parsing in parallelo)
+    loaded = load_many(inputs, max_workers=args.workers, executor="process")
+    errors = [(name, err) for name, _, err in loaded if err]
+    for name, err in errors:
+        print(f"[INGEST] {name}: {err}")
+    if errors:
+        return 1
+
+    frames, err = align_schemas([df for _, df, _ in loaded])
+    if err:
+        print(f"[INGEST] {err}")
+        return 1
+
+    init_db()
+    dataset_id, status = save_partitioned_dataset(args.name, frames, [name for name, _, _ in loaded],
+                                                  storage=args.storage, codec=args.codec)
+    if dataset_id is None:
+        return 1
+    print(f"[INGEST] {len(frames)} file, {sum(len(df) for df in frames)} righe -> dataset id={dataset_id} ({status})")
+    return 0
+
+
+def _cmd_codecs(args):
+    import os
+    import pickle
+    from modules.compression import benchmark
+    from modules.data_loader import load_csv
+
+    if os.path.isfile(args.dataset):
+        with open(args.dataset, "rb") as f:
+            df, err = load_csv(f)
+        if err:
+            print(f"[CODECS] {err}")
+            return 1
+    else:
+        from database import init_db, load_dataset
+
+        init_db()
+        df = load_dataset(int(args.dataset))
+        if df is None:
+            print(f"[CODECS] Dataset non trovato: {args.dataset}")
+            return 1
+
+    # Lo stesso payload salvato nel formato blob
+    data = pickle.dumps(df)
+    codecs = [c.strip() for c in args.codecs.split(",") if c.strip()] if args.codecs else None
+    try:
+        results = benchmark(data, codecs, repeat=args.repeat)
+    except ValueError as e:
+        print(f"[CODECS] {e}")
+        return 1
+
+    print(f"[CODECS] {len(df)} righe, payload {len(data) / 1024 ** 2:.1f} MB")
+    print(f"{'codec':<8} {'MB':>9} {'rapporto':>9} {'compr. MB/s':>12} {'decompr. MB/s':>14}")
+    for r in sorted(results, key=lambda r: r["size"]):
+        print(f"{r['codec']:<8} {r['size'] / 1024 ** 2:9.2f} {r['ratio']:9.2f} "
+              f"{r['compress_mb_s']:12.1f} {r['decompress_mb_s']:14.1f}")
+    return 0
+
+
+def _cmd_serve(args):
+    import asyncio
+    from modules.service import serve
+
+    try:
+        asyncio.run(serve(host=args.host, port=args.port, workers=args.workers))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def build_parser():
+    """Costruisce il parser degli argomenti con i sottocomandi disponibili.
+
+    Returns:
+        argparse.ArgumentParser: Parser configurato.
+    """
+    parser = argparse.ArgumentParser(prog="cli.py", description="CSV Analyzer da riga di comando")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    batch = sub.add_parser("batch", help="Esegue la pipeline di analisi su molti CSV in parallelo")
+    batch.add_argument("source", help="Cartella con i CSV oppure pattern glob (es. 'data/*.csv')")
+    batch.add_argument("--spec", required=True, help="Specifica JSON/YAML di filtri, statistiche, aggregazioni, grafici ed export")
+    batch.add_argument("--out", default="output", help="Cartella di output (default: output)")
+    batch.add_argument("--workers", type=int, default=None, help="Numero di processi worker (default: numero di CPU)")
+    batch.add_argument("--persist", action="store_true", help="Salva i dataset caricati nel database")
+    batch.set_defaults(func=_cmd_batch)
+
+    ingest = sub.add_parser("ingest", help="Importa molti CSV come partizioni di un unico dataset")
+    ingest.add_argument("source", help="Cartella con i CSV oppure pattern glob (es. 'data/*.csv')")
+    ingest.add_argument("--name", required=True, help="Nome del dataset")
+    ingest.add_argument("--workers", type=int, default=None, help="Numero di processi per il parsing (default: numero di CPU)")
+    ingest.add_argument("--storage", choices=["blob", "arrow"], default=None,
+                        help="Formato di archiviazione (default: CSV_ANALYZER_STORAGE o blob)")
+    ingest.add_argument("--codec", default=None,
+                        help="Compressione (none, zlib, lzma, bz2, zstd, lz4, ...; default: CSV_ANALYZER_CODEC o none)")
+    ingest.set_defaults(func=_cmd_ingest)
+
+    codecs = sub.add_parser("codecs", help="Confronta rapporto e velocità dei codec di compressione su un dataset")
+    codecs.add_argument("dataset", help="ID di un dataset salvato oppure percorso di un CSV")
+    codecs.add_argument("--codecs", default=None, help="Codec separati da virgola (default: tutti i disponibili)")
+    codecs.add_argument("--repeat", type=int, default=3, help="Ripetizioni per misura (si tiene il minimo)")
+    codecs.set_defaults(func=_cmd_codecs)
+
+    serve = sub.add_parser("serve", help="Avvia il servizio HTTP locale di analisi")
+    serve.add_argument("--host", default="127.0.0.1", help="Indirizzo di ascolto (default: 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=8765, help="Porta TCP (default: 8765)")
+    serve.add_argument("--workers", type=int, default=None, help="Thread nel pool di lavoro")
+    serve.set_defaults(func=_cmd_serve)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
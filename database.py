@@ -1,19 +1,234 @@
 import sqlite3
+import numpy as np
 import pandas as pd
 import pickle
 from datetime import datetime
 import os
+import hashlib
+import json
+
+from modules.analyzer import (summarize, merge_summaries, rollup, merge_rollups, column_ranges, partition_range,
+                              partition_may_match, resample_rollup)
+from modules import sql_query, compression
+from modules.categorical import ValueDictionary
+from modules.sampling import draw_sample, SAMPLE_SIZE, SAMPLE_THRESHOLD
 
 # Path assoluto alla cartella che contiene questo file
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "csv_analyzer.db")
 
+# Formato di archiviazione dei nuovi dataset:
+# - "blob":  DataFrame serializzato con pickle nella colonna `data`
+# - "arrow": file Arrow IPC (Feather v2) accanto al DB, aperto in memory-map
+# - "table": tabella SQLite tipizzata nello stesso DB, interrogabile in SQL
+#            (filtri, statistiche e aggregazioni eseguiti dal database)
+STORAGE_FORMATS = ("blob", "arrow", "table")
+DEFAULT_STORAGE = os.environ.get("CSV_ANALYZER_STORAGE", "blob")
+
+# Compressione dei nuovi dataset ("none" o un codec di modules.compression);
+# il codec usato viene salvato nella colonna `codec` di ogni record
+DEFAULT_CODEC = os.environ.get("CSV_ANALYZER_CODEC", "none")
+
+# Attesa massima (secondi) di un lock di scrittura occupato, uguale per tutte le connessioni.
+# I salvataggi scrivono dati, riepiloghi e campioni prima di prendere il lock e lo
+# tengono solo per le righe dei metadati, quindi l'attesa resta breve
+BUSY_TIMEOUT = 30
+
+# Tentativi di salvataggio quando un salvataggio concorrente modifica gli stessi record
+SAVE_ATTEMPTS = 3
+
+
+def _connect() -> sqlite3.Connection:
+    """Apre una connessione al database con le impostazioni comuni a tutto il modulo.
+
+    Il journal WAL permette di leggere mentre un'altra connessione scrive, e il
+    busy timeout fa attendere (invece di fallire con "database is locked") le
+    scritture che trovano il lock occupato, es. cache e cronologia durante un salvataggio.
+    """
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def _data_dir() -> str:
+    # Cartella dei file Arrow: accanto a DB_PATH (segue eventuali override del percorso)
+    return os.path.join(os.path.dirname(DB_PATH), "csv_analyzer_data")
+
+
+def _add_column_if_missing(c, table: str, column: str, decl: str):
+    # Migrazione leggera per DB creati con versioni precedenti dello schema
+    c.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in c.fetchall()]:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _sql_type(series: pd.Series) -> str:
+    # Il tipo dichiarato resta nello schema (PRAGMA table_info) e permette di
+    # ricostruire i dtype in lettura; BOOLEAN e DATETIME hanno affinità NUMERIC
+    if pd.api.types.is_bool_dtype(series):
+        return "BOOLEAN"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "DATETIME"
+    if pd.api.types.is_integer_dtype(series):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(series):
+        return "REAL"
+    return "TEXT"
+
+
+def _write_table(c, df: pd.DataFrame, chunk_rows: int = 100_000) -> str:
+    """Scrive il DataFrame in una nuova tabella tipizzata e ne restituisce il nome.
+
+    Ogni blocco di ``chunk_rows`` righe è una transazione a sé: il lock di scrittura
+    viene rilasciato fra un blocco e l'altro. La tabella non è visibile finché il
+    chiamante non la registra in `datasets` (vedi ``_stage_payload``).
+
+    Gli indici sulle colonne vengono creati al primo filtro che le usa
+    (vedi ``_ensure_indexes``), per non pagarli su colonne mai filtrate.
+    """
+    import uuid
+
+    table = f"ds_{uuid.uuid4().hex}"
+    q = sql_query.quote_ident
+    decls = ", ".join(f"{q(col)} {_sql_type(df[col])}" for col in df.columns)
+    c.execute(f"CREATE TABLE {q(table)} ({decls})")
+    insert = f"INSERT INTO {q(table)} VALUES ({', '.join('?' * len(df.columns))})"
+    dt_cols = [col for col in df.columns if pd.api.types.is_datetime64_any_dtype(df[col])]
+    try:
+        for start in range(0, len(df), chunk_rows):
+            chunk = df.iloc[start:start + chunk_rows]
+            if dt_cols:
+                chunk = chunk.assign(**{col: sql_query.datetime_text(chunk[col]) for col in dt_cols})
+            # Valori mancanti → NULL; astype(object) restituisce scalari Python
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            c.executemany(insert, chunk.itertuples(index=False, name=None))
+            c.connection.commit()
+    except Exception:
+        # Nessuna tabella parziale: il chiamante può ripiegare sul formato blob
+        c.connection.rollback()
+        c.execute(f"DROP TABLE IF EXISTS {q(table)}")
+        c.connection.commit()
+        raise
+    return table
+
+
+def _column_types(c, table: str) -> dict:
+    # Colonna → tipo dichiarato (BOOLEAN, DATETIME, INTEGER, REAL, TEXT)
+    c.execute(f"PRAGMA table_info({sql_query.quote_ident(table)})")
+    return {row[1]: row[2] for row in c.fetchall()}
+
+
+def _restore_types(c, table: str, df: pd.DataFrame) -> pd.DataFrame:
+    # Ricostruisce i dtype pandas dai tipi dichiarati della tabella
+    for col, decl in _column_types(c, table).items():
+        if col not in df.columns:
+            continue
+        s = df[col]
+        if decl == "DATETIME":
+            df[col] = pd.to_datetime(s)
+        elif decl == "BOOLEAN":
+            df[col] = s.astype(bool) if s.notna().all() else s.astype("float64")
+        elif decl in ("INTEGER", "REAL") and s.dtype == object:
+            # Colonne vuote o interamente NULL arrivano come object
+            df[col] = s.astype("int64" if decl == "INTEGER" and s.notna().all() else "float64")
+    return df
+
+
+def _write_payload(df: pd.DataFrame, storage: str, c=None, codec: str = None):
+    """Serializza il DataFrame nel formato richiesto.
+
+    Args:
+        df (pandas.DataFrame): Dati da salvare.
+        storage (str): ``'blob'``, ``'arrow'`` o ``'table'``.
+        c (sqlite3.Cursor, optional): Cursore fuori da transazioni (obbligatorio per ``'table'``).
+        codec (str, optional): Compressione (vedi ``modules.compression``); per ``'arrow'``
+            solo i codec di ``ARROW_IPC_CODECS``, per ``'table'`` va passato ``None``.
+
+    Returns:
+        tuple[bytes, str | None]: Valore per la colonna `data` e nome del file Arrow
+            o della tabella (``None`` per il formato ``blob``).
+
+    Raises:
+        ValueError: Se il formato o il codec non sono supportati.
+    """
+    if storage == "blob":
+        return compression.compress(pickle.dumps(df), codec), None
+    if storage == "table":
+        return b"", _write_table(c, df)
+    if storage != "arrow":
+        raise ValueError(f"Formato di archiviazione non supportato: {storage!r}")
+    if codec is not None and codec not in compression.ARROW_IPC_CODECS:
+        raise ValueError(f"Il formato Arrow supporta solo i codec {', '.join(compression.ARROW_IPC_CODECS)}")
+
+    import uuid
+    import pyarrow as pa
+
+    os.makedirs(_data_dir(), exist_ok=True)
+    filename = f"{uuid.uuid4().hex}.arrow"
+    path = os.path.join(_data_dir(), filename)
+    table = pa.Table.from_pandas(df)
+    # Senza codec il file non è compresso: condizione necessaria per il memory-map senza copie
+    options = pa.ipc.IpcWriteOptions(compression=codec) if codec else None
+    tmp_path = path + ".tmp"
+    try:
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+    except Exception:
+        # Nessun file parziale: il chiamante può ripiegare sul formato blob
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return b"", filename
+
+
+def _read_payload(storage: str, blob: bytes, path: str, codec: str = None) -> pd.DataFrame:
+    """Ricostruisce il DataFrame a partire da una riga di `datasets`.
+
+    Per il formato ``arrow`` il file viene aperto in memory-map: le colonne
+    numeriche senza valori mancanti restano viste (in sola lettura) sulle pagine
+    del file, condivise dal page cache del sistema operativo fra sessioni e
+    processi; le colonne di testo vengono invece convertite in oggetti Python.
+    I file Arrow compressi vengono decompressi da pyarrow in lettura; i BLOB
+    con ``codec``.
+    """
+    if storage == "arrow":
+        import pyarrow as pa
+
+        source = pa.memory_map(os.path.join(_data_dir(), path), "r")
+        table = pa.ipc.open_file(source).read_all()
+        return table.to_pandas(split_blocks=True)
+    if storage == "table":
+        conn = _connect()
+        try:
+            df = pd.read_sql_query(f"SELECT * FROM {sql_query.quote_ident(path)}", conn)
+            return _restore_types(conn.cursor(), path, df)
+        finally:
+            conn.close()
+    return pickle.loads(compression.decompress(blob, codec))
+
+
+def _iter_payload(storage: str, blob: bytes, path: str, codec: str = None, chunk_rows: int = 500_000):
+    """Come ``_read_payload``, ma le tabelle SQLite vengono lette a blocchi di ``chunk_rows`` righe."""
+    if storage != "table":
+        yield _read_payload(storage, blob, path, codec)
+        return
+    conn = _connect()
+    try:
+        sql = f"SELECT * FROM {sql_query.quote_ident(path)} ORDER BY rowid"
+        for chunk in pd.read_sql_query(sql, conn, chunksize=chunk_rows):
+            yield _restore_types(conn.cursor(), path, chunk)
+    finally:
+        conn.close()
+
 
 def init_db():
     """Crea le tabelle del database se non esistono.
 
     Questo metodo inizializza il file SQLite nella cartella del progetto
-    creando le tabelle `datasets` e `history` se non presenti. Scrive
+    creando le tabelle `datasets`, `dataset_segments`, `dataset_cache`, `history`
+    e `metrics` se non presenti. Scrive
     anche un log semplice in `db_init.log` per tracciare le invocazioni.
 
     Returns:
@@ -24,7 +239,7 @@ def init_db():
     print(f"[DB] File esiste? {os.path.exists(DB_PATH)}")
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = _connect()
         c = conn.cursor()
 
         c.execute("""
@@ -47,6 +262,69 @@ def init_db():
             )
         """)
 
+        # Migrazioni: colonne assenti nei DB creati con versioni precedenti
+        _add_column_if_missing(c, "datasets", "storage", "TEXT NOT NULL DEFAULT 'blob'")
+        _add_column_if_missing(c, "datasets", "path", "TEXT")
+        _add_column_if_missing(c, "datasets", "version", "INTEGER NOT NULL DEFAULT 1")
+        _add_column_if_missing(c, "datasets", "row_count", "INTEGER")
+        _add_column_if_missing(c, "datasets", "fingerprint", "TEXT")
+        _add_column_if_missing(c, "datasets", "partition", "TEXT")
+        _add_column_if_missing(c, "datasets", "stats", "TEXT")
+        _add_column_if_missing(c, "datasets", "codec", "TEXT")
+        _add_column_if_missing(c, "history", "details", "TEXT")
+        # Timestamp al secondo delle versioni precedenti → formato al millisecondo di history_timestamp
+        c.execute("UPDATE history SET timestamp = timestamp || '.000' WHERE length(timestamp) = 19")
+
+        # Indici per le query paginate sulla cronologia (per dataset e globale)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_history_dataset_ts ON history(dataset_id, timestamp)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_history_ts ON history(timestamp)")
+
+        # Segmenti di righe aggiunte: la versione N di un dataset è il record
+        # base in `datasets` più i segmenti con version <= N
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS dataset_segments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                dataset_id INTEGER NOT NULL,
+                version INTEGER NOT NULL,
+                row_count INTEGER NOT NULL,
+                storage TEXT NOT NULL DEFAULT 'blob',
+                data BLOB NOT NULL,
+                path TEXT,
+                created TEXT NOT NULL,
+                FOREIGN KEY(dataset_id) REFERENCES datasets(id)
+            )
+        """)
+        # Partizioni (file di origine) e min/max per colonna, usati per saltare
+        # le partizioni che non possono soddisfare un filtro di intervallo
+        _add_column_if_missing(c, "dataset_segments", "partition", "TEXT")
+        _add_column_if_missing(c, "dataset_segments", "stats", "TEXT")
+        _add_column_if_missing(c, "dataset_segments", "codec", "TEXT")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_segments_dataset ON dataset_segments(dataset_id, version)")
+
+        # Statistiche e rollup precalcolati per versione (aggiornati in modo incrementale)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS dataset_cache (
+                dataset_id INTEGER NOT NULL,
+                version INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                PRIMARY KEY (dataset_id, version, kind, key)
+            )
+        """)
+
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                seconds REAL,
+                peak_mb REAL,
+                rows INTEGER,
+                timestamp TEXT
+            )
+        """)
+
         conn.commit()
         conn.close()
         
@@ -73,101 +351,890 @@ def init_db():
         pass
 
 
-def save_dataset(name: str, df: pd.DataFrame):
+def _schema_signature(df: pd.DataFrame) -> str:
+    return "|".join(f"{col}:{dtype}" for col, dtype in df.dtypes.items())
+
+
+def _row_hashes(df: pd.DataFrame):
+    # Un hash a 64 bit per riga (vettoriale), indipendente dall'indice
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def _fingerprint(schema: str, row_hashes) -> str:
+    """Impronta del contenuto: schema + hash delle righe, nell'ordine.
+
+    L'impronta dei primi ``n`` hash coincide con quella di una versione di ``n``
+    righe, e permette di riconoscere un upload che estende un dataset esistente.
+    """
+    h = hashlib.sha1(schema.encode("utf-8"))
+    h.update(row_hashes.tobytes())
+    return h.hexdigest()
+
+
+def _normalize(df_in: pd.DataFrame) -> pd.DataFrame:
+    # Normalizzazione semplice: ordina le colonne, reset indice, arrotonda float, fillna
+    d = df_in.copy()
+    # Ordina colonne per avere confronto indipendente dall'ordine
+    d = d.reindex(sorted(d.columns), axis=1)
+    d = d.reset_index(drop=True)
+    # Arrotonda float a 6 decimali per evitare differenze minime
+    float_cols = d.select_dtypes(include=['float', 'float64', 'float32']).columns
+    for c in float_cols:
+        d[c] = d[c].round(6)
+    # Sostituisci NaN con stringa vuota per confronto coerente
+    d = d.fillna('')
+    return d
+
+
+def _write_payload_or_blob(name: str, df: pd.DataFrame, storage: str, c=None, codec: str = None):
+    # Restituisce (storage, data, path, codec) effettivamente usati; "none" viene salvato come NULL
+    codec = None if codec in (None, "none") else codec
+    if storage == "table" and codec is not None:
+        # SQLite non comprime le tabelle: il codec non si applica
+        print(f"[DB] Compressione {codec} ignorata per '{name}' (formato tabella)")
+        codec = None
+    try:
+        return (storage,) + _write_payload(df, storage, c, codec) + (codec,)
+    except Exception as e:
+        if storage == "blob":
+            raise
+        # Ad es. colonne con tipi misti non rappresentabili in Arrow, o codec non supportato da Arrow
+        print(f"[DB] Impossibile salvare '{name}' come {storage} ({e}), uso il formato blob")
+        return ("blob",) + _write_payload(df, "blob", codec=codec) + (codec,)
+
+
+def _stage_payload(name: str, df: pd.DataFrame, storage: str, codec: str = None):
+    """Scrive i dati di un record prima del lock di scrittura (vedi ``_write_payload_or_blob``).
+
+    Le tabelle vengono scritte con una connessione propria, un blocco di righe per
+    transazione; finché il record non viene registrato nessuno le legge. Se il
+    salvataggio non va a buon fine vanno eliminate con ``_discard_payload``.
+
+    Returns:
+        tuple: ``(storage, data, path, codec)`` effettivamente usati.
+    """
+    if storage != "table":
+        return _write_payload_or_blob(name, df, storage, codec=codec)
+    conn = _connect()
+    try:
+        return _write_payload_or_blob(name, df, storage, conn.cursor(), codec)
+    finally:
+        conn.close()
+
+
+def _discard_payload(storage: str, data: bytes, path: str, codec: str = None):
+    # Elimina file Arrow o tabella di un record preparato ma mai registrato
+    if not path:
+        return
+    try:
+        if storage == "arrow":
+            os.remove(os.path.join(_data_dir(), path))
+        elif storage == "table":
+            conn = _connect()
+            try:
+                conn.execute(f"DROP TABLE IF EXISTS {sql_query.quote_ident(path)}")
+                conn.commit()
+            finally:
+                conn.close()
+    except Exception as e:
+        print(f"[DB] Impossibile eliminare i dati non registrati '{path}': {e}")
+
+
+def save_dataset(name: str, df: pd.DataFrame, storage: str = None, codec: str = None):
     """
     Salva il DataFrame nel DB.
 
     Comportamento (Opzione 1 - nome + contenuto semplificato):
     - Se esistono record con lo stesso `name`, confronta il contenuto normalizzato.
       Se trovi un dataset identico, non crea un duplicato e ritorna (existing_id, False).
+    - Se il nuovo contenuto estende un dataset esistente (stesse righe iniziali),
+      salva solo le righe aggiunte come nuova versione e ritorna (existing_id, False).
     - Altrimenti inserisce un nuovo record e ritorna (new_id, True).
+
+    ``storage`` sceglie il formato del nuovo record (``'blob'`` o ``'arrow'``,
+    default ``DEFAULT_STORAGE``); con ``'arrow'`` la riga contiene solo il nome
+    del file in `csv_analyzer_data/`. ``codec`` sceglie la compressione
+    (default ``DEFAULT_CODEC``, vedi ``modules.compression``).
+
+    Vedi ``save_dataset_version`` per distinguere duplicato e nuova versione.
+    """
+    dataset_id, status = save_dataset_version(name, df, storage, codec)
+    return dataset_id, status == "created"
+
+
+def save_dataset_version(name: str, df: pd.DataFrame, storage: str = None, codec: str = None):
+    """Salva il DataFrame riconoscendo duplicati ed estensioni di dataset esistenti.
+
+    Per ogni record con lo stesso nome:
+
+    - stessa impronta e stesso numero di righe → duplicato, nessuna scrittura;
+    - le prime ``row_count`` righe hanno l'impronta del record → il file è
+      un'estensione: vengono salvate solo le righe nuove come segmento della
+      versione successiva, e statistiche/rollup in cache vengono aggiornati
+      fondendo quelli della versione precedente con quelli del delta.
+
+    I record senza impronta (creati prima del versionamento) e quelli con lo
+    stesso numero di righe vengono confrontati sul contenuto normalizzato,
+    come in precedenza.
+
+    Dati (BLOB, file Arrow o tabella), riepiloghi e campione vengono preparati
+    prima di prendere il lock di scrittura; la transazione ``BEGIN IMMEDIATE``
+    registra solo i metadati, dopo aver verificato che i record con lo stesso
+    nome non siano cambiati nel frattempo. Se sono cambiati (es. lo stesso file
+    salvato due volte dal servizio HTTP) i dati preparati vengono eliminati e il
+    confronto si ripete: il secondo salvataggio trova il primo come duplicato.
+
+    Args:
+        name (str): Nome del dataset (di solito il nome del file).
+        df (pandas.DataFrame): Contenuto completo del file caricato.
+        storage (str, optional): Formato di archiviazione (``'blob'``, ``'arrow'`` o ``'table'``).
+        codec (str, optional): Compressione del nuovo record (default ``DEFAULT_CODEC``);
+            le nuove versioni usano quella del record esistente.
+
+    Returns:
+        tuple[int | None, str | None]: ``(dataset_id, stato)`` con stato ``'created'``,
+            ``'duplicate'`` o ``'appended'``; ``(None, None)`` in caso di errore.
     """
     print(f"[DB] Tentativo di salvataggio in: {DB_PATH}")
 
-    def _normalize(df_in: pd.DataFrame) -> pd.DataFrame:
-        # Normalizzazione semplice: ordina le colonne, reset indice, arrotonda float, fillna
-        d = df_in.copy()
-        # Ordina colonne per avere confronto indipendente dall'ordine
-        d = d.reindex(sorted(d.columns), axis=1)
-        d = d.reset_index(drop=True)
-        # Arrotonda float a 6 decimali per evitare differenze minime
-        float_cols = d.select_dtypes(include=['float', 'float64', 'float32']).columns
-        for c in float_cols:
-            d[c] = d[c].round(6)
-        # Sostituisci NaN con stringa vuota per confronto coerente
-        d = d.fillna('')
-        return d
-
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
+    conn = None
+    staged = None
+    try:
+        schema = _schema_signature(df)
+        hashes = _row_hashes(df)
+        fingerprint = _fingerprint(schema, hashes)
 
-        # Cerca record con lo stesso nome
-        c.execute("SELECT id, data FROM datasets WHERE name = ?", (name,))
-        rows = c.fetchall()
+        for _ in range(SAVE_ATTEMPTS):
+            conn = _connect()
+            records = _records_by_name(conn.cursor(), name)
+            conn.close()
+            conn = None
 
-        new_norm = _normalize(df)
+            action, target = _match_existing(records, df, schema, hashes, fingerprint)
+            if action == "duplicate":
+                print(f"[DB] Trovato dataset identico per nome '{name}' (id={target}), non creo duplicato")
+                return target, "duplicate"
 
-        for rid, blob in rows:
-            try:
-                existing_df = pickle.loads(blob)
-                exist_norm = _normalize(existing_df)
-                # Confronto diretto
-                if exist_norm.equals(new_norm):
-                    conn.close()
-                    print(f"[DB] Trovato dataset identico per nome '{name}' (id={rid}), non creo duplicato")
-                    return rid, False
-            except Exception as e:
-                print(f"[DB] Impossibile confrontare blob esistente id={rid}: {e}")
+            # Lavoro pesante fuori dal lock
+            if action == "append":
+                rid, version, row_count, _, base_storage, base_codec = target
+                segment = _prepare_segment(rid, version, name, df.iloc[row_count:], base_storage, base_codec)
+                staged = segment["payload"]
+            else:
+                staged = _stage_payload(name, df, storage or DEFAULT_STORAGE, codec or DEFAULT_CODEC)
+                summary = summarize(df)
+                sample = draw_sample([df]) if len(df) >= SAMPLE_THRESHOLD else None
+
+            # Lock di scrittura solo per i metadati, se i record con lo stesso nome sono quelli confrontati
+            conn = _connect()
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            if _records_by_name(c, name) != records:
+                print(f"[DB] '{name}' modificato da un altro salvataggio, ripeto il confronto")
+                conn.close()
+                conn = None
+                _discard_payload(*staged)
+                staged = None
                 continue
 
-        # Nessun duplicato trovato: inseriamo
-        blob = pickle.dumps(df)
-        now = datetime.now().isoformat(timespec='seconds')
-        c.execute("""
-            INSERT INTO datasets (name, upload_date, data)
-            VALUES (?, ?, ?)
-        """, (name, now, blob))
+            if action == "append":
+                new_version = _append_segment(c, rid, version, row_count, segment, fingerprint)
+                conn.commit()
+                staged = None
+                conn.close()
+                conn = None
+                print(f"[DB] Dataset '{name}' (id={rid}) esteso di {len(df) - row_count} righe (versione {new_version})")
+                return rid, "appended"
 
-        conn.commit()
-        new_id = c.lastrowid
-        conn.close()
+            storage_used, blob, path, codec_used = staged
+            now = datetime.now().isoformat(timespec='seconds')
+            c.execute("""
+                INSERT INTO datasets (name, upload_date, data, storage, path, version, row_count, fingerprint, stats, codec)
+                VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?, ?)
+            """, (name, now, blob, storage_used, path, len(df), fingerprint, json.dumps(column_ranges(df)), codec_used))
+            new_id = c.lastrowid
+            _save_cache(c, new_id, 1, "summary", "", summary)
+            if sample is not None:
+                _save_cache(c, new_id, 1, "sample", "", sample)
+
+            conn.commit()
+            staged = None
+            conn.close()
+            conn = None
+
+            # Verifica: conteggio
+            conn_check = _connect()
+            c_check = conn_check.cursor()
+            c_check.execute("SELECT COUNT(*) FROM datasets")
+            count = c_check.fetchone()[0]
+            conn_check.close()
+            print(f"[DB] Dataset '{name}' salvato nel DB con successo (id={new_id}, totale={count})")
+            return new_id, "created"
+
+        raise RuntimeError(f"record modificati da altri salvataggi per {SAVE_ATTEMPTS} volte")
+
+    except Exception as e:
+        print(f"[DB] ERRORE nel salvataggio di '{name}': {e}")
+        import traceback
+        traceback.print_exc()
+        if conn is not None:
+            # Chiusura senza commit: annulla la transazione e rilascia il lock
+            conn.close()
+        if staged is not None:
+            _discard_payload(*staged)
+        return None, None
+
+
+def _records_by_name(c, name: str) -> list:
+    # Record con lo stesso nome, letti prima del lock e di nuovo dentro la transazione
+    c.execute("SELECT id, version, row_count, fingerprint, storage, codec FROM datasets WHERE name = ? ORDER BY id",
+              (name,))
+    return c.fetchall()
+
+
+def _match_existing(records: list, df: pd.DataFrame, schema: str, hashes, fingerprint: str):
+    """Confronta il DataFrame con i record con lo stesso nome (vedi ``save_dataset_version``).
+
+    Returns:
+        tuple: ``('duplicate', id)``, ``('append', record)`` oppure ``('create', None)``.
+    """
+    new_norm = None
+    for record in records:
+        rid, version, row_count, row_fp = record[:4]
+        if row_fp is not None:
+            if row_count == len(df) and row_fp == fingerprint:
+                return "duplicate", rid
+            if row_count < len(df) and row_fp == _fingerprint(schema, hashes[:row_count]):
+                return "append", record
+            if row_count != len(df):
+                # Numero di righe diverso: non può essere identico
+                continue
+        try:
+            if new_norm is None:
+                new_norm = _normalize(df)
+            exist_norm = _normalize(load_dataset(rid))
+            # Confronto diretto
+            if exist_norm.equals(new_norm):
+                return "duplicate", rid
+        except Exception as e:
+            print(f"[DB] Impossibile confrontare blob esistente id={rid}: {e}")
+            continue
+    return "create", None
+
+
+def save_partitioned_dataset(name: str, frames: list, partition_names: list = None, storage: str = None,
+                             codec: str = None):
+    """Salva più DataFrame (ad es. file giornalieri) come partizioni di un unico dataset.
+
+    La prima partizione è il record base in `datasets`, le altre sono segmenti
+    della versione 1 in `dataset_segments`; ognuna registra il proprio nome e
+    i min/max delle colonne numeriche. L'impronta copre l'unione delle
+    partizioni, quindi un upload successivo dello stesso contenuto esteso viene
+    riconosciuto da ``save_dataset_version`` come nuova versione.
+
+    I DataFrame devono avere lo stesso schema (vedi ``modules.data_loader.align_schemas``).
+    Come in ``save_dataset_version``, dati, riepilogo e campione vengono preparati
+    prima del lock e la transazione ``BEGIN IMMEDIATE`` registra solo i metadati.
+
+    Args:
+        name (str): Nome del dataset.
+        frames (list): DataFrame delle partizioni, nell'ordine.
+        partition_names (list, optional): Nome di ogni partizione (di solito il file di origine).
+        storage (str, optional): Formato di archiviazione (``'blob'``, ``'arrow'`` o ``'table'``).
+        codec (str, optional): Compressione delle partizioni (default ``DEFAULT_CODEC``).
+
+    Returns:
+        tuple[int | None, str | None]: ``(dataset_id, stato)`` con stato ``'created'`` o
+            ``'duplicate'``; ``(None, None)`` in caso di errore.
+    """
+    print(f"[DB] Salvataggio di '{name}' in {len(frames)} partizioni")
+    partition_names = partition_names or [f"part-{i:05d}" for i in range(len(frames))]
+
+    staged = []
+    try:
+        schema = _schema_signature(frames[0])
+        hashes = np.concatenate([_row_hashes(df) for df in frames])
+        fingerprint = _fingerprint(schema, hashes)
+        duplicate_sql = "SELECT id FROM datasets WHERE name = ? AND fingerprint = ? AND row_count = ?"
+        conn = _connect()
+        try:
+            row = conn.execute(duplicate_sql, (name, fingerprint, len(hashes))).fetchone()
+        finally:
+            conn.close()
+        if row:
+            print(f"[DB] Trovato dataset identico per nome '{name}' (id={row[0]}), non creo duplicato")
+            return row[0], "duplicate"
 
-        # Verifica: conteggio
-        conn_check = sqlite3.connect(DB_PATH)
-        c_check = conn_check.cursor()
-        c_check.execute("SELECT COUNT(*) FROM datasets")
-        count = c_check.fetchone()[0]
-        conn_check.close()
-        print(f"[DB] Dataset '{name}' salvato nel DB con successo (id={new_id}, totale={count})")
-        return new_id, True
+        # Dati delle partizioni, riepilogo e campione preparati prima di prendere il lock
+        staged.append(_stage_payload(name, frames[0], storage or DEFAULT_STORAGE, codec or DEFAULT_CODEC))
+        base_storage, _, _, codec = staged[0]
+        summary = summarize(frames[0])
+        for df in frames[1:]:
+            staged.append(_stage_payload(name, df.reset_index(drop=True), base_storage, codec))
+            summary = merge_summaries(summary, summarize(df))
+        sample = draw_sample(frames) if len(hashes) >= SAMPLE_THRESHOLD else None
+
+        # Lock di scrittura solo per le righe dei metadati; il controllo dei duplicati si ripete
+        # dentro la transazione (un salvataggio simultaneo dello stesso contenuto vince)
+        conn = _connect()
+        try:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            row = c.execute(duplicate_sql, (name, fingerprint, len(hashes))).fetchone()
+            if row:
+                conn.close()
+                for payload in staged:
+                    _discard_payload(*payload)
+                staged = []
+                print(f"[DB] Trovato dataset identico per nome '{name}' (id={row[0]}), non creo duplicato")
+                return row[0], "duplicate"
+
+            now = datetime.now().isoformat(timespec='seconds')
+            _, blob, path, _ = staged[0]
+            c.execute("""
+                INSERT INTO datasets (name, upload_date, data, storage, path, version, row_count, fingerprint, partition, stats, codec)
+                VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?, ?, ?)
+            """, (name, now, blob, base_storage, path, len(hashes), fingerprint,
+                  partition_names[0], json.dumps(column_ranges(frames[0])), codec))
+            new_id = c.lastrowid
+
+            for part_name, df, (part_storage, blob, path, part_codec) in zip(partition_names[1:], frames[1:],
+                                                                              staged[1:]):
+                c.execute("""
+                    INSERT INTO dataset_segments (dataset_id, version, row_count, storage, data, path, created, partition, stats, codec)
+                    VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (new_id, len(df), part_storage, blob, path, now, part_name, json.dumps(column_ranges(df)),
+                      part_codec))
+            _save_cache(c, new_id, 1, "summary", "", summary)
+            if sample is not None:
+                _save_cache(c, new_id, 1, "sample", "", sample)
+
+            conn.commit()
+            staged = []
+        finally:
+            # Chiusura senza commit (in caso di errore): annulla la transazione e rilascia il lock
+            conn.close()
+        print(f"[DB] Dataset '{name}' salvato nel DB con successo (id={new_id}, partizioni={len(frames)})")
+        return new_id, "created"
 
     except Exception as e:
         print(f"[DB] ERRORE nel salvataggio di '{name}': {e}")
         import traceback
         traceback.print_exc()
-        return None, False
+        for payload in staged:
+            _discard_payload(*payload)
+        return None, None
+
+
+def _extend_cache(dataset_id: int, kind: str, key: str, previous, delta: pd.DataFrame):
+    # Cache della nuova versione: versione precedente + contributo delle sole righe nuove
+    # (il profilo non è combinabile, quantili e correlazioni: si ricalcola alla richiesta)
+    if kind == "summary":
+        return merge_summaries(previous, summarize(delta))
+    if kind == "rollup":
+        return merge_rollups(previous, rollup(delta, key))
+    if kind == "resample":
+        time_col, freq = key.rsplit("|", 1)
+        return merge_rollups(previous, resample_rollup(delta, time_col, freq))
+    if kind == "values":
+        return previous.merge(ValueDictionary.from_series(delta[key]))
+    if kind == "sample":
+        # Il reservoir prosegue con le sole righe nuove
+        try:
+            return previous.add(delta)
+        except ValueError as e:
+            print(f"[DB] Campione non aggiornato per id={dataset_id}: {e}")
+    return None
+
+
+def _prepare_segment(dataset_id: int, version: int, name: str, delta: pd.DataFrame, storage: str,
+                     codec: str = None) -> dict:
+    """Prepara fuori dal lock un segmento della versione successiva: dati e cache aggiornate.
+
+    Il segmento usa lo stesso formato di archiviazione e la stessa compressione del record base.
+
+    Returns:
+        dict: ``delta``, ``payload`` (vedi ``_stage_payload``), ``stats`` (min/max per colonna)
+            e ``cache`` (``(kind, key)`` → oggetto per la nuova versione).
+    """
+    delta = delta.reset_index(drop=True)
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT kind, key, payload FROM dataset_cache WHERE dataset_id = ? AND version = ?",
+                            (dataset_id, version)).fetchall()
+    finally:
+        conn.close()
+    cache = {(kind, key): _extend_cache(dataset_id, kind, key, pickle.loads(payload), delta)
+             for kind, key, payload in rows}
+    return {"delta": delta, "payload": _stage_payload(name, delta, storage, codec),
+            "stats": json.dumps(column_ranges(delta)), "cache": cache}
+
+
+def _append_segment(c, dataset_id: int, version: int, row_count: int, segment: dict, fingerprint: str) -> int:
+    """Registra il segmento preparato da ``_prepare_segment`` (nella transazione di ``c``).
 
+    Returns:
+        int: Il numero della nuova versione.
+    """
+    new_version = version + 1
+    storage, blob, path, codec = segment["payload"]
+    now = datetime.now().isoformat(timespec='seconds')
+    c.execute("""
+        INSERT INTO dataset_segments (dataset_id, version, row_count, storage, data, path, created, stats, codec)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (dataset_id, new_version, len(segment["delta"]), storage, blob, path, now, segment["stats"], codec))
+    c.execute("UPDATE datasets SET version = ?, row_count = ?, fingerprint = ? WHERE id = ?",
+              (new_version, row_count + len(segment["delta"]), fingerprint, dataset_id))
+
+    # Le voci di cache salvate dopo la preparazione si aggiornano qui
+    c.execute("SELECT kind, key FROM dataset_cache WHERE dataset_id = ? AND version = ?", (dataset_id, version))
+    for kind, key in c.fetchall():
+        if (kind, key) not in segment["cache"]:
+            c.execute("SELECT payload FROM dataset_cache WHERE dataset_id = ? AND version = ? AND kind = ? AND key = ?",
+                      (dataset_id, version, kind, key))
+            segment["cache"][(kind, key)] = _extend_cache(dataset_id, kind, key, pickle.loads(c.fetchone()[0]),
+                                                          segment["delta"])
+    for (kind, key), obj in segment["cache"].items():
+        if obj is not None:
+            _save_cache(c, dataset_id, new_version, kind, key, obj)
+    return new_version
+
+
+def _save_cache(c, dataset_id: int, version: int, kind: str, key: str, obj):
+    c.execute("""
+        INSERT OR REPLACE INTO dataset_cache (dataset_id, version, kind, key, payload)
+        VALUES (?, ?, ?, ?, ?)
+    """, (dataset_id, version, kind, key, pickle.dumps(obj)))
+
+
+def save_cache(dataset_id: int, version: int, kind: str, key: str, obj):
+    """Salva un risultato precalcolato (es. rollup per colonna) per una versione del dataset.
+
+    Args:
+        dataset_id (int): ID del dataset.
+        version (int): Versione a cui si riferisce il risultato.
+        kind (str): Tipo di risultato (``'summary'``, ``'rollup'``, ``'resample'``, ``'values'``,
+            ``'sample'`` o ``'profile'``).
+        key (str): Chiave del risultato (per rollup e dizionari dei valori: la colonna;
+            per i ricampionamenti ``'colonna|frequenza'``; per i campioni la colonna
+            di stratificazione, vuota per quello uniforme).
+        obj: Oggetto da salvare (serializzato con pickle).
 
-def load_dataset(dataset_id: int):
+    Returns:
+        None
+    """
+    conn = _connect()
+    _save_cache(conn.cursor(), dataset_id, version, kind, key, obj)
+    conn.commit()
+    conn.close()
+
+
+def load_cache(dataset_id: int, version: int, kind: str, key: str = ""):
+    """Recupera un risultato precalcolato per una versione del dataset.
+
+    Returns:
+        object | None: L'oggetto salvato con ``save_cache``, oppure ``None`` se assente.
+    """
+    conn = _connect()
+    c = conn.cursor()
+    c.execute("SELECT payload FROM dataset_cache WHERE dataset_id = ? AND version = ? AND kind = ? AND key = ?",
+              (dataset_id, version, kind, key))
+    row = c.fetchone()
+    conn.close()
+    return pickle.loads(row[0]) if row else None
+
+
+def _partition_rows(c, dataset_id: int, version: int = None):
+    # Record base + segmenti fino a `version`, nell'ordine in cui vengono concatenati
+    c.execute("SELECT storage, data, path, version, row_count, partition, stats, name, codec FROM datasets WHERE id = ?",
+              (dataset_id,))
+    row = c.fetchone()
+    if not row:
+        return None
+    c.execute("""
+        SELECT storage, data, path, version, row_count, partition, stats, codec FROM dataset_segments
+        WHERE dataset_id = ? AND version <= ?
+        ORDER BY version, id
+    """, (dataset_id, version or row[3]))
+    segments = c.fetchall()
+    # Righe del record base: i DB precedenti al versionamento non hanno row_count
+    base_rows = None
+    if row[4] is not None:
+        c.execute("SELECT COALESCE(SUM(row_count), 0) FROM dataset_segments WHERE dataset_id = ?", (dataset_id,))
+        base_rows = row[4] - c.fetchone()[0]
+    base = row[:3] + (1, base_rows, row[5] or row[7], row[6], row[8])
+    return [base] + segments
+
+
+def load_dataset(dataset_id: int, version: int = None, filters: list = None):
     """Carica e deserializza un dataset memorizzato nel DB.
 
+    I dataset in formato ``arrow`` vengono aperti in memory-map (vedi ``_read_payload``).
+    Per i dataset con più versioni o partizioni il risultato è l'unione del record
+    base e dei segmenti fino a ``version``.
+
+    Con ``filters`` le partizioni i cui min/max escludono un filtro ``between``
+    non vengono nemmeno lette; le righe restituite vanno comunque filtrate con
+    ``apply_filters``.
+
     Args:
         dataset_id (int): ID del dataset da caricare.
+        version (int, optional): Versione da caricare (default: la più recente).
+        filters (list, optional): Tuple ``(col, operatore, valore)`` usate per saltare partizioni.
 
     Returns:
         pandas.DataFrame | None: DataFrame deserializzato se trovato,
             altrimenti ``None`` se l'ID non esiste.
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
+    parts = _partition_rows(conn.cursor(), dataset_id, version)
+    conn.close()
+
+    if not parts:
+        return None
+    if filters:
+        kept = [p for p in parts if partition_may_match(json.loads(p[6]) if p[6] else None, filters)]
+        if not kept:
+            # Nessuna partizione utile: serve comunque lo schema
+            return _read_payload(*parts[0][:3], parts[0][7]).iloc[0:0]
+        parts = kept
+    frames = [_read_payload(*p[:3], p[7]) for p in parts]
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_sample(dataset_id: int, version: int = None, size: int = SAMPLE_SIZE, strata: str = None):
+    """Campione del dataset per l'esplorazione interattiva (vedi ``modules.sampling``).
+
+    Il reservoir viene salvato in `dataset_cache` (tipo ``'sample'``) e aggiornato
+    con le sole righe aggiunte dalle versioni successive. Se manca, o ha una
+    dimensione diversa da ``size``, viene estratto leggendo una partizione (o un
+    blocco di righe della tabella) alla volta: l'intero dataset non viene mai
+    caricato in memoria.
+
+    Args:
+        dataset_id (int): ID del dataset.
+        version (int, optional): Versione (default: la più recente).
+        size (int, optional): Righe del campione. Default ``SAMPLE_SIZE``.
+        strata (str, optional): Colonna per il campione stratificato.
+
+    Returns:
+        modules.sampling.Sample | None: Il campione, oppure ``None`` se l'ID non esiste.
+
+    Raises:
+        ValueError: Se ``strata`` ha troppi valori per un campione stratificato.
+    """
+    conn = _connect()
     c = conn.cursor()
+    if version is None:
+        c.execute("SELECT version FROM datasets WHERE id = ?", (dataset_id,))
+        row = c.fetchone()
+        version = row[0] if row else None
+    parts = _partition_rows(c, dataset_id, version)
+    conn.close()
+    if not parts:
+        return None
 
-    c.execute("SELECT data FROM datasets WHERE id = ?", (dataset_id,))
-    row = c.fetchone()
+    reservoir = load_cache(dataset_id, version, "sample", strata or "")
+    if reservoir is None or reservoir.size != size:
+        chunks = (chunk for part in parts for chunk in _iter_payload(*part[:3], part[7]))
+        reservoir = draw_sample(chunks, size, strata)
+        save_cache(dataset_id, version, "sample", strata or "", reservoir)
+    return reservoir.sample()
+
+
+def list_partitions(dataset_id: int, version: int = None):
+    """Elenca le partizioni di un dataset nell'ordine di concatenazione.
+
+    Ogni versione aggiunta e ogni file importato con ``save_partitioned_dataset``
+    è una partizione.
 
+    Args:
+        dataset_id (int): ID del dataset.
+        version (int, optional): Versione (default: la più recente).
+
+    Returns:
+        list[dict]: Dizionari con ``name``, ``version``, ``rows``, ``start``, ``stop``
+            (posizioni delle righe in ``load_dataset``) e ``stats`` (min/max per colonna,
+            ``None`` per i record creati prima dei metadati); lista vuota se l'ID non esiste.
+    """
+    conn = _connect()
+    parts = _partition_rows(conn.cursor(), dataset_id, version)
     conn.close()
 
-    return pickle.loads(row[0]) if row else None
+    result, start = [], 0
+    for _, _, _, part_version, rows, name, stats, _ in parts or []:
+        if rows is None:
+            return []
+        result.append({"name": name, "version": part_version, "rows": rows, "start": start,
+                       "stop": start + rows, "stats": json.loads(stats) if stats else None})
+        start += rows
+    return result
+
+
+# ======================================================
+# INTERROGAZIONI SQL (formato "table")
+# ======================================================
+def _sql_tables(c, dataset_id: int, version: int = None, filters: list = None):
+    """Tabelle delle partizioni da interrogare (saltando quelle escluse dai filtri).
+
+    Returns:
+        tuple[list, set]: Nomi delle tabelle e colonne per cui non usare l'indice
+            (vedi ``sql_query.where_clause``).
+
+    Raises:
+        ValueError: Se il dataset non esiste o non è archiviato (interamente) come tabella.
+    """
+    parts = _partition_rows(c, dataset_id, version)
+    if not parts:
+        raise ValueError(f"Dataset {dataset_id} non trovato")
+    if any(p[0] != "table" for p in parts):
+        raise ValueError(f"Il dataset {dataset_id} non è archiviato come tabella SQLite")
+    stats = [json.loads(p[6]) if p[6] else None for p in parts]
+    kept = [i for i, st in enumerate(stats) if partition_may_match(st, filters or [])]
+    # Nessuna partizione utile: la query sulla prima restituisce comunque zero righe
+    kept = kept or [0]
+
+    # Filtri 'between' che includono tutti i valori delle partizioni: meglio la scansione
+    unindexed = set()
+    for col, op, value in filters or []:
+        ranges = [partition_range(stats[i], col) for i in kept] if op == "between" else [None]
+        if all(ranges) and value[0] <= min(r[0] for r in ranges) and value[1] >= max(r[1] for r in ranges):
+            unindexed.add(col)
+    return [parts[i][2] for i in kept], unindexed
+
+
+def _ensure_indexes(conn, tables: list, columns):
+    # Indice su ogni colonna filtrata, creato una volta al primo utilizzo
+    c = conn.cursor()
+    q = sql_query.quote_ident
+    for table in tables:
+        for col in columns:
+            suffix = hashlib.sha1(str(col).encode("utf-8")).hexdigest()[:12]
+            c.execute(f"CREATE INDEX IF NOT EXISTS {q(f'ix_{table}_{suffix}')} ON {q(table)}({q(col)})")
+    conn.commit()
+
+
+def _prepare_sql(conn, dataset_id: int, version: int, filters: list):
+    tables, unindexed = _sql_tables(conn.cursor(), dataset_id, version, filters)
+    _ensure_indexes(conn, tables, dict.fromkeys(col for col, _, _ in filters or []))
+    return tables, unindexed
+
+
+def query_dataset(dataset_id: int, version: int = None, columns: list = None, filters: list = None,
+                  limit: int = None, offset: int = 0, order_by: str = None, ascending: bool = True) -> pd.DataFrame:
+    """Righe di un dataset ``table`` che soddisfano i filtri (filtrate dal database).
+
+    Equivale a ``apply_filters(load_dataset(...), columns, filters)[columns]``, ma
+    solo le righe del risultato vengono lette da SQLite.
+
+    Args:
+        dataset_id (int): ID del dataset.
+        version (int, optional): Versione (default: la più recente).
+        columns (list, optional): Colonne da restituire (default: tutte).
+        filters (list, optional): Tuple ``(col, operatore, valore)``.
+        limit (int, optional): Numero massimo di righe.
+        offset (int, optional): Righe da saltare. Default 0.
+        order_by (str, optional): Colonna di ordinamento (default: ordine originale);
+            i valori mancanti vanno in fondo.
+        ascending (bool, optional): Ordine crescente. Default True.
+
+    Returns:
+        pandas.DataFrame: Righe del risultato, con i dtype ricostruiti dallo schema.
+
+    Raises:
+        ValueError: Se il dataset non è archiviato come tabella.
+    """
+    conn = _connect()
+    try:
+        tables, unindexed = _prepare_sql(conn, dataset_id, version, filters)
+        columns = columns or list(_column_types(conn.cursor(), tables[0]))
+        sql, params = sql_query.select_query(tables, columns, filters, limit, offset, unindexed, order_by, ascending)
+        df = pd.read_sql_query(sql, conn, params=params)
+        return _restore_types(conn.cursor(), tables[0], df)
+    finally:
+        conn.close()
+
+
+def iter_query_dataset(dataset_id: int, version: int = None, columns: list = None, filters: list = None,
+                       chunk_rows: int = 100_000):
+    """Come ``query_dataset``, ma restituisce il risultato a blocchi di ``chunk_rows`` righe.
+
+    Una sola query letta con un cursore: in memoria c'è un blocco alla volta
+    (es. per esportare un risultato più grande della RAM).
+
+    Yields:
+        pandas.DataFrame: Blocchi del risultato, nell'ordine originale delle righe.
+    """
+    conn = _connect()
+    try:
+        tables, unindexed = _prepare_sql(conn, dataset_id, version, filters)
+        columns = columns or list(_column_types(conn.cursor(), tables[0]))
+        sql, params = sql_query.select_query(tables, columns, filters, unindexed=unindexed)
+        for chunk in pd.read_sql_query(sql, conn, params=params, chunksize=chunk_rows):
+            yield _restore_types(conn.cursor(), tables[0], chunk)
+    finally:
+        conn.close()
+
+
+def dataset_schema(dataset_id: int) -> pd.DataFrame:
+    """DataFrame vuoto con colonne e dtype di un dataset ``table`` (nessuna riga letta)."""
+    return query_dataset(dataset_id, limit=0)
+
+
+def count_rows(dataset_id: int, version: int = None, filters: list = None) -> int:
+    """Numero di righe di un dataset ``table`` che soddisfano i filtri."""
+    conn = _connect()
+    try:
+        tables, unindexed = _prepare_sql(conn, dataset_id, version, filters)
+        return conn.execute(*sql_query.count_query(tables, filters, unindexed)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def query_statistics(dataset_id: int, version: int, columns: list, operation: str, filters: list = None) -> dict:
+    """Statistiche di un dataset ``table`` calcolate dal database (vedi ``compute_statistics``).
+
+    Args:
+        dataset_id (int): ID del dataset.
+        version (int | None): Versione (``None``: la più recente).
+        columns (list): Colonne su cui calcolare le statistiche.
+        operation (str): ``'Media'``, ``'Somma'``, ``'Conteggio'``, ``'Massimo'`` o ``'Minimo'``.
+        filters (list, optional): Filtri da applicare prima del calcolo.
+
+    Returns:
+        dict: Mappa colonna → valore; come in pandas, le operazioni diverse da
+            ``'Conteggio'`` riguardano solo le colonne numeriche.
+    """
+    conn = _connect()
+    try:
+        tables, unindexed = _prepare_sql(conn, dataset_id, version, filters)
+        if operation != "Conteggio":
+            types = _column_types(conn.cursor(), tables[0])
+            columns = [col for col in columns if types.get(col) in ("INTEGER", "REAL", "BOOLEAN")]
+        if not columns:
+            return {}
+        row = conn.execute(*sql_query.statistics_query(tables, columns, operation, filters, unindexed)).fetchone()
+        return {col: (float("nan") if value is None else value) for col, value in zip(columns, row)}
+    finally:
+        conn.close()
+
+
+def query_aggregate(dataset_id: int, version: int, group_col: str, value_cols: list, operation: str,
+                    filters: list = None) -> pd.DataFrame:
+    """Aggregazione per gruppo di un dataset ``table`` eseguita dal database (vedi ``aggregate``).
+
+    Returns:
+        pandas.DataFrame: Una riga per gruppo, ordinata (discendente) per la prima colonna di valore.
+    """
+    conn = _connect()
+    try:
+        tables, unindexed = _prepare_sql(conn, dataset_id, version, filters)
+        sql, params = sql_query.aggregate_query(tables, group_col, value_cols, operation, filters, unindexed)
+        return pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+
+
+def query_resample(dataset_id: int, version: int, time_col: str, value_cols: list, freq: str, operation: str,
+                   filters: list = None) -> pd.DataFrame:
+    """Serie temporale di un dataset ``table`` aggregata dal database (vedi ``resample_aggregate``).
+
+    Le colonne con fuso orario sono salvate in UTC: gli intervalli (giorni, mesi) sono quelli di UTC.
+
+    Returns:
+        pandas.DataFrame: Una riga per intervallo (solo quelli con dati), in ordine di tempo.
+    """
+    conn = _connect()
+    try:
+        tables, unindexed = _prepare_sql(conn, dataset_id, version, filters)
+        sql, params = sql_query.resample_query(tables, time_col, value_cols, freq, operation, filters, unindexed)
+        result = pd.read_sql_query(sql, conn, params=params)
+        result[time_col] = pd.to_datetime(result[time_col], format="ISO8601")
+        return result
+    finally:
+        conn.close()
+
+
+def column_bounds(dataset_id: int, version: int, column: str, filters: list = None):
+    """Minimo e massimo di una colonna di un dataset ``table`` (``pandas.Timestamp`` per le date).
+
+    Con ``filters`` solo sulle righe che li soddisfano.
+    """
+    conn = _connect()
+    try:
+        tables, unindexed = _prepare_sql(conn, dataset_id, version, filters)
+        col = sql_query.quote_ident(column)
+        where, params = sql_query.where_clause(filters, unindexed)
+        bounds = conn.execute(f"SELECT MIN({col}), MAX({col}) FROM {sql_query.source_sql(tables)}{where}",
+                              params).fetchone()
+        if _column_types(conn.cursor(), tables[0]).get(column) == "DATETIME":
+            return tuple(pd.Timestamp(v) for v in bounds)
+        return bounds
+    finally:
+        conn.close()
+
+
+def value_counts(dataset_id: int, version: int, column: str) -> list:
+    """Valori distinti (non nulli) di una colonna di un dataset ``table`` con le occorrenze.
+
+    Returns:
+        list[tuple]: Coppie ``(valore, occorrenze)``.
+    """
+    conn = _connect()
+    try:
+        tables, _ = _prepare_sql(conn, dataset_id, version, None)
+        col = sql_query.quote_ident(column)
+        return conn.execute(f"SELECT {col}, COUNT(*) FROM {sql_query.source_sql(tables)} "
+                            f"WHERE {col} IS NOT NULL GROUP BY {col}").fetchall()
+    finally:
+        conn.close()
+
+
+def get_dataset_info(dataset_id: int):
+    """Restituisce i metadati di un dataset (senza caricarne il contenuto).
+
+    Args:
+        dataset_id (int): ID del dataset.
+
+    Returns:
+        dict | None: ``name``, ``upload_date``, ``storage``, ``version``, ``row_count``,
+            ``codec`` (``None`` se non compresso), oppure ``None`` se l'ID non esiste.
+    """
+    conn = _connect()
+    c = conn.cursor()
+    c.execute("SELECT name, upload_date, storage, version, row_count, codec FROM datasets WHERE id = ?",
+              (dataset_id,))
+    row = c.fetchone()
+    conn.close()
+    if not row:
+        return None
+    return dict(zip(["name", "upload_date", "storage", "version", "row_count", "codec"], row))
+
+
+def list_versions(dataset_id: int):
+    """Elenca le versioni di un dataset.
+
+    Returns:
+        list[tuple]: Tuple ``(version, righe_aggiunte, data)``; la versione 1 è il record base
+            (con ``righe_aggiunte`` ``None`` per i dataset creati prima del versionamento).
+    """
+    conn = _connect()
+    c = conn.cursor()
+    c.execute("""
+        SELECT 1, d.row_count - COALESCE((SELECT SUM(s.row_count) FROM dataset_segments s
+                                            WHERE s.dataset_id = d.id AND s.version > 1), 0),
+               d.upload_date
+        FROM datasets d WHERE d.id = ?
+        UNION ALL
+        SELECT version, SUM(row_count), MIN(created) FROM dataset_segments WHERE dataset_id = ? AND version > 1
+        GROUP BY version
+        ORDER BY 1
+    """, (dataset_id, dataset_id))
+    rows = c.fetchall()
+    conn.close()
+    return rows
 
 
 def list_datasets():
@@ -177,7 +1244,7 @@ def list_datasets():
         list[tuple]: Lista di tuple ``(id, name, upload_date)`` per i dataset
             presenti nel DB.
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     c = conn.cursor()
 
     c.execute("SELECT id, name, upload_date FROM datasets")
@@ -187,6 +1254,15 @@ def list_datasets():
     return rows
 
 
+def history_timestamp() -> str:
+    """Timestamp di un'operazione della cronologia, al millisecondo.
+
+    Unico formato per tutte le righe di `history`: l'ordine dei timestamp come
+    testo (usato dai cursori di ``query_history``) è quello temporale.
+    """
+    return datetime.now().isoformat(timespec='milliseconds')
+
+
 def save_history(dataset_id: int, columns: list, operation: str):
     """Registra un'operazione eseguita su un dataset nella tabella `history`.
 
@@ -198,10 +1274,10 @@ def save_history(dataset_id: int, columns: list, operation: str):
     Returns:
         None
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     c = conn.cursor()
 
-    now = datetime.now().isoformat(timespec='seconds')
+    now = history_timestamp()
 
     c.execute("""
         INSERT INTO history (dataset_id, columns, operation, timestamp)
@@ -212,6 +1288,107 @@ def save_history(dataset_id: int, columns: list, operation: str):
     conn.close()
 
 
+def save_history_batch(rows: list):
+    """Inserisce in blocco più operazioni nella tabella `history` (una sola transazione).
+
+    Usata dallo scrittore in background di ``modules.history``.
+
+    Args:
+        rows (list): Righe ``(dataset_id, columns, operation, details, timestamp)`` dove
+            ``columns`` è una stringa separata da virgole e ``details`` un JSON (o ``None``).
+
+    Returns:
+        None
+    """
+    if not rows:
+        return
+    conn = _connect()
+    c = conn.cursor()
+
+    c.executemany("""
+        INSERT INTO history (dataset_id, columns, operation, details, timestamp)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+
+    conn.commit()
+    conn.close()
+
+
+def query_history(dataset_id: int = None, operation: str = None, limit: int = 50, before: tuple = None):
+    """Recupera una pagina della cronologia, dalla più recente (paginazione a cursore).
+
+    La paginazione usa il cursore ``(timestamp, id)`` dell'ultima riga della pagina
+    precedente invece di ``OFFSET``, così ogni pagina costa come la prima anche
+    con milioni di righe (indici ``idx_history_dataset_ts`` / ``idx_history_ts``).
+
+    Args:
+        dataset_id (int, optional): Limita ai record di un dataset.
+        operation (str, optional): Limita a un tipo di operazione (es. ``'filter'``).
+        limit (int, optional): Righe per pagina. Default 50.
+        before (tuple, optional): Cursore ``(timestamp, id)`` restituito dalla pagina precedente.
+
+    Returns:
+        tuple[list[tuple], tuple | None]: Righe ``(id, dataset_name, columns, operation, details, timestamp)``
+            e il cursore della pagina successiva (``None`` se non ci sono altre righe).
+    """
+    where, params = [], []
+    if dataset_id is not None:
+        where.append("h.dataset_id = ?")
+        params.append(dataset_id)
+    if operation is not None:
+        where.append("h.operation = ?")
+        params.append(operation)
+    if before is not None:
+        where.append("(h.timestamp, h.id) < (?, ?)")
+        params.extend(before)
+
+    sql = """
+        SELECT h.id, d.name, h.columns, h.operation, h.details, h.timestamp
+        FROM history h
+        LEFT JOIN datasets d ON h.dataset_id = d.id
+    """
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY h.timestamp DESC, h.id DESC LIMIT ?"
+    params.append(limit + 1)
+
+    conn = _connect()
+    c = conn.cursor()
+    c.execute(sql, params)
+    rows = c.fetchall()
+    conn.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1][5], rows[-1][0])
+    return rows, next_cursor
+
+
+def save_metrics(rows: list):
+    """Salva in blocco gli span di performance nella tabella `metrics`.
+
+    Args:
+        rows (list): Righe ``(run_id, stage, seconds, peak_mb, rows, timestamp)``,
+            come restituite da ``PerfRecorder.rows()``.
+
+    Returns:
+        None
+    """
+    if not rows:
+        return
+    conn = _connect()
+    c = conn.cursor()
+
+    c.executemany("""
+        INSERT INTO metrics (run_id, stage, seconds, peak_mb, rows, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, rows)
+
+    conn.commit()
+    conn.close()
+
+
 def load_history():
     """Recupera la cronologia delle operazioni eseguite su dataset.
 
@@ -219,7 +1396,7 @@ def load_history():
         list[tuple]: Lista di righe con (history.id, dataset.name, columns, operation, timestamp),
             ordinate per timestamp decrescente.
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     c = conn.cursor()
 
     c.execute("""
@@ -4,32 +4,131 @@ analyzer.py
 Funzioni per filtrare i dati e calcolare statistiche.
 """
 
+import numpy as np
 import pandas as pd
 
 
-def apply_filters(df: pd.DataFrame, columns: list, filters: list):
+def apply_filters(df: pd.DataFrame, columns: list, filters: list, partitions: list = None):
     """Applica una serie di filtri al DataFrame.
 
     Args:
         df (pandas.DataFrame): DataFrame sorgente.
         columns (list): Colonne coinvolte (non sempre usate direttamente da questa funzione).
         filters (list): Lista di tuple ``(col, operatore, valore)`` dove
-            ``operatore`` può essere ``'between'`` o ``'in'``.
+            ``operatore`` può essere ``'between'``, ``'in'`` o ``'not_in'``
+            (tutti i valori non mancanti tranne quelli elencati).
+        partitions (list, optional): Partizioni del DataFrame come dizionari con
+            ``start``/``stop`` (posizioni delle righe) e ``stats`` (min/max per colonna,
+            vedi ``column_ranges``). Le partizioni che non possono soddisfare i filtri
+            ``between`` vengono saltate senza valutarne le righe.
 
     Returns:
-        pandas.DataFrame: DataFrame filtrato.
+        pandas.DataFrame: DataFrame filtrato. Se i filtri non escludono nessuna riga è
+            ``df`` stesso (nessuna copia): non va modificato sul posto.
     """
-    filtered = df.copy()
+    positions = filter_positions(df, filters, partitions=partitions)
+    return df if len(positions) == len(df) else df.iloc[positions]
 
+
+def filter_positions(df: pd.DataFrame, filters: list, partitions: list = None) -> np.ndarray:
+    """Posizioni (``iloc``) delle righe che soddisfano i filtri, senza copiare il DataFrame.
+
+    ``apply_filters`` restituisce ``df.iloc[filter_positions(df, filters)]``.
+
+    Args:
+        df (pandas.DataFrame): DataFrame sorgente.
+        filters (list): Lista di tuple ``(col, operatore, valore)`` (vedi ``apply_filters``).
+        partitions (list, optional): Partizioni del DataFrame (vedi ``apply_filters``).
+
+    Returns:
+        numpy.ndarray: Posizioni crescenti delle righe del risultato.
+    """
+    if partitions:
+        pieces = [p["start"] + filter_positions(df.iloc[p["start"]:p["stop"]], filters)
+                  for p in partitions if partition_may_match(p.get("stats"), filters)]
+        return np.concatenate(pieces) if pieces else np.empty(0, dtype=np.intp)
+
+    mask = np.ones(len(df), dtype=bool)
     for col, op, value in filters:
+        values = df[col]
         if op == "between":
             min_v, max_v = value
-            filtered = filtered[(filtered[col] >= min_v) & (filtered[col] <= max_v)]
-
+            matched = (values >= min_v) & (values <= max_v)
         elif op == "in":
-            filtered = filtered[filtered[col].isin(value)]
+            matched = values.isin(value)
+        elif op == "not_in":
+            # Come 'in' con tutti i valori selezionati: i mancanti restano esclusi
+            matched = values.notna() & ~values.isin(value)
+        else:
+            continue
+        # I tipi nullable restituiscono NA per i mancanti: non soddisfano il filtro
+        mask &= matched.to_numpy(dtype=bool, na_value=False)
+    return np.flatnonzero(mask)
+
+
+def column_ranges(df: pd.DataFrame) -> dict:
+    """Calcola minimo e massimo delle colonne numeriche e di date (metadati di partizione).
+
+    Args:
+        df (pandas.DataFrame): Partizione di un dataset.
+
+    Returns:
+        dict: Mappa colonna → ``[min, max]`` con valori Python serializzabili in JSON
+            (le date come testo ISO 8601); le colonne interamente vuote vengono omesse.
+    """
+    ranges = {}
+    for col in df.select_dtypes(include=["number", "datetime", "datetimetz"]).columns:
+        lo, hi = df[col].min(), df[col].max()
+        if pd.isna(lo):
+            continue
+        if isinstance(lo, pd.Timestamp):
+            ranges[col] = [lo.isoformat(), hi.isoformat()]
+        else:
+            # tolist() converte gli scalari numpy in int/float Python
+            ranges[col] = pd.Series([lo, hi]).tolist()
+    return ranges
+
+
+def partition_range(stats: dict, col: str):
+    """Restituisce ``(min, max)`` di ``col`` dai metadati di una partizione.
+
+    Returns:
+        tuple | None: Estremi (``pandas.Timestamp`` per le colonne di date), oppure
+            ``None`` se la partizione non ha metadati per la colonna.
+    """
+    if not stats or col not in stats:
+        return None
+    lo, hi = stats[col]
+    if isinstance(lo, str):
+        return pd.Timestamp(lo), pd.Timestamp(hi)
+    return lo, hi
+
+
+def partition_may_match(stats: dict, filters: list) -> bool:
+    """Indica se una partizione può contenere righe che soddisfano i filtri.
+
+    Usa solo i filtri ``between`` e i min/max della partizione: senza metadati
+    per una colonna la partizione viene sempre considerata.
+
+    Args:
+        stats (dict | None): Min/max per colonna (vedi ``column_ranges``).
+        filters (list): Lista di tuple ``(col, operatore, valore)``.
+
+    Returns:
+        bool: ``False`` se la partizione può essere saltata.
+    """
+    for col, op, value in filters:
+        bounds = partition_range(stats, col) if op == "between" else None
+        if bounds is not None:
+            min_v, max_v = value
+            lo, hi = bounds
+            if hi < min_v or lo > max_v:
+                return False
+    return True
+
 
-    return filtered
+STATISTIC_OPERATIONS = ("Media", "Somma", "Conteggio", "Massimo", "Minimo")
+AGGREGATE_OPERATIONS = ("sum", "mean", "count", "max", "min")
 
 
 def compute_statistics(df: pd.DataFrame, columns: list, operation: str):
@@ -65,3 +164,377 @@ def compute_statistics(df: pd.DataFrame, columns: list, operation: str):
                 results[col] = df[col].min()
 
     return results
+
+
+def aggregate(df: pd.DataFrame, group_col: str, value_cols: list, operation: str):
+    """Raggruppa il DataFrame per una colonna e aggrega le colonne numeriche.
+
+    Args:
+        df (pandas.DataFrame): DataFrame sorgente (di solito già filtrato).
+        group_col (str): Colonna (categorica) su cui raggruppare.
+        value_cols (list): Colonne numeriche da aggregare.
+        operation (str): Una tra ``'sum'``, ``'mean'``, ``'count'``, ``'max'``, ``'min'``.
+
+    Returns:
+        pandas.DataFrame: Tabella aggregata ordinata (discendente) per la prima
+            colonna di valore.
+    """
+    if operation == "count":
+        agg_df = df.groupby(group_col)[value_cols].count().reset_index()
+    else:
+        agg_df = df.groupby(group_col)[value_cols].agg(operation).reset_index()
+
+    # Ordina per la prima colonna di valore (discendente)
+    return agg_df.sort_values(by=value_cols[0], ascending=False)
+
+
+def parse_filters(raw_filters: list):
+    """Converte filtri serializzati (JSON/YAML) nelle tuple usate da ``apply_filters``.
+
+    Accetta sia liste ``[col, op, value]`` che dizionari
+    ``{"column": ..., "op": ..., "value": ...}``. Il valore di ``between`` deve
+    essere una coppia ``[min, max]`` di valori confrontabili fra loro, quello di
+    ``in``/``not_in`` una lista.
+
+    Args:
+        raw_filters (list): Filtri letti da una specifica esterna.
+
+    Returns:
+        list[tuple]: Lista di tuple ``(col, operatore, valore)``.
+
+    Raises:
+        ValueError: Se un filtro non è nel formato atteso o l'operatore non è supportato.
+    """
+    if raw_filters is not None and not isinstance(raw_filters, (list, tuple)):
+        raise ValueError(f"I filtri devono essere una lista: {raw_filters!r}")
+    filters = []
+    for raw in raw_filters or []:
+        if isinstance(raw, dict):
+            col, op, value = raw.get("column"), raw.get("op"), raw.get("value")
+        else:
+            try:
+                col, op, value = raw
+            except (TypeError, ValueError):
+                raise ValueError(f"Filtro non valido: {raw!r}")
+        if not isinstance(col, str):
+            raise ValueError(f"Colonna del filtro non valida: {col!r}")
+
+        if op == "between":
+            if not isinstance(value, (list, tuple)) or len(value) != 2:
+                raise ValueError(f"Il filtro 'between' su {col!r} richiede [min, max], non {value!r}")
+            min_v, max_v = value
+            try:
+                min_v <= max_v
+            except TypeError:
+                raise ValueError(f"Estremi non confrontabili nel filtro 'between' su {col!r}: {value!r}")
+            value = (min_v, max_v)
+        elif op in ("in", "not_in"):
+            if not isinstance(value, (list, tuple)):
+                raise ValueError(f"Il filtro {op!r} su {col!r} richiede una lista di valori, non {value!r}")
+            value = list(value)
+        else:
+            raise ValueError(f"Operatore di filtro non supportato: {op!r}")
+
+        filters.append((col, op, value))
+    return filters
+
+
+# ======================================================
+# STATISTICHE E ROLLUP INCREMENTALI
+# ======================================================
+# Le funzioni seguenti producono riepiloghi "fondibili": il riepilogo di
+# un dataset esteso si ottiene fondendo quello della versione precedente
+# con quello delle sole righe aggiunte, senza rileggere tutti i dati.
+
+def summarize(df: pd.DataFrame) -> dict:
+    """Calcola un riepilogo fondibile (count/sum/min/max) per ogni colonna.
+
+    Args:
+        df (pandas.DataFrame): DataFrame sorgente.
+
+    Returns:
+        dict: Mappa colonna → ``{"count", "sum", "min", "max"}``; per le colonne
+            non numeriche solo ``count``.
+    """
+    counts = df.count()
+    numeric = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
+    sums, mins, maxs = df[numeric].sum(), df[numeric].min(), df[numeric].max()
+
+    summary = {}
+    for col in df.columns:
+        entry = {"count": int(counts[col])}
+        if col in numeric:
+            entry.update(sum=sums[col].item(), min=mins[col].item(), max=maxs[col].item())
+        summary[col] = entry
+    return summary
+
+
+def merge_summaries(a: dict, b: dict) -> dict:
+    """Fonde due riepilogi di ``summarize`` calcolati su righe disgiunte.
+
+    Args:
+        a (dict): Riepilogo della prima parte.
+        b (dict): Riepilogo della seconda parte.
+
+    Returns:
+        dict: Riepilogo equivalente a quello dell'unione delle righe.
+    """
+    merged = {}
+    for col in a.keys() | b.keys():
+        ea, eb = a.get(col, {"count": 0}), b.get(col, {"count": 0})
+        entry = {"count": ea["count"] + eb["count"]}
+        if "sum" in ea or "sum" in eb:
+            entry["sum"] = ea.get("sum", 0) + eb.get("sum", 0)
+            # min/max ignorano le parti senza valori (NaN)
+            entry["min"] = pd.Series([ea.get("min"), eb.get("min")], dtype=float).min()
+            entry["max"] = pd.Series([ea.get("max"), eb.get("max")], dtype=float).max()
+        merged[col] = entry
+    return merged
+
+
+def statistics_from_summary(summary: dict, columns: list, operation: str) -> dict:
+    """Come ``compute_statistics``, ma a partire da un riepilogo di ``summarize``.
+
+    Args:
+        summary (dict): Riepilogo del dataset.
+        columns (list): Colonne su cui calcolare le statistiche.
+        operation (str): ``'Media'``, ``'Somma'``, ``'Conteggio'``, ``'Massimo'`` o ``'Minimo'``.
+
+    Returns:
+        dict: Mappa colonna → valore calcolato.
+    """
+    results = {}
+    for col in columns:
+        entry = summary[col]
+        if operation == "Conteggio":
+            results[col] = entry["count"]
+        elif "sum" not in entry:
+            continue
+        elif operation == "Media":
+            results[col] = entry["sum"] / entry["count"] if entry["count"] else float("nan")
+        elif operation == "Somma":
+            results[col] = entry["sum"]
+        elif operation == "Massimo":
+            results[col] = entry["max"]
+        elif operation == "Minimo":
+            results[col] = entry["min"]
+    return results
+
+
+def rollup(df: pd.DataFrame, group_col: str) -> pd.DataFrame:
+    """Calcola count/sum/min/max di tutte le colonne numeriche per gruppo.
+
+    Args:
+        df (pandas.DataFrame): DataFrame sorgente.
+        group_col (str): Colonna su cui raggruppare.
+
+    Returns:
+        pandas.DataFrame: Indicizzato per gruppo, colonne ``(colonna, statistica)``.
+    """
+    numeric = [c for c in df.columns if c != group_col and pd.api.types.is_numeric_dtype(df[c])]
+    return df.groupby(group_col)[numeric].agg(["count", "sum", "min", "max"])
+
+
+def merge_rollups(a: pd.DataFrame, b: pd.DataFrame) -> pd.DataFrame:
+    """Fonde due rollup di ``rollup`` calcolati su righe disgiunte."""
+    both = pd.concat([a, b])
+    funcs = {col: ("min" if col[1] == "min" else "max" if col[1] == "max" else "sum") for col in both.columns}
+    return both.groupby(level=0).agg(funcs)
+
+
+def aggregate_from_rollup(rolled: pd.DataFrame, group_col: str, value_cols: list, operation: str) -> pd.DataFrame:
+    """Come ``aggregate``, ma a partire da un rollup precalcolato.
+
+    Args:
+        rolled (pandas.DataFrame): Rollup restituito da ``rollup``/``merge_rollups``.
+        group_col (str): Colonna di raggruppamento usata per il rollup.
+        value_cols (list): Colonne numeriche da aggregare.
+        operation (str): Una tra ``'sum'``, ``'mean'``, ``'count'``, ``'max'``, ``'min'``.
+
+    Returns:
+        pandas.DataFrame: Tabella aggregata nello stesso formato di ``aggregate``.
+    """
+    return _from_rollup(rolled, group_col, value_cols, operation).sort_values(by=value_cols[0], ascending=False)
+
+
+def _from_rollup(rolled: pd.DataFrame, group_col: str, value_cols: list, operation: str) -> pd.DataFrame:
+    out = pd.DataFrame(index=rolled.index)
+    for col in value_cols:
+        if operation == "mean":
+            out[col] = rolled[(col, "sum")] / rolled[(col, "count")]
+        else:
+            out[col] = rolled[(col, operation)]
+    out.index.name = group_col
+    return out.reset_index()
+
+
+# ======================================================
+# SERIE TEMPORALI
+# ======================================================
+# Il ricampionamento passa da un rollup per intervallo di tempo: lo stesso
+# rollup serve tutte le operazioni e si aggiorna in modo incrementale con
+# le righe aggiunte (vedi ``merge_rollups``).
+
+RESAMPLE_FREQUENCIES = {"Minuto": "min", "Ora": "h", "Giorno": "D", "Mese": "MS"}
+
+
+def time_buckets(series: pd.Series, freq: str) -> pd.Series:
+    """Inizio dell'intervallo di tempo di ogni valore (vettoriale).
+
+    Args:
+        series (pandas.Series): Colonna ``datetime64``.
+        freq (str): ``'min'``, ``'h'``, ``'D'`` o ``'MS'`` (inizio del mese).
+
+    Returns:
+        pandas.Series: Valori arrotondati all'inizio dell'intervallo.
+    """
+    if freq == "MS":
+        # I mesi non hanno durata fissa: floor() non è applicabile
+        tz = series.dt.tz
+        local = series.dt.tz_localize(None) if tz is not None else series
+        months = local.to_numpy().astype("datetime64[M]").astype("datetime64[ns]")
+        months = pd.Series(months, index=series.index, name=series.name)
+        return months.dt.tz_localize(tz) if tz is not None else months
+    return series.dt.floor(freq)
+
+
+def choose_frequency(series: pd.Series, max_points: int = 1000) -> str:
+    """Sceglie l'intervallo più fine che produce al massimo ``max_points`` punti.
+
+    Args:
+        series (pandas.Series): Colonna ``datetime64``.
+        max_points (int, optional): Numero massimo di intervalli. Default 1000.
+
+    Returns:
+        str: Una delle frequenze di ``RESAMPLE_FREQUENCIES``.
+    """
+    span = series.max() - series.min()
+    if pd.isna(span):
+        return "D"
+    for freq in ["min", "h", "D"]:
+        if span / pd.Timedelta(1, unit=freq) < max_points:
+            return freq
+    return "MS"
+
+
+def resample_rollup(df: pd.DataFrame, time_col: str, freq: str) -> pd.DataFrame:
+    """Rollup (count/sum/min/max delle colonne numeriche) per intervallo di tempo.
+
+    Args:
+        df (pandas.DataFrame): DataFrame sorgente.
+        time_col (str): Colonna ``datetime64``.
+        freq (str): Frequenza (vedi ``time_buckets``).
+
+    Returns:
+        pandas.DataFrame: Rollup indicizzato per inizio dell'intervallo (righe senza data escluse).
+    """
+    return rollup(df.assign(**{time_col: time_buckets(df[time_col], freq)}), time_col)
+
+
+def resample_from_rollup(rolled: pd.DataFrame, time_col: str, value_cols: list, operation: str) -> pd.DataFrame:
+    """Serie temporale aggregata a partire da un rollup di ``resample_rollup``.
+
+    Args:
+        rolled (pandas.DataFrame): Rollup per intervallo.
+        time_col (str): Colonna di date usata per il rollup.
+        value_cols (list): Colonne numeriche da aggregare.
+        operation (str): Una tra ``'sum'``, ``'mean'``, ``'count'``, ``'max'``, ``'min'``.
+
+    Returns:
+        pandas.DataFrame: Una riga per intervallo (solo quelli con dati), in ordine di tempo.
+    """
+    return _from_rollup(rolled.sort_index(), time_col, value_cols, operation)
+
+
+def resample_aggregate(df: pd.DataFrame, time_col: str, value_cols: list, freq: str, operation: str) -> pd.DataFrame:
+    """Aggrega le colonne numeriche per minuto, ora, giorno o mese.
+
+    Args:
+        df (pandas.DataFrame): DataFrame sorgente (di solito già filtrato).
+        time_col (str): Colonna ``datetime64``.
+        value_cols (list): Colonne numeriche da aggregare.
+        freq (str): Frequenza (vedi ``RESAMPLE_FREQUENCIES``).
+        operation (str): Una tra ``'sum'``, ``'mean'``, ``'count'``, ``'max'``, ``'min'``.
+
+    Returns:
+        pandas.DataFrame: Una riga per intervallo, in ordine di tempo.
+    """
+    return resample_from_rollup(resample_rollup(df[[time_col] + value_cols], time_col, freq),
+                                time_col, value_cols, operation)
+
+
+# ======================================================
+# PROFILO DEL DATASET
+# ======================================================
+def _is_measure(series: pd.Series) -> bool:
+    # Colonne con statistiche numeriche e istogramma (i booleani sono trattati come categorie)
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+def _histogram(series: pd.Series, bins: int):
+    # Istogramma dei soli valori finiti (None se la colonna non ne ha)
+    values = series.to_numpy(dtype=float, na_value=np.nan)
+    values = values[np.isfinite(values)]
+    return np.histogram(values, bins=bins) if len(values) else None
+
+
+def profile_dataset(df: pd.DataFrame, bins: int = 20, top_k: int = 10) -> dict:
+    """Profilo completo del dataset: statistiche per colonna, qualità, correlazioni e distribuzioni.
+
+    Statistiche numeriche (media, deviazione standard, quantili, min/max), valori
+    mancanti e distinti sono calcolati con operazioni vettoriali su tutte le
+    colonne insieme. Istogrammi (``np.histogram``) e valori più frequenti
+    (``value_counts``) richiedono una passata per colonna.
+
+    Args:
+        df (pandas.DataFrame): DataFrame sorgente.
+        bins (int, optional): Intervalli degli istogrammi. Default 20.
+        top_k (int, optional): Valori più frequenti per colonna categorica. Default 10.
+
+    Returns:
+        dict: ``rows`` e ``duplicates`` (righe identiche a una precedente); ``columns``
+            (una riga per colonna: tipo, valori, mancanti, distinti, media, dev. std,
+            min, quartili, max); ``correlation`` (matrice di Pearson delle colonne
+            numeriche); ``histograms`` (colonna → ``(conteggi, estremi)``) e
+            ``top_values`` (colonna → DataFrame ``valore``/``conteggio``).
+    """
+    rows = len(df)
+    measures = [c for c in df.columns if _is_measure(df[c])]
+    block = df[measures]
+
+    dup_count = int(pd.util.hash_pandas_object(df, index=False).duplicated().sum()) if rows else 0
+    corr = block.corr() if len(measures) >= 2 else pd.DataFrame()
+    histograms, top_values = {}, {}
+    for c in df.columns:
+        if c in measures:
+            histogram = _histogram(df[c], bins)
+            if histogram is not None:
+                histograms[c] = histogram
+        elif not pd.api.types.is_datetime64_any_dtype(df[c]):
+            top = df[c].value_counts(dropna=True).head(top_k)
+            top_values[c] = pd.DataFrame({"valore": top.index, "conteggio": top.to_numpy()})
+
+    nulls = df.isna().sum()
+    table = pd.DataFrame({
+        "tipo": df.dtypes.astype(str),
+        "valori": rows - nulls,
+        "mancanti": nulls,
+        "% mancanti": (nulls / rows * 100).round(2) if rows else nulls.astype(float),
+        "distinti": df.nunique(dropna=True),
+    })
+    if measures:
+        stats = block.agg(["mean", "std", "min", "max"]).T
+        quartiles = block.quantile([0.25, 0.5, 0.75]).T
+        stats = stats.join(quartiles.set_axis(["25%", "mediana", "75%"], axis=1))
+        stats = stats.rename(columns={"mean": "media", "std": "dev. std"})
+        table = table.join(stats[["media", "dev. std", "min", "25%", "mediana", "75%", "max"]])
+    table.index.name = "colonna"
+
+    return {
+        "rows": rows,
+        "duplicates": dup_count,
+        "columns": table,
+        "correlation": corr,
+        "histograms": histograms,
+        "top_values": top_values,
+    }
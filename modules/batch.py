@@ -0,0 +1,280 @@
+"""
+batch.py
+--------
+Esecuzione headless della pipeline di analisi su molti CSV.
+
+La pipeline (filtri, statistiche, aggregazioni, grafici ed export) è
+descritta da una specifica JSON/YAML e viene applicata a ogni file in
+parallelo tramite un ``ProcessPoolExecutor``. Ogni file scrive in una propria
+sottocartella (``<nome_csv>``, preceduto dalla cartella di origine se più file
+hanno lo stesso nome). Al termine viene scritto un riepilogo ``summary.json``
+nella cartella di output.
+
+Esempio di specifica::
+
+    {
+        "columns": ["regione", "vendite"],
+        "filters": [["vendite", "between", [0, 1000]]],
+        "statistics": ["Media", "Somma"],
+        "aggregations": [{"group_by": "regione", "values": ["vendite"], "op": "sum", "charts": ["Barre"]}],
+        "charts": [{"type": "Barre", "columns": ["vendite"]}],
+        "exports": ["csv", "xlsx"],
+        "chart_exports": ["png", "pdf", "report"]
+    }
+"""
+
+import glob
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+matplotlib.use("Agg")  # nessun display nei worker
+import matplotlib.pyplot as plt
+
+from modules.data_loader import load_csv
+from modules.analyzer import apply_filters, compute_statistics, aggregate, parse_filters
+from modules.plotter import generate_plot
+from modules.exporter import export_to_csv, export_to_excel, export_to_png, export_to_pdf_chart, export_pdf_report
+
+
+def load_spec(path: str) -> dict:
+    """Legge la specifica della pipeline da file JSON o YAML.
+
+    Il formato YAML richiede ``PyYAML`` (opzionale).
+
+    Args:
+        path (str): Percorso del file di specifica (``.json``, ``.yaml`` o ``.yml``).
+
+    Returns:
+        dict: Specifica della pipeline.
+
+    Raises:
+        ValueError: Se il file è YAML e ``PyYAML`` non è installato.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("Per le specifiche YAML è necessario installare PyYAML")
+            return yaml.safe_load(f) or {}
+        return json.load(f)
+
+
+def collect_inputs(source: str) -> list:
+    """Restituisce la lista ordinata dei CSV indicati da una cartella o da un glob.
+
+    Args:
+        source (str): Cartella contenente i CSV oppure pattern glob (es. ``data/*.csv``).
+
+    Returns:
+        list[str]: Percorsi dei file CSV trovati.
+    """
+    if os.path.isdir(source):
+        pattern = os.path.join(source, "*.csv")
+    else:
+        pattern = source
+    return sorted(p for p in glob.glob(pattern) if os.path.isfile(p))
+
+
+def _output_stems(inputs: list) -> list:
+    # Sottocartella di output di ogni file: il nome del CSV, preceduto dalla cartella che lo
+    # contiene se più file hanno lo stesso nome (es. gennaio/vendite.csv e febbraio/vendite.csv),
+    # con un suffisso numerico se resta ambiguo. Confronto senza maiuscole per i file system
+    # che non le distinguono.
+    stems = [os.path.splitext(os.path.basename(p))[0] for p in inputs]
+    repeated = Counter(stem.lower() for stem in stems)
+    used, result = set(), []
+    for path, stem in zip(inputs, stems):
+        if repeated[stem.lower()] > 1:
+            parent = os.path.basename(os.path.dirname(os.path.abspath(path)))
+            stem = f"{parent}_{stem}" if parent else stem
+        unique, n = stem, 2
+        while unique.lower() in used:
+            unique, n = f"{stem}_{n}", n + 1
+        used.add(unique.lower())
+        result.append(unique)
+    return result
+
+
+def _json_default(value):
+    # Converte scalari numpy/pandas in tipi nativi serializzabili
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def _write(path: str, exported: tuple, outputs: list, errors: list):
+    # ``exported`` è la coppia (data, error) restituita dalle funzioni di export
+    data, err = exported
+    if data is None:
+        errors.append(err)
+        return
+    with open(path, "wb") as f:
+        f.write(data)
+    outputs.append(path)
+
+
+def _export_frame(df, base_path: str, formats: list, outputs: list, errors: list):
+    if "csv" in formats:
+        _write(f"{base_path}.csv", export_to_csv(df), outputs, errors)
+    if "xlsx" in formats:
+        _write(f"{base_path}.xlsx", export_to_excel(df, f"{base_path}.xlsx"), outputs, errors)
+
+
+def _export_chart(df, fig, base_path: str, title: str, formats: list, outputs: list, errors: list):
+    if "png" in formats:
+        _write(f"{base_path}.png", export_to_png(fig), outputs, errors)
+    if "pdf" in formats:
+        _write(f"{base_path}.pdf", export_to_pdf_chart(fig, f"{base_path}.pdf"), outputs, errors)
+    if "report" in formats:
+        report_path = f"{base_path}_report.pdf"
+        _write(report_path, export_pdf_report(df, fig, title, report_path), outputs, errors)
+
+
+def process_file(path: str, spec: dict, out_dir: str, persist: bool = False, stem: str = None) -> dict:
+    """Applica la pipeline descritta da ``spec`` a un singolo CSV.
+
+    Funzione di modulo (e non closure) per poter essere eseguita in un
+    processo worker.
+
+    Args:
+        path (str): Percorso del CSV da elaborare.
+        spec (dict): Specifica della pipeline (vedi docstring del modulo).
+        out_dir (str): Cartella di output; i file vengono scritti in ``out_dir/<stem>/``.
+        persist (bool, optional): Se True salva il dataset caricato nel DB tramite
+            ``database.save_dataset`` e ne riporta l'ID nel risultato. Default False.
+        stem (str, optional): Nome della sottocartella e prefisso dei file di output
+            (default: il nome del CSV senza estensione).
+
+    Returns:
+        dict: Riepilogo dell'elaborazione (stato, righe, output prodotti, errori, durata
+            e, con ``persist``, ``dataset_id`` e ``created``).
+    """
+    start = time.perf_counter()
+    name = os.path.basename(path)
+    stem = stem or os.path.splitext(name)[0]
+    result = {"file": path, "name": name, "status": "ok", "errors": [], "outputs": []}
+
+    with open(path, "rb") as f:
+        df, err = load_csv(f)
+    if err:
+        result.update(status="error", errors=[err], seconds=round(time.perf_counter() - start, 3))
+        return result
+
+    file_dir = os.path.join(out_dir, stem)
+    os.makedirs(file_dir, exist_ok=True)
+    outputs, errors = result["outputs"], result["errors"]
+
+    try:
+        columns = spec.get("columns") or df.columns.tolist()
+        filters = parse_filters(spec.get("filters", []))
+        filtered_df = apply_filters(df, columns, filters)
+        result.update(rows=len(df), columns=len(df.columns), filtered_rows=len(filtered_df))
+
+        exports = spec.get("exports", ["csv"])
+        chart_exports = spec.get("chart_exports", ["png"])
+        _export_frame(filtered_df, os.path.join(file_dir, f"{stem}_filtered"), exports, outputs, errors)
+
+        # Statistiche: una mappa operazione -> {colonna: valore}
+        statistics = {op: compute_statistics(filtered_df, columns, op) for op in spec.get("statistics", [])}
+        if statistics:
+            stats_path = os.path.join(file_dir, f"{stem}_statistics.json")
+            with open(stats_path, "w", encoding="utf-8") as f:
+                json.dump(statistics, f, indent=2, ensure_ascii=False, default=_json_default)
+            outputs.append(stats_path)
+
+        for agg in spec.get("aggregations", []):
+            group_col, value_cols, op = agg["group_by"], agg["values"], agg.get("op", "sum")
+            agg_df = aggregate(filtered_df, group_col, value_cols, op)
+            agg_base = os.path.join(file_dir, f"{stem}_{group_col}_{op}")
+            _export_frame(agg_df, agg_base, exports, outputs, errors)
+            for chart in agg.get("charts", []):
+                fig = generate_plot(agg_df, [group_col] + value_cols, chart)
+                if fig is None:
+                    errors.append(f"Impossibile generare il grafico aggregato '{chart}' ({group_col}, {op})")
+                    continue
+                _export_chart(agg_df, fig, f"{agg_base}_{chart}", f"Report Aggregato: {chart}", chart_exports, outputs, errors)
+                plt.close(fig)
+
+        for chart in spec.get("charts", []):
+            chart_type = chart["type"]
+            fig = generate_plot(filtered_df, chart.get("columns") or columns, chart_type)
+            if fig is None:
+                errors.append(f"Impossibile generare il grafico '{chart_type}'")
+                continue
+            _export_chart(filtered_df, fig, os.path.join(file_dir, f"{stem}_{chart_type}"), f"Report: {chart_type}", chart_exports, outputs, errors)
+            plt.close(fig)
+
+    except Exception as e:
+        errors.append(f"{type(e).__name__}: {e}")
+        result["status"] = "error"
+
+    if persist:
+        # Salvataggio nel worker: al processo principale torna solo l'ID, non il DataFrame.
+        # Le scritture concorrenti su SQLite attendono il lock (vedi database._connect).
+        from database import save_dataset
+        try:
+            dataset_id, created = save_dataset(name, df)
+            result.update(dataset_id=dataset_id, created=created)
+        except Exception as e:
+            errors.append(f"Salvataggio nel DB non riuscito: {type(e).__name__}: {e}")
+
+    if errors and result["status"] == "ok":
+        result["status"] = "partial"
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run_batch(inputs: list, spec: dict, out_dir: str, workers: int = None, persist: bool = False) -> list:
+    """Elabora in parallelo una lista di CSV e scrive il riepilogo ``summary.json``.
+
+    Args:
+        inputs (list): Percorsi dei CSV da elaborare.
+        spec (dict): Specifica della pipeline.
+        out_dir (str): Cartella di output.
+        workers (int, optional): Numero di processi worker (default: numero di CPU).
+        persist (bool, optional): Se True ogni worker salva il proprio dataset nel DB
+            tramite ``database.save_dataset``. Default False.
+
+    Returns:
+        list[dict]: Riepilogo per file, nello stesso ordine di ``inputs``.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    results = {}
+
+    if persist:
+        from database import init_db
+        init_db()
+
+    stems = _output_stems(inputs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_file, path, spec, out_dir, persist, stems[i]): i
+                   for i, path in enumerate(inputs)}
+        for future in as_completed(futures):
+            i = futures[future]
+            path = inputs[i]
+            try:
+                res = future.result()
+            except Exception as e:
+                res = {"file": path, "name": os.path.basename(path), "status": "error",
+                       "errors": [f"{type(e).__name__}: {e}"], "outputs": []}
+
+            print(f"[BATCH] {res['name']}: {res['status']} ({res.get('seconds', '-')}s)")
+            results[i] = res
+
+    ordered = [results[i] for i in range(len(inputs))]
+    summary_path = os.path.join(out_dir, "summary.json")
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "files": len(ordered),
+            "ok": sum(1 for r in ordered if r["status"] == "ok"),
+            "partial": sum(1 for r in ordered if r["status"] == "partial"),
+            "errors": sum(1 for r in ordered if r["status"] == "error"),
+            "results": ordered,
+        }, f, indent=2, ensure_ascii=False, default=_json_default)
+    print(f"[BATCH] Riepilogo scritto in: {summary_path}")
+    return ordered
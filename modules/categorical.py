@@ -0,0 +1,82 @@
+"""
+categorical.py
+--------------
+Dizionario dei valori per i filtri su colonne categoriche ad alta cardinalità.
+
+Con centinaia di migliaia di valori distinti (es. codici cliente) non è
+pensabile passarli tutti a ``st.multiselect`` né costruire ogni volta la
+lista completa per ``isin``. Il ``ValueDictionary`` conserva i valori distinti
+ordinati con il relativo conteggio, calcolati una volta per dataset, e
+permette di cercare per prefisso (ricerca binaria) o sottostringa e di
+proporre i K valori più frequenti.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class ValueDictionary:
+    """Valori distinti (non mancanti) di una colonna con il numero di occorrenze.
+
+    Args:
+        values (list): Valori distinti.
+        counts (list): Occorrenze di ogni valore (stesso ordine di ``values``).
+    """
+
+    def __init__(self, values, counts):
+        keys = pd.Series(values, dtype=object).astype(str).str.lower().to_numpy()
+        order = np.argsort(keys, kind="stable")
+        # Chiavi in minuscolo ordinate: la ricerca per prefisso è una ricerca binaria
+        self.keys = keys[order]
+        self.values = np.asarray(values, dtype=object)[order]
+        self.counts = np.asarray(counts, dtype=np.int64)[order]
+        self._by_count = None
+        self._lookup = None
+
+    @classmethod
+    def from_series(cls, series: pd.Series) -> "ValueDictionary":
+        """Costruisce il dizionario dai valori di una colonna (i mancanti sono esclusi)."""
+        counts = series.value_counts(dropna=True, sort=False)
+        return cls(counts.index.tolist(), counts.to_numpy())
+
+    def __len__(self):
+        return len(self.values)
+
+    def merge(self, other: "ValueDictionary") -> "ValueDictionary":
+        """Unisce due dizionari sommando i conteggi (es. versione precedente + righe aggiunte)."""
+        counts = pd.concat([pd.Series(self.counts, index=self.values),
+                            pd.Series(other.counts, index=other.values)]).groupby(level=0, sort=False).sum()
+        return ValueDictionary(counts.index.tolist(), counts.to_numpy())
+
+    def count(self, value) -> int:
+        """Occorrenze di ``value`` (0 se assente)."""
+        if self._lookup is None:
+            self._lookup = dict(zip(self.values.tolist(), self.counts.tolist()))
+        return self._lookup.get(value, 0)
+
+    def top(self, k: int) -> list:
+        """I ``k`` valori più frequenti, in ordine di frequenza decrescente."""
+        if self._by_count is None:
+            self._by_count = np.argsort(-self.counts, kind="stable")
+        return self.values[self._by_count[:k]].tolist()
+
+    def search(self, query: str, substring: bool = False, limit: int = 50) -> list:
+        """Cerca i valori che iniziano con (o contengono) ``query``, senza distinguere maiuscole.
+
+        Args:
+            query (str): Testo da cercare.
+            substring (bool, optional): Cerca ovunque nel valore invece che solo all'inizio. Default False.
+            limit (int, optional): Numero massimo di risultati. Default 50.
+
+        Returns:
+            list: Valori trovati, i più frequenti per primi.
+        """
+        query = query.lower()
+        if substring:
+            matches = np.flatnonzero(pd.Series(self.keys).str.contains(query, regex=False).to_numpy())
+        else:
+            lo = np.searchsorted(self.keys, query, side="left")
+            hi = np.searchsorted(self.keys, query + "\U0010ffff", side="left")
+            matches = np.arange(lo, hi)
+        best = matches[np.argsort(-self.counts[matches], kind="stable")[:limit]]
+        return self.values[best].tolist()
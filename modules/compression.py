@@ -0,0 +1,144 @@
+"""
+compression.py
+--------------
+Compressione dei dataset salvati nel database.
+
+Ogni codec è una coppia di funzioni ``bytes → bytes`` registrata in ``CODECS``:
+``zlib``, ``lzma`` e ``bz2`` della libreria standard e, se pyarrow è installato
+con il supporto relativo, ``zstd``, ``lz4``, ``brotli`` e ``snappy``. Il codec
+usato viene salvato con il record (colonna `codec`), quindi dataset compressi
+in modo diverso convivono nello stesso database.
+
+Per i file Arrow la compressione è quella nativa del formato IPC (solo ``lz4``
+e ``zstd``, vedi ``ARROW_IPC_CODECS``): i buffer vengono decompressi in lettura
+e il memory-map senza copie non è più possibile.
+
+``benchmark`` misura rapporto di compressione e velocità di ogni codec su un
+payload, per scegliere consapevolmente fra spazio e velocità
+(``python cli.py codecs``).
+"""
+
+import bz2
+import lzma
+import struct
+import time
+import zlib
+
+# Codec supportati dal formato Arrow IPC (compressione dei buffer)
+ARROW_IPC_CODECS = ("lz4", "zstd")
+
+# Codec di pyarrow esposti (se disponibili nella build installata)
+_ARROW_CODECS = ("zstd", "lz4", "brotli", "snappy")
+
+# Prefisso dei payload compressi con pyarrow: dimensione originale (uint64)
+_SIZE = struct.Struct("<Q")
+
+
+def _arrow_codec(name: str):
+    def compress(data: bytes) -> bytes:
+        import pyarrow as pa
+
+        return _SIZE.pack(len(data)) + pa.compress(data, codec=name, asbytes=True)
+
+    def decompress(data: bytes) -> bytes:
+        import pyarrow as pa
+
+        (size,) = _SIZE.unpack_from(data)
+        return pa.decompress(memoryview(data)[_SIZE.size:], decompressed_size=size, codec=name, asbytes=True)
+
+    return compress, decompress
+
+
+def _register_codecs() -> dict:
+    codecs = {
+        "zlib": (lambda data: zlib.compress(data, 6), zlib.decompress),
+        "lzma": (lambda data: lzma.compress(data, preset=1), lzma.decompress),
+        "bz2": (lambda data: bz2.compress(data, 9), bz2.decompress),
+    }
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return codecs
+    for name in _ARROW_CODECS:
+        if pa.Codec.is_available(name):
+            codecs[name] = _arrow_codec(name)
+    return codecs
+
+
+CODECS = _register_codecs()
+
+
+def available_codecs() -> list:
+    """Nomi dei codec utilizzabili, preceduti da ``'none'`` (nessuna compressione)."""
+    return ["none"] + list(CODECS)
+
+
+def _check(codec: str):
+    if codec not in CODECS:
+        raise ValueError(f"Codec di compressione non supportato: {codec!r} "
+                         f"(disponibili: {', '.join(available_codecs())})")
+
+
+def compress(data: bytes, codec: str = None) -> bytes:
+    """Comprime ``data`` con ``codec`` (``None`` o ``'none'``: restituisce i dati invariati).
+
+    Raises:
+        ValueError: Se il codec non è disponibile.
+    """
+    if codec in (None, "none"):
+        return data
+    _check(codec)
+    return CODECS[codec][0](data)
+
+
+def decompress(data: bytes, codec: str = None) -> bytes:
+    """Operazione inversa di ``compress``.
+
+    Raises:
+        ValueError: Se il codec non è disponibile.
+    """
+    if codec in (None, "none"):
+        return data
+    _check(codec)
+    return CODECS[codec][1](data)
+
+
+def benchmark(data: bytes, codecs: list = None, repeat: int = 3) -> list:
+    """Misura rapporto e velocità di compressione/decompressione di ``data``.
+
+    Args:
+        data (bytes): Payload di prova (es. il pickle di un dataset).
+        codecs (list, optional): Codec da provare (default: tutti quelli disponibili).
+        repeat (int, optional): Ripetizioni per misura (si tiene il tempo minimo). Default 3.
+
+    Returns:
+        list[dict]: Un dizionario per codec con ``codec``, ``size`` (byte compressi),
+            ``ratio`` (originale / compresso), ``compress_mb_s`` e ``decompress_mb_s``
+            (MB di dati originali al secondo).
+
+    Raises:
+        ValueError: Se un codec non è disponibile.
+    """
+    mb = len(data) / 1024 ** 2
+    results = []
+    for codec in codecs or list(CODECS):
+        _check(codec)
+        pack, unpack = CODECS[codec]
+        best_c = best_d = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            packed = pack(data)
+            elapsed = time.perf_counter() - start
+            best_c = elapsed if best_c is None else min(best_c, elapsed)
+            start = time.perf_counter()
+            unpack(packed)
+            elapsed = time.perf_counter() - start
+            best_d = elapsed if best_d is None else min(best_d, elapsed)
+        results.append({
+            "codec": codec,
+            "size": len(packed),
+            "ratio": len(data) / max(1, len(packed)),
+            "compress_mb_s": mb / max(best_c, 1e-9),
+            "decompress_mb_s": mb / max(best_d, 1e-9),
+        })
+    return results
@@ -4,17 +4,95 @@ data_loader.py
 Gestisce il caricamento sicuro e robusto dei file CSV.
 """
 
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+
 import pandas as pd
-from typing import Tuple, Optional
+from typing import List, Tuple, Optional
+
+
+# Formati di data/ora provati (giorno prima del mese), poi ISO 8601 generico
+DATETIME_FORMATS = [
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d",
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y",
+    "%d-%m-%Y",
+    "%d.%m.%Y",
+    "ISO8601",
+]
+
+# Valore che è solo una data, eventualmente seguita da ora e offset UTC (es. "31/12/2024",
+# "2024-12-31T10:00:00.5+01:00"): i testi che contengono una data in mezzo ad altro no
+DATE_PATTERN = (r"^\s*\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}"
+                r"(?:[T ]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?\s*(?:[+-]\d{2}:?\d{2}|Z)?)?\s*$")
+
+# Ora seguita da un offset UTC esplicito (es. "10:00:00+01:00", "10:00:00.5Z")
+UTC_OFFSET_PATTERN = r"\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?\s*([+-]\d{2}:?\d{2}|Z)$"
 
 
-def load_csv(file) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+def _to_datetime(values: pd.Series, fmt: str) -> pd.Series:
+    # Offset diversi nella stessa colonna (es. ora solare e legale) non hanno un dtype comune:
+    # pandas restituirebbe una colonna object (un errore nelle versioni future), quindi
+    # in quel caso gli istanti vengono convertiti in UTC. Solo ISO8601 accetta gli offset.
+    utc = fmt == "ISO8601" and values.astype(str).str.extract(UTC_OFFSET_PATTERN, expand=False).nunique() > 1
+    return pd.to_datetime(values, format=fmt, errors="coerce", utc=utc)
+
+
+def parse_datetime_columns(df: pd.DataFrame, sample_size: int = 1000) -> pd.DataFrame:
+    """Converte in ``datetime64`` le colonne di testo che contengono date.
+
+    Il formato viene scelto su un campione (il primo di ``DATETIME_FORMATS`` che
+    interpreta tutti i valori) e poi applicato all'intera colonna in modo
+    vettoriale. Una colonna viene convertita solo se tutti i valori non mancanti
+    sono date valide: in caso contrario resta testuale, senza perdere dati.
+    Le colonne con un solo offset UTC mantengono il fuso orario; quelle con
+    offset diversi vengono convertite in UTC. Le colonne che pandas non riesce
+    a convertire insieme (es. date con e senza fuso) restano testuali.
+
+    Args:
+        df (pandas.DataFrame): DataFrame appena letto.
+        sample_size (int, optional): Valori usati per riconoscere il formato. Default 1000.
+
+    Returns:
+        pandas.DataFrame: Lo stesso DataFrame, con le colonne di date convertite.
+    """
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        values = df[col].dropna()
+        sample = values.head(sample_size)
+        # Scarta subito le colonne che non somigliano a date (es. codici, numeri come testo)
+        if sample.empty or not sample.astype(str).str.contains(DATE_PATTERN).all():
+            continue
+        for fmt in DATETIME_FORMATS:
+            try:
+                if not _to_datetime(sample, fmt).notna().all():
+                    continue
+                parsed = _to_datetime(df[col], fmt)
+            except (ValueError, TypeError):
+                # Una colonna non convertibile non deve far fallire il caricamento del file
+                break
+            if pd.api.types.is_datetime64_any_dtype(parsed) and parsed.notna().sum() == len(values):
+                df[col] = parsed
+            break
+    return df
+
+
+def load_csv(file, parse_dates: bool = True) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
     """Carica un CSV provando diversi encoding e gestendo errori comuni.
 
     Prova una serie di encoding comuni e restituisce il primo caricamento riuscito.
+    Le colonne che contengono date vengono convertite in ``datetime64``
+    (vedi ``parse_datetime_columns``).
 
     Args:
         file: Oggetto file-like (es. Streamlit UploadedFile) posizionabile con ``seek``.
+        parse_dates (bool, optional): Riconosce e converte le colonne di date. Default True.
 
     Returns:
         tuple[pandas.DataFrame | None, str | None]: Coppia ``(df, error)`` dove ``error`` è ``None``
@@ -28,8 +106,110 @@ def load_csv(file) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
         try:
             file.seek(0)
             df = pd.read_csv(file, sep=None, engine="python", encoding=enc)
-            return df, None
+            return (parse_datetime_columns(df) if parse_dates else df), None
         except Exception as e:
             last_error = str(e)
 
-    return None, f"Errore nel caricamento CSV: {last_error}"
\ No newline at end of file
+    return None, f"Errore nel caricamento CSV: {last_error}"
+
+
+def _load_source(source):
+    # Funzione di modulo per poter essere eseguita in un processo worker.
+    # ``source`` è un percorso oppure una coppia (nome, byte).
+    if isinstance(source, tuple):
+        name, data = source
+        df, err = load_csv(BytesIO(data))
+        return name, df, err
+    with open(source, "rb") as f:
+        df, err = load_csv(f)
+    return os.path.basename(source), df, err
+
+
+def load_many(sources: list, max_workers: int = None, executor: str = "thread") -> List[Tuple[str, Optional[pd.DataFrame], Optional[str]]]:
+    """Carica più CSV in parallelo.
+
+    Il parsing con ``sep=None`` usa l'engine Python di pandas, che trattiene il
+    GIL: per un vero parallelismo serve ``executor="process"``, che però avvia
+    nuovi interpreti e copia byte e DataFrame fra i processi. I processi vanno
+    quindi richiesti esplicitamente (es. dalla CLI); dentro un server come
+    Streamlit si usano i thread.
+
+    Args:
+        sources (list): Percorsi di file oppure oggetti file-like con attributo ``name``
+            (es. Streamlit UploadedFile), che vengono letti in memoria.
+        max_workers (int, optional): Numero massimo di worker (default dell'executor).
+        executor (str, optional): ``'thread'`` o ``'process'``. Default ``'thread'``.
+
+    Returns:
+        list[tuple[str, pandas.DataFrame | None, str | None]]: Terne ``(nome, df, error)``
+            nello stesso ordine di ``sources``.
+    """
+    items = []
+    for src in sources:
+        if isinstance(src, (str, os.PathLike)):
+            items.append(os.fspath(src))
+        else:
+            src.seek(0)
+            items.append((getattr(src, "name", "file.csv"), src.read()))
+
+    pool_cls = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    with pool_cls(max_workers=max_workers) as pool:
+        return list(pool.map(_load_source, items))
+
+
+def _dtype_kind(dtype) -> str:
+    # Famiglia di tipi per align_schemas (bool va prima: per pandas è anche numerico)
+    if pd.api.types.is_bool_dtype(dtype):
+        return "booleana"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "data/ora"
+    if pd.api.types.is_numeric_dtype(dtype):
+        return "numerica"
+    return "testuale"
+
+
+def align_schemas(frames: list) -> Tuple[Optional[list], Optional[str]]:
+    """Verifica che più DataFrame abbiano schemi compatibili e li allinea al primo.
+
+    Le colonne devono essere le stesse (anche in ordine diverso). Colonne intere
+    e decimali sono compatibili (vengono portate a decimale), così come date con
+    lo stesso fuso orario; numeriche, booleane, date e testo sono invece
+    incompatibili fra loro, e così date con fusi orari diversi.
+
+    Args:
+        frames (list): DataFrame da unire.
+
+    Returns:
+        tuple[list[pandas.DataFrame] | None, str | None]: Coppia ``(frames, error)`` con
+            i DataFrame allineati (stesse colonne, stesso ordine, stessi tipi).
+    """
+    if not frames:
+        return None, "Nessun file da unire"
+    columns = list(frames[0].columns)
+    for i, df in enumerate(frames[1:], 2):
+        if set(df.columns) != set(columns):
+            missing = sorted(set(columns) - set(df.columns))
+            extra = sorted(set(df.columns) - set(columns))
+            return None, f"Il file n. {i} ha colonne diverse (mancanti: {missing}, in più: {extra})"
+
+    frames = [df[columns] for df in frames]
+    casts = {}
+    for col in columns:
+        dtypes = {df[col].dtype for df in frames}
+        if len(dtypes) == 1:
+            continue
+        kinds = {_dtype_kind(t) for t in dtypes}
+        if len(kinds) > 1:
+            return None, f"La colonna '{col}' è {' in alcuni file e '.join(sorted(kinds))} in altri"
+        if kinds == {"numerica"}:
+            casts[col] = "float64"
+        elif kinds == {"data/ora"}:
+            zones = {str(getattr(t, "tz", None)) for t in dtypes}
+            if len(zones) > 1:
+                return None, f"La colonna '{col}' ha date con fusi orari diversi ({', '.join(sorted(zones))})"
+            # Stesso fuso, risoluzioni diverse: tutte in nanosecondi
+            tz = getattr(next(iter(dtypes)), "tz", None)
+            casts[col] = pd.DatetimeTZDtype("ns", tz) if tz is not None else "datetime64[ns]"
+    if casts:
+        frames = [df.astype(casts) for df in frames]
+    return frames, None
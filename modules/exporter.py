@@ -0,0 +1,286 @@
+"""
+exporter.py
+-----------
+Funzioni di export (CSV, Excel, PNG, PDF) indipendenti da Streamlit.
+
+Ogni funzione restituisce una coppia ``(data, error)`` come ``load_csv``:
+``data`` contiene i byte del file in caso di successo, ``error`` il
+messaggio d'errore altrimenti. In questo modo possono essere usate sia
+dall'app che dalla CLI batch.
+"""
+
+from io import BytesIO
+from typing import Tuple, Optional
+
+import pandas as pd
+
+
+def export_to_csv(df: pd.DataFrame) -> Tuple[Optional[bytes], Optional[str]]:
+    """Esporta un ``pandas.DataFrame`` in CSV (UTF-8).
+
+    Args:
+        df (pandas.DataFrame): DataFrame da esportare.
+
+    Returns:
+        tuple[bytes | None, str | None]: Coppia ``(data, error)``.
+    """
+    try:
+        return df.to_csv(index=False).encode('utf-8'), None
+    except Exception as e:
+        return None, f"Errore nell'export CSV: {e}"
+
+
+def export_chunks_to_csv(chunks) -> Tuple[Optional[bytes], Optional[str]]:
+    """Esporta in CSV (UTF-8) un risultato letto a blocchi, senza riunirlo in un unico DataFrame.
+
+    Args:
+        chunks (iterable): Blocchi (DataFrame con le stesse colonne), es. ``database.iter_query_dataset``.
+
+    Returns:
+        tuple[bytes | None, str | None]: Coppia ``(data, error)``.
+    """
+    try:
+        buf = BytesIO()
+        for i, chunk in enumerate(chunks):
+            buf.write(chunk.to_csv(index=False, header=i == 0).encode('utf-8'))
+        return buf.getvalue(), None
+    except Exception as e:
+        return None, f"Errore nell'export CSV: {e}"
+
+
+def export_to_png(fig) -> Tuple[Optional[bytes], Optional[str]]:
+    """Esporta un grafico Matplotlib in formato PNG.
+
+    Args:
+        fig (matplotlib.figure.Figure): Figura Matplotlib da esportare.
+
+    Returns:
+        tuple[bytes | None, str | None]: Coppia ``(data, error)``.
+    """
+    try:
+        buf = BytesIO()
+        fig.savefig(buf, format='png', bbox_inches='tight')
+        buf.seek(0)
+        return buf.getvalue(), None
+    except Exception as e:
+        return None, f"Errore nell'export PNG: {e}"
+
+
+def export_to_pdf_chart(fig, filename) -> Tuple[Optional[bytes], Optional[str]]:
+    """Esporta un grafico Matplotlib in formato PDF.
+
+    Args:
+        fig (matplotlib.figure.Figure): Figura Matplotlib da esportare.
+        filename (str): Nome file suggerito (usato solo per metadata/nomi di download).
+
+    Returns:
+        tuple[bytes | None, str | None]: Coppia ``(data, error)``.
+    """
+    try:
+        buf = BytesIO()
+        fig.savefig(buf, format='pdf', bbox_inches='tight')
+        buf.seek(0)
+        return buf.getvalue(), None
+    except Exception as e:
+        return None, f"Errore nell'export PDF: {e}"
+
+
+def export_to_excel(df, filename) -> Tuple[Optional[bytes], Optional[str]]:
+    """Esporta un ``pandas.DataFrame`` in un file Excel (.xlsx).
+
+    Effettua una formattazione di base (larghezza colonne) usando ``openpyxl``.
+    Passando un dizionario ``{nome foglio: DataFrame}`` ogni DataFrame viene
+    scritto in un foglio separato (es. il profilo del dataset).
+
+    Args:
+        df (pandas.DataFrame | dict): DataFrame da esportare, o dizionario di fogli.
+        filename (str): Nome file suggerito (usato solo per metadata/nomi di download).
+
+    Returns:
+        tuple[bytes | None, str | None]: Coppia ``(data, error)``.
+    """
+    try:
+        from openpyxl.utils import get_column_letter
+        sheets = df if isinstance(df, dict) else {'Data': df}
+        buf = BytesIO()
+        with pd.ExcelWriter(buf, engine='openpyxl') as writer:
+            for sheet_name, sheet_df in sheets.items():
+                # Excel limita i nomi dei fogli a 31 caratteri
+                sheet_name = str(sheet_name)[:31]
+                sheet_df.to_excel(writer, sheet_name=sheet_name, index=False)
+                # Formattazione basilare: autowidth delle colonne
+                worksheet = writer.sheets[sheet_name]
+                for idx, col in enumerate(sheet_df.columns, 1):
+                    values = sheet_df.iloc[:, idx - 1].astype(str).apply(len)
+                    max_length = max(values.max() if len(values) else 0, len(str(col))) + 2
+                    col_letter = get_column_letter(idx)
+                    worksheet.column_dimensions[col_letter].width = min(max_length, 50)
+        buf.seek(0)
+        return buf.getvalue(), None
+    except Exception as e:
+        return None, f"Errore nell'export Excel: {e}"
+
+
+# Righe di dati di un foglio Excel (più l'intestazione)
+EXCEL_MAX_ROWS = 1_048_575
+
+
+def export_chunks_to_excel(chunks, filename) -> Tuple[Optional[bytes], Optional[str]]:
+    """Esporta in Excel (.xlsx, un foglio) un risultato letto a blocchi.
+
+    I blocchi vengono scritti uno dopo l'altro nello stesso foglio; la larghezza
+    delle colonne è stimata sul primo blocco.
+
+    Args:
+        chunks (iterable): Blocchi (DataFrame con le stesse colonne), es. ``database.iter_query_dataset``.
+        filename (str): Nome file suggerito (usato solo per metadata/nomi di download).
+
+    Returns:
+        tuple[bytes | None, str | None]: Coppia ``(data, error)``; errore se le righe
+            superano il limite di un foglio Excel.
+    """
+    try:
+        from openpyxl.utils import get_column_letter
+        buf = BytesIO()
+        row = 0
+        with pd.ExcelWriter(buf, engine='openpyxl') as writer:
+            for chunk in chunks:
+                if row + len(chunk) > EXCEL_MAX_ROWS:
+                    return None, f"Errore nell'export Excel: oltre {EXCEL_MAX_ROWS:,} righe (usa il CSV)"
+                chunk.to_excel(writer, sheet_name='Data', index=False, header=row == 0,
+                               startrow=row + 1 if row else 0)
+                if row == 0:
+                    worksheet = writer.sheets['Data']
+                    for idx, col in enumerate(chunk.columns, 1):
+                        values = chunk.iloc[:, idx - 1].astype(str).apply(len)
+                        max_length = max(values.max() if len(values) else 0, len(str(col))) + 2
+                        worksheet.column_dimensions[get_column_letter(idx)].width = min(max_length, 50)
+                row += len(chunk)
+        return buf.getvalue(), None
+    except Exception as e:
+        return None, f"Errore nell'export Excel: {e}"
+
+
+def export_pdf_report(df, fig, title, filename, max_rows: int = 15) -> Tuple[Optional[bytes], Optional[str]]:
+    """Crea ed esporta un report PDF con tabella dati e grafico.
+
+    Usa ``reportlab`` per assemblare un PDF in landscape contenente una
+    tabella (preview limitata delle righe) e il grafico fornito come immagine.
+
+    Args:
+        df (pandas.DataFrame): DataFrame di cui includere la tabella.
+        fig (matplotlib.figure.Figure | list): Figura Matplotlib da includere nel report,
+            oppure una lista di figure (una per pagina dopo la tabella).
+        title (str): Titolo del report.
+        filename (str): Nome file suggerito (usato solo per metadata/nomi di download).
+        max_rows (int, optional): Righe della tabella incluse nel report. Default 15.
+
+    Returns:
+        tuple[bytes | None, str | None]: Coppia ``(data, error)``.
+    """
+    try:
+        from reportlab.lib.pagesizes import A4, landscape
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.units import inch
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, PageBreak
+        from reportlab.lib import colors
+        from datetime import datetime
+
+        # Salva i grafici in PNG per includerli nel PDF
+        figures = [f for f in (fig if isinstance(fig, (list, tuple)) else [fig]) if f is not None]
+        images = []
+        for figure in figures:
+            img_buf = BytesIO()
+            figure.savefig(img_buf, format='png', bbox_inches='tight', dpi=100)
+            img_buf.seek(0)
+            width, height = figure.get_size_inches()
+            images.append((img_buf, width / height))
+
+        # Crea PDF su landscape per grafici larghi
+        pdf_buf = BytesIO()
+        doc = SimpleDocTemplate(pdf_buf, pagesize=landscape(A4), topMargin=0.4*inch, bottomMargin=0.4*inch, leftMargin=0.4*inch, rightMargin=0.4*inch)
+
+        # Stili
+        styles = getSampleStyleSheet()
+        title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=16,
+            textColor=colors.HexColor('#1f77b4'),
+            spaceAfter=8,
+            alignment=1  # centrato
+        )
+        normal_style = ParagraphStyle(
+            'CustomNormal',
+            parent=styles['Normal'],
+            fontSize=8,
+            spaceAfter=4
+        )
+
+        # Contenuto del report
+        story = []
+
+        # Titolo e timestamp
+        story.append(Paragraph(title, title_style))
+        story.append(Paragraph(f"<b>Generato il:</b> {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", normal_style))
+        story.append(Spacer(1, 0.15*inch))
+
+        # Tabella dati (con scroll orizzontale se molte colonne)
+        story.append(Paragraph("<b>Dati</b>", styles['Heading2']))
+
+        # Converti solo le righe mostrate: evita di materializzare l'intero DataFrame
+        data_display = [list(df.columns)] + df.head(max_rows).values.tolist()
+
+        # Limita il numero di righe per leggibilità (default 15 + header su landscape)
+        if len(df) > max_rows:
+            story.append(Paragraph(f"<i>(Visualizzati {max_rows} record su {len(df)} totali)</i>", normal_style))
+
+        # Crea tabella con colonne ridimensionate dinamicamente
+        n_cols = len(df.columns)
+        # Massima larghezza disponibile su landscape A4: ~10 inches
+        max_width = 10 * inch
+        col_widths = [max_width / max(1, n_cols)] * n_cols
+
+        table = Table(data_display, colWidths=col_widths)
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f77b4')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('FONTSIZE', (0, 1), (-1, -1), 7),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
+            ('TOPPADDING', (0, 1), (-1, -1), 2),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 2),
+        ]))
+        story.append(table)
+        story.append(Spacer(1, 0.2*inch))
+
+        # Grafici: il primo segue la tabella, gli altri su pagine successive
+        for i, (img_buf, ratio) in enumerate(images):
+            if i:
+                story.append(PageBreak())
+            story.append(Paragraph("<b>Grafico</b>", styles['Heading2']))
+
+            # Ridimensiona l'immagine per adattarla bene al landscape
+            # Larghezza: quasi tutta la pagina, altezza proporzionale (max 6.5 inch)
+            img_width = 9.5 * inch
+            img_height = 4.5 * inch
+            if len(images) > 1 or ratio < 1.5:
+                img_height = min(6.5 * inch, img_width / ratio)
+                img_width = img_height * ratio
+            story.append(Image(img_buf, width=img_width, height=img_height))
+
+        # Build PDF
+        doc.build(story)
+        pdf_buf.seek(0)
+        return pdf_buf.getvalue(), None
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return None, f"Errore nell'export PDF report: {e}"
@@ -0,0 +1,143 @@
+"""
+history.py
+----------
+Registrazione asincrona (write-behind) delle operazioni nella cronologia.
+
+Le operazioni vengono messe in coda senza toccare il database; un thread
+in background le scrive a blocchi con ``database.save_history_batch``
+(una transazione per blocco). In questo modo registrare un filtro o un
+export non rallenta l'interazione nell'app.
+
+Un blocco che non si riesce a scrivere (es. database bloccato) resta in
+testa alla coda e viene ritentato con il blocco successivo; dopo
+``max_attempts`` tentativi le sue operazioni vengono scartate e contate in
+``HistoryWriter.dropped``.
+"""
+
+import atexit
+import json
+import queue
+import threading
+import time
+
+from database import save_history_batch, history_timestamp
+
+
+class HistoryWriter:
+    """Coda di operazioni scritte a blocchi da un thread in background.
+
+    Args:
+        batch_size (int, optional): Numero di operazioni che provoca una scrittura immediata. Default 200.
+        interval (float, optional): Secondi massimi di attesa prima di scrivere un blocco parziale
+            (e fra due tentativi di un blocco non scritto). Default 1.0.
+        max_attempts (int, optional): Tentativi di scrittura di un blocco prima di scartarlo. Default 5.
+    """
+
+    def __init__(self, batch_size: int = 200, interval: float = 1.0, max_attempts: int = 5):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_attempts = max_attempts
+        # Operazioni scartate dopo max_attempts tentativi falliti
+        self.dropped = 0
+        self._queue = queue.Queue()
+        # Operazioni già tolte dalla coda ma non ancora scritte (visibili a flush)
+        self._pending = []
+        # Blocchi non scritti, in ordine, con il numero di tentativi falliti
+        self._retry = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, dataset_id, columns: list, operation: str, details: dict = None):
+        """Accoda un'operazione (non bloccante).
+
+        Args:
+            dataset_id (int | None): ID del dataset coinvolto.
+            columns (list): Colonne coinvolte.
+            operation (str): Tipo di operazione (es. ``'filter'``, ``'stats'``, ``'aggregate'``, ``'export_csv'``).
+            details (dict, optional): Parametri dell'operazione, salvati come JSON.
+        """
+        now = history_timestamp()
+        payload = json.dumps(details, ensure_ascii=False, default=str) if details is not None else None
+        self._queue.put((dataset_id, ",".join(map(str, columns or [])), operation, payload, now))
+
+    def flush(self):
+        """Scrive subito tutte le operazioni in coda, compresi i blocchi da ritentare (bloccante)."""
+        with self._lock:
+            while True:
+                try:
+                    self._pending.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write_pending()
+
+    def _write_pending(self):
+        # Da chiamare con self._lock acquisito. I blocchi da ritentare precedono quello
+        # nuovo: le operazioni vengono scritte nell'ordine in cui sono state registrate
+        if self._pending:
+            self._retry.append([self._pending, 0])
+            self._pending = []
+        if not self._retry:
+            return
+        rows = [row for batch, _ in self._retry for row in batch]
+        try:
+            save_history_batch(rows)
+        except Exception as e:
+            for entry in self._retry:
+                entry[1] += 1
+            lost = sum(len(batch) for batch, attempts in self._retry if attempts >= self.max_attempts)
+            self._retry = [entry for entry in self._retry if entry[1] < self.max_attempts]
+            print(f"[HISTORY] ERRORE nella scrittura di {len(rows)} operazioni: {e}")
+            if lost:
+                self.dropped += lost
+                print(f"[HISTORY] {lost} operazioni scartate dopo {self.max_attempts} tentativi "
+                      f"({self.dropped} in totale)")
+            return
+        self._retry = []
+
+    def _run(self):
+        while True:
+            # Attende la prima operazione (al massimo interval se c'è un blocco da ritentare),
+            # poi raccoglie il blocco fino a batch_size o interval
+            with self._lock:
+                retrying = bool(self._retry)
+            try:
+                item = self._queue.get(timeout=self.interval if retrying else None)
+            except queue.Empty:
+                with self._lock:
+                    self._write_pending()
+                continue
+            with self._lock:
+                self._pending.append(item)
+            deadline = time.monotonic() + self.interval
+            while len(self._pending) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                with self._lock:
+                    self._pending.append(item)
+            with self._lock:
+                self._write_pending()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> HistoryWriter:
+    """Restituisce lo scrittore condiviso dal processo (creato al primo uso)."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = HistoryWriter()
+            atexit.register(_writer.flush)
+    return _writer
+
+
+def record_operation(dataset_id, columns: list, operation: str, details: dict = None):
+    """Accoda un'operazione sullo scrittore condiviso (vedi ``HistoryWriter.record``)."""
+    get_writer().record(dataset_id, columns, operation, details)
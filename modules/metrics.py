@@ -0,0 +1,125 @@
+"""
+metrics.py
+----------
+Strumentazione leggera delle fasi della pipeline (tempi e memoria).
+
+Un ``PerfRecorder`` raccoglie gli intervalli (span) di un singolo rerun
+dell'app o di una singola esecuzione batch. Il tempo viene sempre misurato;
+la memoria solo se ``tracemalloc`` è attivo (ad esempio durante una cattura
+avviata con ``ProfileCapture``), così il costo normale resta trascurabile.
+"""
+
+import json
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class PerfRecorder:
+    """Raccoglie gli span di tempo/memoria di un rerun.
+
+    Esempio::
+
+        perf = PerfRecorder()
+        with perf.span("filter", rows=len(df)):
+            filtered_df = apply_filters(df, cols, filters)
+    """
+
+    def __init__(self, run_id: str = None):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.spans = []
+
+    @contextmanager
+    def span(self, stage: str, **meta):
+        """Misura il blocco ``with`` e lo registra con il nome ``stage``.
+
+        Args:
+            stage (str): Nome della fase (es. ``'load'``, ``'filter'``, ``'export_excel'``).
+            **meta: Informazioni aggiuntive da salvare con lo span (es. ``rows``).
+
+        Yields:
+            dict: Lo span in corso; il blocco può aggiungere chiavi (es. ``span['rows'] = n``).
+        """
+        record = {"stage": stage, **meta}
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            mem_before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 6)
+            # Con span annidati il picco è relativo all'ultimo reset (quello più interno)
+            record["peak_mb"] = round((tracemalloc.get_traced_memory()[1] - mem_before) / 1024 ** 2, 3) if tracing else None
+            self.spans.append(record)
+
+    def total_seconds(self) -> float:
+        return round(sum(s["seconds"] for s in self.spans), 6)
+
+    def rows(self) -> list:
+        """Restituisce gli span come righe ``(run_id, stage, seconds, peak_mb, rows, timestamp)``."""
+        return [(self.run_id, s["stage"], s["seconds"], s.get("peak_mb"), s.get("rows"), self.started)
+                for s in self.spans]
+
+    def save_jsonl(self, path: str):
+        """Aggiunge gli span del rerun a un file JSON Lines (uno span per riga).
+
+        Args:
+            path (str): Percorso del file ``.jsonl``.
+        """
+        with open(path, "a", encoding="utf-8") as f:
+            for s in self.spans:
+                f.write(json.dumps({"run_id": self.run_id, "timestamp": self.started, **s}, default=str) + "\n")
+
+
+class ProfileCapture:
+    """Cattura opzionale di profilo CPU (cProfile) e allocazioni (tracemalloc).
+
+    Pensata per un singolo rerun: ``start()`` all'inizio dello script,
+    ``stop()`` alla fine (in un ``finally``, così eccezioni e ``st.stop()``
+    non lasciano il profiler attivo), poi ``report()`` per un riepilogo testuale.
+    """
+
+    def __init__(self, cpu: bool = True, memory: bool = True, top: int = 25):
+        self.cpu = cpu
+        self.memory = memory
+        self.top = top
+        self._profiler = None
+        self._snapshot = None
+        self._started_tracing = False
+
+    def start(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        if self.cpu:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def stop(self):
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._started_tracing:
+            self._snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+    def report(self) -> str:
+        """Restituisce il riepilogo testuale: funzioni più costose e righe che allocano di più."""
+        parts = []
+        if self._profiler is not None:
+            import io
+            import pstats
+            out = io.StringIO()
+            pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(self.top)
+            parts.append(out.getvalue())
+        if self._snapshot is not None:
+            parts.append("Top allocazioni (tracemalloc):")
+            for stat in self._snapshot.statistics("lineno")[:self.top]:
+                parts.append(str(stat))
+        return "\n".join(parts)
@@ -0,0 +1,139 @@
+"""
+pager.py
+--------
+Paginazione lato server dei risultati da mostrare nell'app.
+
+Invece di inviare al browser l'intero DataFrame filtrato (serializzato ad ogni
+rerun), l'app conserva il risultato in un ``ResultPager`` e mostra solo la
+finestra di righe visibile. Il risultato è un indice di righe (le posizioni
+che soddisfano i filtri) sul DataFrame di origine, che non viene copiato.
+L'ordinamento per colonna viene calcolato una volta sola per risultato (una
+permutazione delle posizioni) e riusato per tutte le pagine e per i rerun
+successivi.
+
+Per i dataset archiviati come tabella (``SqlResultPager``) il risultato resta
+nel database: il totale viene da ``count_rows`` e ogni pagina è una query
+``LIMIT``/``OFFSET`` (con ``ORDER BY`` per l'ordinamento).
+"""
+
+import numpy as np
+import pandas as pd
+
+from database import count_rows, query_dataset
+
+
+class ResultPager:
+    """Risultato paginabile: le righe del risultato più le permutazioni di ordinamento in cache.
+
+    Args:
+        df (pandas.DataFrame): DataFrame di origine (non viene copiato).
+        total_rows (int, optional): Righe del dataset di origine, per il riepilogo
+            (es. "1.200 righe su 5.000.000"). Default: quelle di ``df``.
+        rows (numpy.ndarray, optional): Posizioni crescenti delle righe del risultato in ``df``
+            (es. ``analyzer.filter_positions``). Default: tutte.
+    """
+
+    def __init__(self, df: pd.DataFrame, total_rows: int = None, rows: np.ndarray = None):
+        self.df = df
+        self.columns = df.columns.tolist()
+        self.total_rows = len(df) if total_rows is None else total_rows
+        # Posizioni delle righe nell'ordine originale e permutazioni per (colonna, ascendente)
+        self.rows = np.arange(len(df)) if rows is None else np.asarray(rows)
+        self._orders = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def frame(self) -> pd.DataFrame:
+        """Righe del risultato come DataFrame (``df`` stesso se il risultato le comprende tutte)."""
+        if len(self.rows) == len(self.df):
+            return self.df
+        return self.df.iloc[self.rows]
+
+    def page_count(self, page_size: int) -> int:
+        """Numero di pagine (almeno 1, anche con un risultato vuoto)."""
+        return max(1, -(-len(self.rows) // page_size))
+
+    def order(self, sort_by: str = None, ascending: bool = True) -> np.ndarray:
+        """Posizioni delle righe nell'ordine richiesto (calcolate una volta, poi dalla cache).
+
+        L'ordinamento è stabile e i valori mancanti vanno in fondo; le colonne con
+        tipi non confrontabili (es. numeri e testo) vengono ordinate come testo.
+
+        Args:
+            sort_by (str, optional): Colonna di ordinamento (``None``: ordine originale).
+            ascending (bool, optional): Ordine crescente. Default True.
+
+        Returns:
+            numpy.ndarray: Posizioni in ``df`` delle righe del risultato, nell'ordine richiesto.
+        """
+        if sort_by is None:
+            return self.rows
+        key = (sort_by, ascending)
+        if key not in self._orders:
+            values = self.df[sort_by].iloc[self.rows].reset_index(drop=True)
+            try:
+                ordered = values.sort_values(ascending=ascending, kind="stable", na_position="last")
+            except TypeError:
+                ordered = values.astype(str).where(values.notna()).sort_values(
+                    ascending=ascending, kind="stable", na_position="last")
+            self._orders[key] = self.rows[ordered.index.to_numpy()]
+        return self._orders[key]
+
+    def page(self, number: int, page_size: int, sort_by: str = None, ascending: bool = True) -> pd.DataFrame:
+        """Restituisce solo le righe della pagina ``number`` (a partire da 1).
+
+        Args:
+            number (int): Numero di pagina; valori fuori intervallo vengono limitati.
+            page_size (int): Righe per pagina.
+            sort_by (str, optional): Colonna di ordinamento.
+            ascending (bool, optional): Ordine crescente. Default True.
+
+        Returns:
+            pandas.DataFrame: Le righe della pagina, con l'indice originale.
+        """
+        number = min(max(1, number), self.page_count(page_size))
+        start = (number - 1) * page_size
+        return self.df.iloc[self.order(sort_by, ascending)[start:start + page_size]]
+
+
+class SqlResultPager:
+    """Risultato paginabile di un dataset ``table``, letto dal database una pagina alla volta.
+
+    Stessa interfaccia di ``ResultPager``: in memoria c'è solo la pagina visibile.
+
+    Args:
+        dataset_id (int): ID del dataset.
+        version (int | None): Versione (``None``: la più recente).
+        columns (list): Colonne del risultato.
+        filters (list): Filtri da applicare.
+        total_rows (int, optional): Righe del dataset di origine. Default: quelle del risultato.
+    """
+
+    def __init__(self, dataset_id: int, version: int, columns: list, filters: list, total_rows: int = None):
+        self.dataset_id = dataset_id
+        self.version = version
+        self.columns = list(columns)
+        self.filters = filters
+        self._count = count_rows(dataset_id, version, filters)
+        self.total_rows = self._count if total_rows is None else total_rows
+
+    def __len__(self):
+        return self._count
+
+    def page_count(self, page_size: int) -> int:
+        """Numero di pagine (almeno 1, anche con un risultato vuoto)."""
+        return max(1, -(-self._count // page_size))
+
+    def page(self, number: int, page_size: int, sort_by: str = None, ascending: bool = True) -> pd.DataFrame:
+        """Restituisce solo le righe della pagina ``number`` (a partire da 1), vedi ``ResultPager.page``.
+
+        Returns:
+            pandas.DataFrame: Le righe della pagina, con l'indice numerato dalla prima riga della pagina.
+        """
+        number = min(max(1, number), self.page_count(page_size))
+        start = (number - 1) * page_size
+        page_df = query_dataset(self.dataset_id, self.version, self.columns, self.filters,
+                                limit=page_size, offset=start, order_by=sort_by, ascending=ascending)
+        page_df.index = pd.RangeIndex(start, start + len(page_df))
+        return page_df
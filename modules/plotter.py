@@ -8,13 +8,20 @@ import matplotlib.pyplot as plt
 from matplotlib.ticker import ScalarFormatter
 import pandas as pd
 
-def generate_plot(df: pd.DataFrame, columns: list, chart_type: str, top_n: int = 20, max_xticks: int = 20, force_horizontal: bool = False):
+from modules.analyzer import choose_frequency, resample_aggregate
+
+def generate_plot(df: pd.DataFrame, columns: list, chart_type: str, top_n: int = 20, max_xticks: int = 20, force_horizontal: bool = False,
+                  max_points: int = 2000):
     """Genera e ritorna una figura Matplotlib basata sui dati forniti.
 
     Questa funzione è flessibile: per colonne non numeriche crea grafici di
     conteggio (bar, barh, stacked), per colonne numeriche crea barre/linee/istogrammi
     e supporta anche la visualizzazione a torta quando sensato.
 
+    Per il grafico a linee, se tra le colonne c'è una colonna di date viene usata
+    come asse X; oltre ``max_points`` righe la serie viene ricampionata (media per
+    minuto/ora/giorno/mese) così da disegnare al massimo ``max_points`` punti.
+
     Args:
         df (pandas.DataFrame): DataFrame filtrato con i dati da visualizzare.
         columns (list): Lista di colonne da includere nel grafico.
@@ -22,6 +29,7 @@ def generate_plot(df: pd.DataFrame, columns: list, chart_type: str, top_n: int =
         top_n (int, optional): Numero massimo di categorie da mostrare per i conteggi. Default 20.
         max_xticks (int, optional): Numero massimo di tick sull'asse X prima di ridurli. Default 20.
         force_horizontal (bool, optional): Forza l'uso di barre orizzontali quando True. Default False.
+        max_points (int, optional): Punti massimi di una serie temporale prima del ricampionamento. Default 2000.
 
     Returns:
         matplotlib.figure.Figure | None: Oggetto figura se il grafico è stato generato,
@@ -177,13 +185,26 @@ def generate_plot(df: pd.DataFrame, columns: list, chart_type: str, top_n: int =
 
     fig, ax = plt.subplots(figsize=(10, 5))
     plt.style.use("ggplot")
+    x_label = "Index"
 
     if chart_type == "Barre":
         df[numeric_cols].plot(kind="bar", ax=ax)
         _reduce_xticks(ax, max_ticks=30)
 
     elif chart_type == "Linee":
-        df[numeric_cols].plot(kind="line", ax=ax)
+        time_cols = [c for c in columns if pd.api.types.is_datetime64_any_dtype(df[c])]
+        if time_cols:
+            time_col = time_cols[0]
+            series = df[[time_col] + numeric_cols].dropna(subset=[time_col])
+            if len(series) > max_points:
+                freq = choose_frequency(series[time_col], max_points)
+                series = resample_aggregate(series, time_col, numeric_cols, freq, "mean")
+            else:
+                series = series.sort_values(time_col)
+            series.plot(x=time_col, y=numeric_cols, kind="line", ax=ax)
+            x_label = time_col
+        else:
+            df[numeric_cols].plot(kind="line", ax=ax)
 
     elif chart_type == "Istogramma":
         df[numeric_cols].plot(kind="hist", bins=15, ax=ax)
@@ -192,7 +213,67 @@ def generate_plot(df: pd.DataFrame, columns: list, chart_type: str, top_n: int =
     _format_y(ax)
 
     ax.set_title(f"Grafico: {chart_type}")
-    ax.set_xlabel("Index")
+    ax.set_xlabel(x_label)
     ax.set_ylabel("Valori")
 
-    return fig
\ No newline at end of file
+    return fig
+
+def plot_correlation(corr: pd.DataFrame):
+    """Mappa di calore di una matrice di correlazione (es. ``profile_dataset()['correlation']``).
+
+    Args:
+        corr (pandas.DataFrame): Matrice quadrata con valori in [-1, 1].
+
+    Returns:
+        matplotlib.figure.Figure | None: Figura, oppure ``None`` con meno di due colonne.
+    """
+    if corr is None or len(corr) < 2:
+        return None
+    size = min(14, max(5, 0.5 * len(corr) + 3))
+    fig, ax = plt.subplots(figsize=(size + 1, size))
+    image = ax.imshow(corr.to_numpy(dtype=float), cmap="coolwarm", vmin=-1, vmax=1)
+    labels = [str(c) for c in corr.columns]
+    ax.set_xticks(range(len(labels)), labels, rotation=90, fontsize=8)
+    ax.set_yticks(range(len(labels)), labels, fontsize=8)
+    # Valori nelle celle solo se restano leggibili
+    if len(corr) <= 15:
+        for i in range(len(corr)):
+            for j in range(len(corr)):
+                value = corr.iat[i, j]
+                if pd.notna(value):
+                    ax.text(j, i, f"{value:.2f}", ha="center", va="center", fontsize=7)
+    fig.colorbar(image, ax=ax, shrink=0.8)
+    ax.set_title("Correlazioni (Pearson)")
+    plt.tight_layout()
+    return fig
+
+
+def plot_histograms(histograms: dict, max_plots: int = 12, ncols: int = 3):
+    """Griglia di istogrammi già calcolati (es. ``profile_dataset()['histograms']``).
+
+    Gli istogrammi arrivano come coppie ``(conteggi, estremi)`` di ``numpy.histogram``,
+    quindi il grafico non richiede un'altra passata sui dati.
+
+    Args:
+        histograms (dict): Colonna → ``(conteggi, estremi)``.
+        max_plots (int, optional): Numero massimo di colonne disegnate. Default 12.
+        ncols (int, optional): Grafici per riga. Default 3.
+
+    Returns:
+        matplotlib.figure.Figure | None: Figura, oppure ``None`` se non ci sono istogrammi.
+    """
+    items = list(histograms.items())[:max_plots]
+    if not items:
+        return None
+    ncols = min(ncols, len(items))
+    nrows = -(-len(items) // ncols)
+    fig, axes = plt.subplots(nrows=nrows, ncols=ncols, figsize=(4 * ncols, 3 * nrows), squeeze=False)
+    for ax, (col, (counts, edges)) in zip(axes.flat, items):
+        ax.stairs(counts, edges, fill=True, color="C0", alpha=0.8)
+        ax.set_title(str(col), fontsize=9)
+        ax.tick_params(labelsize=7)
+    for ax in axes.flat[len(items):]:
+        ax.set_visible(False)
+    fig.suptitle("Distribuzioni")
+    plt.tight_layout()
+    return fig
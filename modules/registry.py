@@ -0,0 +1,269 @@
+"""
+registry.py
+-----------
+Registro dei dataset in memoria condiviso da tutte le sessioni del processo.
+
+Senza registro ogni sessione Streamlit (e ogni richiesta del servizio HTTP)
+che apre lo stesso dataset salvato chiama ``load_dataset`` e tiene una
+propria copia: dieci utenti sullo stesso dataset occupano dieci volte la
+memoria. ``DatasetRegistry`` carica ogni versione una sola volta e consegna
+a tutti la stessa copia, resa di sola lettura: le colonne numpy del
+DataFrame non sono scrivibili, quindi una modifica sul posto solleva
+``ValueError`` invece di alterare i dati degli altri; ogni utente riceve
+una copia superficiale (``copy(deep=False)``) su cui può aggiungere o
+sostituire colonne senza toccare l'originale.
+
+La chiave è ``(id, versione)``: le versioni sono immutabili (i segmenti
+vengono solo aggiunti) e gli ID non vengono riutilizzati.
+
+Chi usa un dataset ne tiene un riferimento (``DatasetLease``) e lo rilascia
+quando ha finito; il riferimento viene rilasciato anche quando l'oggetto
+viene eliminato (es. alla chiusura della sessione Streamlit). I dataset
+senza riferimenti restano in memoria per gli accessi successivi finché il
+totale supera il budget (``CSV_ANALYZER_REGISTRY_MB``, default 2048 MB):
+allora vengono rimossi a partire da quello inutilizzato da più tempo.
+I dataset in uso non vengono mai rimossi, anche oltre il budget.
+"""
+
+import os
+import threading
+import time
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from database import load_dataset, get_dataset_info
+
+# Memoria massima (MB) dei dataset tenuti in memoria senza riferimenti attivi
+REGISTRY_BUDGET_MB = int(os.environ.get("CSV_ANALYZER_REGISTRY_MB", "2048"))
+
+
+def _freeze(df):
+    # Nuovo DataFrame sugli stessi dati con le colonne numpy di sola lettura (viste, nessuna
+    # copia): le scritture sul posto sollevano ValueError. Le colonne con dtype di estensione
+    # (categorie, date con fuso orario, stringhe nullable) restano come sono.
+    if df.shape[1] == 0:
+        return df
+    columns = {}
+    for i in range(df.shape[1]):
+        values = df.iloc[:, i]
+        if isinstance(values.dtype, np.dtype):
+            array = values.to_numpy(copy=False).view()
+            array.flags.writeable = False
+            values = pd.Series(array, index=df.index, copy=False)
+        columns[i] = values
+    frozen = pd.DataFrame(columns, copy=False)
+    frozen.columns = df.columns
+    frozen.attrs = df.attrs
+    return frozen
+
+
+def _frame_bytes(df) -> int:
+    # Include le stringhe delle colonne object (per i file Arrow è un limite superiore:
+    # le colonne in memory-map sono pagine del file, non memoria del processo)
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+class DatasetLease:
+    """Riferimento a un dataset del registro.
+
+    ``df`` resta valido anche dopo il rilascio, ma il registro può eliminare
+    la propria copia e ricaricarla al prossimo accesso. Utilizzabile come
+    context manager (rilascio all'uscita dal blocco).
+    """
+
+    def __init__(self, registry, key: tuple, df):
+        self.key = key
+        self.df = df
+        self._finalizer = weakref.finalize(self, registry._release, key)
+        self._finalizer.atexit = False
+
+    @property
+    def released(self) -> bool:
+        return not self._finalizer.alive
+
+    def release(self):
+        """Rilascia il riferimento (le chiamate successive non hanno effetto)."""
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class _Entry:
+    __slots__ = ("df", "size", "refs", "last_access")
+
+    def __init__(self, df, size: int):
+        self.df = df
+        self.size = size
+        self.refs = 0
+        self.last_access = time.monotonic()
+
+
+class DatasetRegistry:
+    """Dataset caricati una sola volta e condivisi, con conteggio dei riferimenti.
+
+    Args:
+        budget_mb (int, optional): Memoria massima dei dataset senza riferimenti
+            (default ``REGISTRY_BUDGET_MB``; 0: rimossi appena rilasciati).
+        loader (callable, optional): Funzione ``(dataset_id, version=...) → DataFrame | None``
+            usata per caricare i dataset. Default ``database.load_dataset``.
+    """
+
+    def __init__(self, budget_mb: int = None, loader=None):
+        self.budget_bytes = (REGISTRY_BUDGET_MB if budget_mb is None else budget_mb) * 1024 ** 2
+        self._loader = loader or load_dataset
+        self._entries = {}
+        # Caricamenti in corso: chi chiede lo stesso dataset attende invece di caricarlo di nuovo
+        self._loading = {}
+        # Rientrante: un riferimento eliminato dal garbage collector può rilasciarsi
+        # mentre lo stesso thread tiene già il lock
+        self._lock = threading.RLock()
+        self.hits = self.misses = self.evictions = 0
+
+    def acquire(self, dataset_id: int, version: int = None):
+        """Restituisce un riferimento al dataset, caricandolo se non è già in memoria.
+
+        Args:
+            dataset_id (int): ID del dataset.
+            version (int, optional): Versione (default: la più recente).
+
+        Returns:
+            DatasetLease | None: Il riferimento (``lease.df`` è il DataFrame di sola
+                lettura), oppure ``None`` se il dataset non esiste.
+        """
+        if version is None:
+            info = get_dataset_info(dataset_id)
+            if info is None:
+                return None
+            version = info["version"]
+        key = (dataset_id, version)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    return self._lease(key, entry)
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    break
+            loading.wait()
+
+        try:
+            df = self._loader(dataset_id, version=version)
+            if df is None:
+                return None
+            return self._insert(key, df)
+        finally:
+            with self._lock:
+                self._loading.pop(key).set()
+
+    def put(self, dataset_id: int, version: int, df):
+        """Registra un dataset già in memoria (es. appena salvato) senza rileggerlo dal DB.
+
+        Il registro condivide i dati del DataFrame senza copiarli: il chiamante non deve
+        più modificarlo. Se la versione è già registrata viene restituita quella.
+
+        Returns:
+            DatasetLease: Riferimento al dataset registrato.
+        """
+        return self._insert((dataset_id, version), df)
+
+    def _insert(self, key: tuple, df):
+        # Dimensione prima del blocco: memory_usage(deep=True) non accetta array object di sola lettura
+        size = _frame_bytes(df)
+        df = _freeze(df)
+        with self._lock:
+            # Controllo e inserimento sotto lo stesso lock: se un'altra richiesta ha già
+            # registrato la versione si usa la sua copia (e non conta come caricamento)
+            entry = self._entries.get(key)
+            inserted = entry is None
+            if inserted:
+                entry = self._entries[key] = _Entry(df, size)
+                self.misses += 1
+            else:
+                self.hits += 1
+            lease = self._lease(key, entry)
+            self._evict_idle()
+        if inserted:
+            print(f"[REGISTRY] Dataset id={key[0]} v{key[1]} in memoria ({size / 1024 ** 2:.1f} MB)")
+        return lease
+
+    def _lease(self, key: tuple, entry: _Entry) -> DatasetLease:
+        entry.refs += 1
+        entry.last_access = time.monotonic()
+        return DatasetLease(self, key, entry.df.copy(deep=False))
+
+    def _release(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.refs -= 1
+            entry.last_access = time.monotonic()
+            if entry.refs == 0:
+                self._evict_idle()
+
+    def _evict_idle(self):
+        # Rimuove i dataset senza riferimenti, dal meno recente, finché il totale rientra nel budget
+        total = sum(e.size for e in self._entries.values())
+        idle = sorted((e.last_access, k) for k, e in self._entries.items() if e.refs == 0)
+        for _, key in idle:
+            if total <= self.budget_bytes:
+                break
+            entry = self._entries.pop(key)
+            total -= entry.size
+            self.evictions += 1
+            print(f"[REGISTRY] Rimosso dataset id={key[0]} v{key[1]} ({entry.size / 1024 ** 2:.1f} MB)")
+
+    def evict(self, dataset_id: int = None):
+        """Rimuove i dataset senza riferimenti (tutti, o le versioni di ``dataset_id``).
+
+        Returns:
+            int: Numero di versioni rimosse.
+        """
+        with self._lock:
+            keys = [k for k, e in self._entries.items()
+                    if e.refs == 0 and (dataset_id is None or k[0] == dataset_id)]
+            for key in keys:
+                del self._entries[key]
+            self.evictions += len(keys)
+        return len(keys)
+
+    @property
+    def total_bytes(self) -> int:
+        """Memoria stimata dei dataset registrati (in uso e non)."""
+        with self._lock:
+            return sum(e.size for e in self._entries.values())
+
+    def stats(self) -> list:
+        """Stato del registro, una riga per versione in memoria.
+
+        Returns:
+            list[dict]: ``dataset``, ``versione``, ``MB``, ``riferimenti`` e ``inattivo (s)``
+                (secondi dall'ultimo accesso o rilascio), dal più recente.
+        """
+        now = time.monotonic()
+        with self._lock:
+            rows = [{"dataset": k[0], "versione": k[1], "MB": round(e.size / 1024 ** 2, 1),
+                     "riferimenti": e.refs, "inattivo (s)": round(now - e.last_access, 1)}
+                    for k, e in self._entries.items()]
+        return sorted(rows, key=lambda r: r["inattivo (s)"])
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> DatasetRegistry:
+    """Restituisce il registro condiviso dal processo (creato al primo uso)."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = DatasetRegistry()
+    return _registry
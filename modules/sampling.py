@@ -0,0 +1,294 @@
+"""
+sampling.py
+-----------
+Esplorazione interattiva su un campione dei dataset molto grandi.
+
+Il campione viene estratto una volta sola, con un reservoir sampling che legge
+i dati a blocchi (partizione per partizione, o riga dopo riga di un CSV), e
+salvato con il dataset in `dataset_cache`. Ad ogni riga viene associata una
+chiave casuale e il reservoir conserva le righe con le chiavi più piccole:
+il campione così ottenuto è uniforme e può essere aggiornato con le sole righe
+aggiunte da una nuova versione, senza rileggere quelle precedenti.
+
+Il campione può essere stratificato per una colonna categorica: ogni strato
+riceve le righe del campione uniforme che gli appartengono (in media un numero
+proporzionale alla sua dimensione) e comunque almeno ``MIN_PER_STRATUM``, così
+anche i gruppi piccoli sono rappresentati e il campione non supera
+``size + MAX_STRATA * MIN_PER_STRATUM`` righe. Le stime su un campione
+stratificato usano i pesi ``N_h / n_h`` di ogni strato.
+
+Filtri, grafici e aggregazioni girano sul campione; le statistiche vengono
+stimate con un intervallo di confidenza. Il calcolo esatto sull'intero
+dataset può essere eseguito in background con ``get_executor``.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from modules.analyzer import time_buckets
+
+# Righe oltre le quali l'app propone l'esplorazione su campione, e righe del campione
+SAMPLE_THRESHOLD = int(os.environ.get("CSV_ANALYZER_SAMPLE_THRESHOLD", 1_000_000))
+SAMPLE_SIZE = int(os.environ.get("CSV_ANALYZER_SAMPLE_SIZE", 100_000))
+
+# Righe minime per strato (se disponibili) e numero massimo di strati
+MIN_PER_STRATUM = 30
+MAX_STRATA = 100
+
+
+class Reservoir:
+    """Reservoir sampling a blocchi, uniforme o stratificato.
+
+    Ogni riga riceve una chiave casuale uniforme; il reservoir conserva le ``size``
+    righe con le chiavi più piccole e, se stratificato, anche le ``MIN_PER_STRATUM``
+    con le chiavi più piccole di ogni strato. In ogni strato le righe conservate
+    sono quindi quelle con le chiavi più piccole: un campione casuale semplice
+    dello strato. Entrambe le soglie sono fisse, per cui il risultato non dipende
+    da come i dati sono divisi in blocchi. Tiene inoltre il numero totale di righe
+    viste e i min/max delle colonne numeriche e di date sull'intero dataset (per
+    gli slider dei filtri).
+
+    Args:
+        size (int): Righe del campione.
+        strata (str, optional): Colonna categorica per il campione stratificato.
+        seed (int, optional): Seed del generatore casuale.
+    """
+
+    def __init__(self, size: int, strata: str = None, seed: int = None):
+        self.size = size
+        self.strata = strata
+        self.population = 0
+        self.stratum_sizes = pd.Series(dtype="int64")
+        self.bounds = {}
+        self._rng = np.random.default_rng(seed)
+        self._rows = None
+        self._keys = np.empty(0)
+
+    def add(self, chunk: pd.DataFrame) -> "Reservoir":
+        """Aggiunge un blocco di righe (in ordine: le posizioni proseguono quelle dei blocchi precedenti).
+
+        Args:
+            chunk (pandas.DataFrame): Righe da considerare.
+
+        Returns:
+            Reservoir: Il reservoir stesso.
+
+        Raises:
+            ValueError: Se la colonna di stratificazione ha più di ``MAX_STRATA`` valori.
+        """
+        if chunk.empty:
+            return self
+        chunk = chunk.set_axis(np.arange(self.population, self.population + len(chunk)))
+        self.population += len(chunk)
+        self._update_bounds(chunk)
+
+        rows = chunk if self._rows is None else pd.concat([self._rows, chunk])
+        keys = np.concatenate([self._keys, self._rng.random(len(chunk))])
+        # Le `size` chiavi più piccole in assoluto
+        keep = np.zeros(len(keys), dtype=bool)
+        keep[np.argpartition(keys, self.size)[:self.size] if len(keys) > self.size else slice(None)] = True
+        if self.strata is not None:
+            self.stratum_sizes = self.stratum_sizes.add(
+                chunk[self.strata].value_counts(dropna=False), fill_value=0).astype("int64")
+            if len(self.stratum_sizes) > MAX_STRATA:
+                raise ValueError(f"La colonna '{self.strata}' ha più di {MAX_STRATA} valori: "
+                                 "non è adatta a un campione stratificato")
+            # ...più le MIN_PER_STRATUM chiavi più piccole di ogni strato
+            ranks = pd.Series(keys).groupby(rows[self.strata].to_numpy(), dropna=False).rank(method="first")
+            keep |= ranks.to_numpy() <= MIN_PER_STRATUM
+        if not keep.all():
+            keep = np.flatnonzero(keep)
+            rows, keys = rows.iloc[keep], keys[keep]
+        self._rows, self._keys = rows, keys
+        return self
+
+    def _update_bounds(self, chunk):
+        for col in chunk.select_dtypes(include=["number", "datetime", "datetimetz"]).columns:
+            lo, hi = chunk[col].min(), chunk[col].max()
+            if pd.isna(lo):
+                continue
+            if col in self.bounds:
+                lo, hi = min(lo, self.bounds[col][0]), max(hi, self.bounds[col][1])
+            self.bounds[col] = (lo, hi)
+
+    def sample(self) -> "Sample":
+        """Restituisce il campione estratto finora.
+
+        Per il campione stratificato ogni strato ha in media ``size * N_h / N`` righe,
+        almeno ``MIN_PER_STRATUM`` (o tutte quelle dello strato, se sono meno); ogni
+        riga rappresenta ``N_h / n_h`` righe del dataset.
+        """
+        if self._rows is None:
+            raise ValueError("Il reservoir è vuoto")
+        if self.strata is None:
+            weights = np.full(len(self._rows), self.population / len(self._rows))
+            return Sample(self._rows, weights, None, self.population, self.bounds)
+
+        labels = self._rows[self.strata]
+        allocation = labels.value_counts(dropna=False)
+        weights = _by_label(self.stratum_sizes / allocation, labels)
+        return Sample(self._rows, weights, labels, self.population, self.bounds)
+
+
+def _by_label(values: pd.Series, labels: pd.Series) -> np.ndarray:
+    # values indicizzata per strato (NaN incluso) → un valore per riga di `labels`
+    return values.reindex(pd.Index(labels)).to_numpy()
+
+
+class Sample:
+    """Campione estratto da un ``Reservoir`` con i pesi per le stime.
+
+    Args:
+        df (pandas.DataFrame): Righe del campione (indice: posizione nel dataset).
+        weights (numpy.ndarray): Righe del dataset rappresentate da ogni riga del campione.
+        strata (pandas.Series | None): Strato di ogni riga (``None`` se uniforme).
+        population (int): Righe del dataset.
+        bounds (dict): Min/max di ogni colonna numerica e di date sull'intero dataset.
+    """
+
+    def __init__(self, df, weights, strata, population, bounds):
+        self.df = df
+        self.weights = pd.Series(weights, index=df.index)
+        self.strata = strata
+        self.population = population
+        self.bounds = bounds
+
+    def __len__(self):
+        return len(self.df)
+
+    def _groups(self):
+        return np.zeros(len(self.df)) if self.strata is None else self.strata.to_numpy()
+
+    def _total(self, y: np.ndarray):
+        """Stima del totale di ``y`` (una voce per riga del campione) e sua varianza.
+
+        Varianza dello stimatore stratificato con correzione per popolazione finita:
+        ``sum_h N_h^2 (1 - n_h/N_h) s_h^2 / n_h`` (un solo strato per il campione uniforme).
+        """
+        w = self.weights.to_numpy()
+        frame = pd.DataFrame({"y": y, "w": w})
+        groups = frame.groupby(self._groups(), dropna=False)
+        n_h = groups["y"].count()
+        big_n = groups["w"].sum()
+        s2 = groups["y"].var(ddof=1).fillna(0.0)
+        variance = (big_n ** 2 * (1 - n_h / big_n) * s2 / n_h).sum()
+        return float((y * w).sum()), float(max(variance, 0.0))
+
+    def statistics(self, filtered: pd.DataFrame, columns: list, operation: str, confidence: float = 0.95) -> dict:
+        """Stima le statistiche di ``compute_statistics`` sull'intero dataset filtrato.
+
+        Le righe escluse dai filtri contano come zero nelle stime di totale
+        (stima per dominio): l'intervallo tiene conto anche dell'incertezza sul
+        numero di righe che soddisfano i filtri. Massimo e minimo del campione
+        sono solo limiti (inferiore e superiore) di quelli veri: nessun intervallo.
+
+        Args:
+            filtered (pandas.DataFrame): Righe del campione che soddisfano i filtri.
+            columns (list): Colonne su cui calcolare le statistiche.
+            operation (str): ``'Media'``, ``'Somma'``, ``'Conteggio'``, ``'Massimo'`` o ``'Minimo'``.
+            confidence (float, optional): Livello di confidenza. Default 0.95.
+
+        Returns:
+            dict: Mappa colonna → ``{"Stima": ..., "IC min": ..., "IC max": ...}``.
+        """
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        in_filter = self.df.index.isin(filtered.index)
+        results = {}
+        for col in columns:
+            numeric = pd.api.types.is_numeric_dtype(self.df[col])
+            if operation != "Conteggio" and not numeric:
+                continue
+            present = in_filter & self.df[col].notna().to_numpy()
+            if operation in ("Massimo", "Minimo"):
+                value = filtered[col].max() if operation == "Massimo" else filtered[col].min()
+                results[col] = {"Stima": value, "IC min": None, "IC max": None}
+                continue
+            count, count_var = self._total(present.astype(float))
+            if operation == "Conteggio":
+                estimate, variance = count, count_var
+            else:
+                values = np.where(present, self.df[col].to_numpy(dtype=float, na_value=0.0), 0.0)
+                total, total_var = self._total(values)
+                if operation == "Somma":
+                    estimate, variance = total, total_var
+                elif count == 0:
+                    estimate, variance = np.nan, np.nan
+                else:
+                    # Media come rapporto totale/conteggio (linearizzazione)
+                    estimate = total / count
+                    variance = self._total(np.where(present, values - estimate, 0.0))[1] / count ** 2
+            margin = z * np.sqrt(variance)
+            results[col] = {"Stima": float(estimate), "IC min": float(estimate - margin),
+                            "IC max": float(estimate + margin)}
+        return results
+
+    def aggregate(self, filtered: pd.DataFrame, group_col: str, value_cols: list, operation: str,
+                  freq: str = None) -> pd.DataFrame:
+        """Stima ``aggregate`` (o ``resample_aggregate`` con ``freq``) sull'intero dataset filtrato.
+
+        Somme e conteggi vengono pesati (righe del dataset rappresentate da ogni riga
+        del campione); media, massimo e minimo sono quelli del campione (la media pesata).
+
+        Args:
+            filtered (pandas.DataFrame): Righe del campione che soddisfano i filtri.
+            group_col (str): Colonna di raggruppamento (la colonna di date con ``freq``).
+            value_cols (list): Colonne numeriche da aggregare.
+            operation (str): Una tra ``'sum'``, ``'mean'``, ``'count'``, ``'max'``, ``'min'``.
+            freq (str, optional): Frequenza per raggruppare per intervallo di tempo.
+
+        Returns:
+            pandas.DataFrame: Stesso formato di ``aggregate`` (o ``resample_aggregate``).
+        """
+        keys = time_buckets(filtered[group_col], freq) if freq else filtered[group_col]
+        values = filtered[value_cols]
+        if operation in ("max", "min"):
+            result = values.groupby(keys).agg(operation)
+        else:
+            w = self.weights.loc[filtered.index]
+            counts = values.notna().mul(w, axis=0).groupby(keys).sum()
+            if operation == "count":
+                result = counts.round().astype("int64")
+            else:
+                sums = values.mul(w, axis=0).groupby(keys).sum()
+                result = sums if operation == "sum" else sums / counts
+        result = result.rename_axis(group_col).reset_index()
+        if freq:
+            return result.sort_values(group_col, ignore_index=True)
+        return result.sort_values(by=value_cols[0], ascending=False)
+
+
+def draw_sample(chunks, size: int = SAMPLE_SIZE, strata: str = None, seed: int = None) -> Reservoir:
+    """Estrae il campione leggendo i dati un blocco alla volta.
+
+    Args:
+        chunks (iterable): Blocchi (DataFrame) nell'ordine del dataset, es. le
+            partizioni o ``pandas.read_csv(..., chunksize=...)``.
+        size (int, optional): Righe del campione. Default ``SAMPLE_SIZE``.
+        strata (str, optional): Colonna per il campione stratificato.
+        seed (int, optional): Seed del generatore casuale.
+
+    Returns:
+        Reservoir: Reservoir con tutti i blocchi (vedi ``Reservoir.sample``).
+    """
+    reservoir = Reservoir(size, strata, seed)
+    for chunk in chunks:
+        reservoir.add(chunk)
+    return reservoir
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Esecutore condiviso dal processo per i calcoli esatti in background (creato al primo uso)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="exact")
+    return _executor
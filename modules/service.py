@@ -0,0 +1,329 @@
+"""
+service.py
+----------
+Servizio HTTP locale (tornado) per usare l'analyzer senza browser.
+
+Gli handler sono asincroni: il lavoro CPU (parsing, filtri, statistiche,
+grafici, export) viene eseguito in un pool di thread, così il loop degli
+eventi resta libero di servire più client in parallelo. I dataset caricati
+sono condivisi fra le richieste tramite il registro del processo
+(``modules.registry``): ogni richiesta ne tiene un riferimento fino alla
+risposta, poi il dataset resta in memoria entro il budget del registro.
+
+Endpoint (corpo e risposte JSON salvo dove indicato):
+
+- ``GET  /datasets``                  elenco dei dataset salvati
+- ``POST /datasets?name=file.csv``    upload di un CSV (corpo grezzo o multipart ``file``)
+- ``GET  /datasets/<id>``             schema e prime righe (``?limit=``)
+- ``POST /datasets/<id>/filter``      ``{"filters": [...], "columns": [...], "offset": 0, "limit": 100}``
+- ``POST /datasets/<id>/statistics``  ``{"filters": [...], "columns": [...], "operation": "Media"}``
+- ``POST /datasets/<id>/aggregate``   ``{"filters": [...], "group_by": "c", "values": [...], "op": "sum"}``
+- ``POST /datasets/<id>/chart``       ``{"filters": [...], "columns": [...], "chart_type": "Barre", "format": "png"}`` (binario)
+- ``POST /datasets/<id>/export``      ``{"filters": [...], "columns": [...], "format": "csv"}`` (binario)
+
+Le richieste non valide (JSON malformato, filtri con valori della forma sbagliata,
+operazioni o colonne inesistenti) ricevono 400 con ``{"error": "..."}``.
+"""
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import matplotlib
+matplotlib.use("Agg")  # nessun display nel servizio
+import matplotlib.pyplot as plt
+import tornado.web
+from tornado.ioloop import IOLoop
+
+from modules.data_loader import load_csv
+from modules.analyzer import (apply_filters, compute_statistics, aggregate, parse_filters, STATISTIC_OPERATIONS,
+                              AGGREGATE_OPERATIONS)
+from modules.plotter import generate_plot
+from modules.exporter import export_to_csv, export_to_excel, export_to_png, export_to_pdf_chart, export_pdf_report
+from modules.registry import DatasetRegistry, get_registry
+from database import init_db, save_dataset, list_datasets
+
+
+# pyplot mantiene uno stato globale: i grafici vanno generati uno alla volta
+_PLOT_LOCK = threading.Lock()
+
+_MIME = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "png": "image/png",
+    "pdf": "application/pdf",
+    "report": "application/pdf",
+}
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    """Handler base: accesso a registro/pool condivisi e risposte JSON."""
+
+    def initialize(self, registry: DatasetRegistry, executor: ThreadPoolExecutor):
+        self.registry = registry
+        self.executor = executor
+        self.leases = []
+
+    def on_finish(self):
+        # I dataset usati dalla richiesta tornano disponibili per l'eliminazione dal registro
+        for lease in self.leases:
+            lease.release()
+
+    async def run(self, fn, *args):
+        """Esegue ``fn(*args)`` nel pool di worker senza bloccare il loop."""
+        return await IOLoop.current().run_in_executor(self.executor, fn, *args)
+
+    def json_body(self) -> dict:
+        if not self.request.body:
+            return {}
+        try:
+            body = json.loads(self.request.body)
+        except ValueError:
+            raise tornado.web.HTTPError(400, "Corpo JSON non valido")
+        if not isinstance(body, dict):
+            raise tornado.web.HTTPError(400, "Il corpo JSON deve essere un oggetto")
+        return body
+
+    def write_json(self, obj, status: int = 200):
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.finish(json.dumps(obj, ensure_ascii=False, default=_json_default))
+
+    def write_error(self, status_code, **kwargs):
+        # Il messaggio dell'HTTPError (log_message) viene restituito al client in JSON
+        exc = kwargs.get("exc_info", (None, None, None))[1]
+        message = getattr(exc, "log_message", None) or self._reason
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.finish(json.dumps({"error": message}, ensure_ascii=False))
+
+    async def dataset(self, dataset_id: str):
+        lease = await self.run(self.registry.acquire, int(dataset_id))
+        if lease is None:
+            raise tornado.web.HTTPError(404, f"Dataset {dataset_id} non trovato")
+        self.leases.append(lease)
+        return lease.df
+
+    async def filtered(self, dataset_id: str, body: dict):
+        """Carica il dataset e applica i filtri della richiesta."""
+        df = await self.dataset(dataset_id)
+        try:
+            filters = parse_filters(body.get("filters", []))
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, str(e))
+        columns = _name_list(body.get("columns"), "columns") or df.columns.tolist()
+        missing = [c for c in columns + [f[0] for f in filters] if c not in df.columns]
+        if missing:
+            raise tornado.web.HTTPError(400, f"Colonne inesistenti: {missing}")
+        try:
+            return await self.run(apply_filters, df, columns, filters), columns
+        except TypeError as e:
+            # Es. un intervallo di testo su una colonna numerica
+            raise tornado.web.HTTPError(400, f"Filtro non applicabile ai tipi delle colonne: {e}")
+
+    def send_file(self, data: bytes, fmt: str, filename: str):
+        self.set_header("Content-Type", _MIME[fmt])
+        self.set_header("Content-Disposition", f'attachment; filename="{filename}"')
+        self.finish(data)
+
+
+def _int_param(value, name: str, minimum: int = 0) -> int:
+    """Converte un parametro intero della richiesta (errore 400 se non valido)."""
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise tornado.web.HTTPError(400, f"'{name}' deve essere un numero intero")
+    if number < minimum:
+        raise tornado.web.HTTPError(400, f"'{name}' deve essere almeno {minimum}")
+    return number
+
+
+def _name_list(value, name: str) -> list:
+    """Verifica che un campo JSON sia una lista di nomi di colonna (``None`` → lista vuota)."""
+    if value is None:
+        return []
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise tornado.web.HTTPError(400, f"'{name}' deve essere una lista di nomi di colonna")
+    return value
+
+
+def _json_default(value):
+    # Converte scalari numpy/pandas in tipi nativi serializzabili
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def _records(df):
+    # to_json gestisce NaN e date in modo uniforme
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+def _render_chart(df, columns, chart_type, fmt, title):
+    with _PLOT_LOCK:
+        fig = generate_plot(df, columns, chart_type)
+        if fig is None:
+            return None, "Impossibile generare un grafico con i dati selezionati"
+        try:
+            if fmt == "png":
+                return export_to_png(fig)
+            if fmt == "pdf":
+                return export_to_pdf_chart(fig, f"{chart_type}.pdf")
+            return export_pdf_report(df, fig, title, f"report_{chart_type}.pdf")
+        finally:
+            plt.close(fig)
+
+
+class DatasetsHandler(BaseHandler):
+
+    async def get(self):
+        rows = await self.run(list_datasets)
+        self.write_json([{"id": r[0], "name": r[1], "upload_date": r[2]} for r in rows])
+
+    async def post(self):
+        if "file" in self.request.files:
+            upload = self.request.files["file"][0]
+            name, body = upload["filename"], upload["body"]
+        else:
+            name, body = self.get_query_argument("name", "upload.csv"), self.request.body
+        if not body:
+            raise tornado.web.HTTPError(400, "Nessun file CSV ricevuto")
+
+        df, err = await self.run(load_csv, BytesIO(body))
+        if err:
+            raise tornado.web.HTTPError(400, err)
+        dataset_id, created = await self.run(save_dataset, name, df)
+        if dataset_id is None:
+            raise tornado.web.HTTPError(500, "Errore nel salvataggio del dataset")
+        if created:
+            self.leases.append(self.registry.put(dataset_id, 1, df))
+        self.write_json({"id": dataset_id, "created": created, "rows": len(df), "columns": df.columns.tolist()},
+                        status=201 if created else 200)
+
+
+class DatasetHandler(BaseHandler):
+
+    async def get(self, dataset_id):
+        df = await self.dataset(dataset_id)
+        limit = _int_param(self.get_query_argument("limit", "5"), "limit")
+        self.write_json({
+            "id": int(dataset_id),
+            "rows": len(df),
+            "columns": df.columns.tolist(),
+            "dtypes": {c: str(t) for c, t in df.dtypes.items()},
+            "head": _records(df.head(limit)),
+        })
+
+
+class FilterHandler(BaseHandler):
+
+    async def post(self, dataset_id):
+        body = self.json_body()
+        filtered_df, columns = await self.filtered(dataset_id, body)
+        offset, limit = _int_param(body.get("offset", 0), "offset"), _int_param(body.get("limit", 100), "limit")
+        page = filtered_df[columns].iloc[offset:offset + limit]
+        self.write_json({"total": len(filtered_df), "offset": offset, "rows": _records(page)})
+
+
+class StatisticsHandler(BaseHandler):
+
+    async def post(self, dataset_id):
+        body = self.json_body()
+        operation = body.get("operation", "Media")
+        if operation not in STATISTIC_OPERATIONS:
+            raise tornado.web.HTTPError(400, f"Operazione non supportata: {operation!r} "
+                                             f"(valori ammessi: {', '.join(STATISTIC_OPERATIONS)})")
+        filtered_df, columns = await self.filtered(dataset_id, body)
+        stats = await self.run(compute_statistics, filtered_df, columns, operation)
+        self.write_json({"operation": operation, "rows": len(filtered_df), "results": stats})
+
+
+class AggregateHandler(BaseHandler):
+
+    async def post(self, dataset_id):
+        body = self.json_body()
+        operation = body.get("op", "sum")
+        if operation not in AGGREGATE_OPERATIONS:
+            raise tornado.web.HTTPError(400, f"Operazione non supportata: {operation!r} "
+                                             f"(valori ammessi: {', '.join(AGGREGATE_OPERATIONS)})")
+        filtered_df, _ = await self.filtered(dataset_id, body)
+        group_col, value_cols = body.get("group_by"), _name_list(body.get("values"), "values")
+        if not isinstance(group_col, str) or group_col not in filtered_df.columns or not value_cols:
+            raise tornado.web.HTTPError(400, "Specificare 'group_by' e 'values' validi")
+        try:
+            agg_df = await self.run(aggregate, filtered_df, group_col, value_cols, operation)
+        except (ValueError, KeyError, TypeError) as e:
+            raise tornado.web.HTTPError(400, f"Errore durante l'aggregazione: {e}")
+        self.write_json({"rows": _records(agg_df)})
+
+
+class ChartHandler(BaseHandler):
+
+    async def post(self, dataset_id):
+        body = self.json_body()
+        filtered_df, columns = await self.filtered(dataset_id, body)
+        chart_type, fmt = body.get("chart_type", "Barre"), body.get("format", "png")
+        if fmt not in ("png", "pdf", "report"):
+            raise tornado.web.HTTPError(400, f"Formato grafico non supportato: {fmt}")
+        data, err = await self.run(_render_chart, filtered_df, columns, chart_type, fmt, f"Report: {chart_type}")
+        if data is None:
+            raise tornado.web.HTTPError(422, err)
+        ext = "pdf" if fmt == "report" else fmt
+        self.send_file(data, fmt, f"{dataset_id}_{chart_type}.{ext}")
+
+
+class ExportHandler(BaseHandler):
+
+    async def post(self, dataset_id):
+        body = self.json_body()
+        filtered_df, columns = await self.filtered(dataset_id, body)
+        fmt = body.get("format", "csv")
+        if fmt == "csv":
+            data, err = await self.run(export_to_csv, filtered_df[columns])
+        elif fmt == "xlsx":
+            data, err = await self.run(export_to_excel, filtered_df[columns], f"{dataset_id}_filtered.xlsx")
+        else:
+            raise tornado.web.HTTPError(400, f"Formato di export non supportato: {fmt}")
+        if data is None:
+            raise tornado.web.HTTPError(500, err)
+        self.send_file(data, fmt, f"{dataset_id}_filtered.{fmt}")
+
+
+def make_app(workers: int = None) -> tornado.web.Application:
+    """Crea l'applicazione tornado con registro dei dataset e pool di worker condivisi.
+
+    Args:
+        workers (int, optional): Numero di thread nel pool di lavoro (default di ``ThreadPoolExecutor``).
+
+    Returns:
+        tornado.web.Application: Applicazione pronta per ``listen``.
+    """
+    shared = {"registry": get_registry(), "executor": ThreadPoolExecutor(max_workers=workers)}
+    routes = [
+        (r"/datasets", DatasetsHandler, shared),
+        (r"/datasets/(\d+)", DatasetHandler, shared),
+        (r"/datasets/(\d+)/filter", FilterHandler, shared),
+        (r"/datasets/(\d+)/statistics", StatisticsHandler, shared),
+        (r"/datasets/(\d+)/aggregate", AggregateHandler, shared),
+        (r"/datasets/(\d+)/chart", ChartHandler, shared),
+        (r"/datasets/(\d+)/export", ExportHandler, shared),
+    ]
+    return tornado.web.Application(routes)
+
+
+async def serve(host: str = "127.0.0.1", port: int = 8765, workers: int = None, max_body_size: int = 1024 ** 3):
+    """Avvia il servizio e resta in ascolto finché il processo non viene terminato.
+
+    Args:
+        host (str, optional): Indirizzo di ascolto. Default ``127.0.0.1`` (solo locale).
+        port (int, optional): Porta TCP. Default 8765.
+        workers (int, optional): Numero di thread nel pool di lavoro.
+        max_body_size (int, optional): Dimensione massima di un upload in byte. Default 1 GiB.
+    """
+    import asyncio
+
+    init_db()
+    app = make_app(workers=workers)
+    app.listen(port, address=host, max_body_size=max_body_size)
+    print(f"[API] In ascolto su http://{host}:{port}")
+    await asyncio.Event().wait()
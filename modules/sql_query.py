@@ -0,0 +1,285 @@
+"""
+sql_query.py
+------------
+Traduzione in SQL (SQLite) di filtri, statistiche e aggregazioni.
+
+Usato per i dataset salvati come tabella SQLite (formato ``table``): invece di
+caricare l'intero DataFrame ed eseguire ``apply_filters``/``compute_statistics``/
+``aggregate`` in pandas, la query viene eseguita dal database e solo le righe
+del risultato vengono lette. Le funzioni di questo modulo costruiscono soltanto
+il testo SQL e i parametri; l'esecuzione è in ``database.py``.
+
+La semantica segue quella delle funzioni pandas di ``modules.analyzer``: i
+valori mancanti (NULL) non soddisfano né ``between`` né ``in``/``not_in`` e
+non formano un gruppo nelle aggregazioni.
+"""
+
+import json
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Oltre questa soglia i valori di un filtro 'in'/'not_in' vengono passati come un unico
+# parametro JSON (json_each), per non superare il limite di parametri di SQLite
+MAX_INLINE_VALUES = 500
+
+# Formato delle colonne DATETIME nelle tabelle (e dei parametri di confronto)
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+# Date con fuso orario: in UTC, con l'offset esplicito (+0000) per rileggerle come tali
+DATETIME_TZ_FORMAT = DATETIME_FORMAT + "%z"
+
+STAT_FUNCTIONS = {
+    "Media": "AVG",
+    "Somma": "SUM",
+    "Conteggio": "COUNT",
+    "Massimo": "MAX",
+    "Minimo": "MIN",
+}
+
+AGG_FUNCTIONS = {
+    "sum": "SUM",
+    "mean": "AVG",
+    "count": "COUNT",
+    "max": "MAX",
+    "min": "MIN",
+}
+
+# Inizio dell'intervallo di tempo dal testo delle colonne DATETIME: prefisso da tenere
+# e completamento (es. "2024-05-03 14" → "2024-05-03 14:00:00"); vedi ``analyzer.time_buckets``
+TIME_BUCKETS = {"min": (16, ":00"), "h": (13, ":00:00"), "D": (10, " 00:00:00"), "MS": (7, "-01 00:00:00")}
+
+
+def quote_ident(name: str) -> str:
+    """Racchiude un nome di colonna o tabella tra doppi apici (escape incluso)."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def datetime_text(values: pd.Series) -> pd.Series:
+    """Date di una colonna come testo a larghezza fissa, nel formato delle tabelle.
+
+    L'ordine lessicografico coincide con quello temporale. Le colonne con fuso
+    orario vengono scritte in UTC (anche con l'ora legale l'ordine resta
+    corretto): in lettura tornano con fuso UTC, il nome del fuso originale
+    non viene conservato.
+    """
+    if values.dt.tz is not None:
+        return values.dt.tz_convert("UTC").dt.strftime(DATETIME_TZ_FORMAT)
+    return values.dt.strftime(DATETIME_FORMAT)
+
+
+def _param(value):
+    # Date → testo nel formato delle tabelle; scalari numpy/pandas → tipi nativi accettati da sqlite3
+    if isinstance(value, (datetime, np.datetime64)):
+        value = pd.Timestamp(value)
+        if value.tz is not None:
+            return value.tz_convert("UTC").strftime(DATETIME_TZ_FORMAT)
+        return value.strftime(DATETIME_FORMAT)
+    return value.item() if hasattr(value, "item") else value
+
+
+def source_sql(tables: list, order_keys: bool = False) -> str:
+    """Sorgente della query: una tabella o l'unione delle partizioni.
+
+    Args:
+        tables (list): Nomi delle tabelle delle partizioni (almeno una).
+        order_keys (bool, optional): Aggiunge alle partizioni le colonne ``__part__`` e
+            ``__row__`` per ordinare il risultato come le righe originali. Default False.
+
+    Returns:
+        str: Espressione utilizzabile dopo ``FROM``.
+    """
+    if len(tables) == 1:
+        return quote_ident(tables[0])
+    keys = "{} AS __part__, rowid AS __row__, " if order_keys else ""
+    # SQLite propaga il WHERE esterno dentro i rami della UNION ALL (e i loro indici)
+    return "(" + " UNION ALL ".join(f"SELECT {keys.format(i)}* FROM {quote_ident(t)}"
+                                    for i, t in enumerate(tables)) + ")"
+
+
+def where_clause(filters: list, unindexed=()):
+    """Traduce le tuple ``(col, operatore, valore)`` in una clausola WHERE.
+
+    Args:
+        filters (list): Filtri nel formato di ``apply_filters`` (``'between'``, ``'in'`` o ``'not_in'``).
+        unindexed (iterable, optional): Colonne per cui l'indice non va usato, ad esempio
+            un ``between`` che copre l'intero intervallo dei valori: la scansione della
+            tabella è più veloce di una ricerca sull'indice che restituisce tutte le righe.
+
+    Returns:
+        tuple[str, list]: Testo SQL (vuoto se non ci sono filtri) e parametri.
+
+    Raises:
+        ValueError: Se l'operatore non è supportato.
+    """
+    conditions, params = [], []
+    for col, op, value in filters or []:
+        ident = quote_ident(col)
+        if op == "between":
+            # Il + unario impedisce a SQLite di usare l'indice sulla colonna
+            ident = "+" + ident if col in unindexed else ident
+            min_v, max_v = value
+            conditions.append(f"{ident} BETWEEN ? AND ?")
+            params.extend([_param(min_v), _param(max_v)])
+        elif op in ("in", "not_in"):
+            values = [_param(v) for v in value]
+            negate = "NOT " if op == "not_in" else ""
+            if not values:
+                # 'in' vuoto non seleziona nulla, 'not_in' vuoto tutti i valori non nulli
+                conditions.append(f"{ident} IS NOT NULL" if negate else "0")
+                continue
+            if len(values) > MAX_INLINE_VALUES:
+                conditions.append(f"{ident} {negate}IN (SELECT value FROM json_each(?))")
+                params.append(json.dumps(values, default=str))
+            else:
+                conditions.append(f"{ident} {negate}IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        else:
+            raise ValueError(f"Operatore di filtro non supportato: {op!r}")
+    if not conditions:
+        return "", params
+    return " WHERE " + " AND ".join(conditions), params
+
+
+def select_query(tables: list, columns: list = None, filters: list = None,
+                 limit: int = None, offset: int = 0, unindexed=(), order_by: str = None, ascending: bool = True):
+    """Query delle righe che soddisfano i filtri (equivalente di ``apply_filters``).
+
+    Le righe mantengono l'ordine originale anche quando SQLite usa un indice.
+    Con ``order_by`` sono ordinate per quella colonna come in ``ResultPager``: i valori
+    mancanti in fondo e, a parità di valore, l'ordine originale.
+
+    Args:
+        tables (list): Tabelle delle partizioni.
+        columns (list, optional): Colonne da restituire (default: tutte; obbligatorio con più
+            partizioni, altrimenti il risultato includerebbe le colonne di ordinamento).
+        filters (list, optional): Filtri da applicare.
+        limit (int, optional): Numero massimo di righe.
+        offset (int, optional): Righe da saltare. Default 0.
+        unindexed (iterable, optional): Vedi ``where_clause``.
+        order_by (str, optional): Colonna di ordinamento (default: ordine originale).
+        ascending (bool, optional): Ordine crescente. Default True.
+
+    Returns:
+        tuple[str, list]: Testo SQL e parametri.
+    """
+    where, params = where_clause(filters, unindexed)
+    cols = ", ".join(quote_ident(c) for c in columns) if columns else "*"
+    order = ""
+    if order_by is not None:
+        ident = quote_ident(order_by)
+        order = f"{ident} IS NULL, {ident} {'ASC' if ascending else 'DESC'}, "
+    if len(tables) == 1:
+        sql = f"SELECT {cols} FROM {source_sql(tables)}{where} ORDER BY {order}rowid"
+    else:
+        sql = f"SELECT {cols} FROM {source_sql(tables, order_keys=True)}{where} ORDER BY {order}__part__, __row__"
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params += [int(limit), int(offset)]
+    return sql, params
+
+
+def count_query(tables: list, filters: list = None, unindexed=()):
+    """Query del numero di righe che soddisfano i filtri."""
+    where, params = where_clause(filters, unindexed)
+    return f"SELECT COUNT(*) FROM {source_sql(tables)}{where}", params
+
+
+def statistics_query(tables: list, columns: list, operation: str, filters: list = None, unindexed=()):
+    """Query equivalente a ``compute_statistics`` (una sola riga di risultato).
+
+    Come in pandas, le operazioni diverse da ``'Conteggio'`` vanno chieste solo
+    per colonne numeriche: la scelta spetta al chiamante.
+
+    Args:
+        tables (list): Tabelle delle partizioni.
+        columns (list): Colonne su cui calcolare la statistica.
+        operation (str): ``'Media'``, ``'Somma'``, ``'Conteggio'``, ``'Massimo'`` o ``'Minimo'``.
+        filters (list, optional): Filtri da applicare prima del calcolo.
+        unindexed (iterable, optional): Vedi ``where_clause``.
+
+    Returns:
+        tuple[str, list]: Testo SQL e parametri; le colonne del risultato seguono ``columns``.
+
+    Raises:
+        ValueError: Se l'operazione non è supportata.
+    """
+    if operation not in STAT_FUNCTIONS:
+        raise ValueError(f"Operazione non supportata: {operation!r}")
+    func = STAT_FUNCTIONS[operation]
+    # SUM di zero righe è NULL in SQL e 0 in pandas
+    template = "COALESCE(SUM({}), 0)" if func == "SUM" else func + "({})"
+    exprs = ", ".join(template.format(quote_ident(c)) for c in columns)
+    where, params = where_clause(filters, unindexed)
+    return f"SELECT {exprs} FROM {source_sql(tables)}{where}", params
+
+
+def aggregate_query(tables: list, group_col: str, value_cols: list, operation: str, filters: list = None,
+                    unindexed=()):
+    """Query equivalente a ``aggregate`` (GROUP BY ordinato per la prima colonna di valore).
+
+    Args:
+        tables (list): Tabelle delle partizioni.
+        group_col (str): Colonna di raggruppamento.
+        value_cols (list): Colonne numeriche da aggregare.
+        operation (str): Una tra ``'sum'``, ``'mean'``, ``'count'``, ``'max'``, ``'min'``.
+        filters (list, optional): Filtri da applicare prima del raggruppamento.
+        unindexed (iterable, optional): Vedi ``where_clause``.
+
+    Returns:
+        tuple[str, list]: Testo SQL e parametri.
+
+    Raises:
+        ValueError: Se l'operazione non è supportata.
+    """
+    if operation not in AGG_FUNCTIONS:
+        raise ValueError(f"Operazione di aggregazione non supportata: {operation!r}")
+    func = AGG_FUNCTIONS[operation]
+    template = "COALESCE(SUM({0}), 0)" if func == "SUM" else func + "({0})"
+    group = quote_ident(group_col)
+    exprs = ", ".join(f"{template.format(quote_ident(c))} AS {quote_ident(c)}" for c in value_cols)
+    where, params = where_clause(filters, unindexed)
+    # pandas esclude i valori mancanti dai gruppi
+    where = (where + " AND " if where else " WHERE ") + f"{group} IS NOT NULL"
+    sql = (f"SELECT {group}, {exprs} FROM {source_sql(tables)}{where} "
+           f"GROUP BY {group} ORDER BY 2 DESC")
+    return sql, params
+
+
+def resample_query(tables: list, time_col: str, value_cols: list, freq: str, operation: str,
+                   filters: list = None, unindexed=()):
+    """Query equivalente a ``resample_aggregate`` (una riga per intervallo, in ordine di tempo).
+
+    L'intervallo è un prefisso del testo della data (``TIME_BUCKETS``); l'eventuale
+    offset (``+0000`` delle colonne con fuso orario) resta in fondo alla chiave.
+
+    Args:
+        tables (list): Tabelle delle partizioni.
+        time_col (str): Colonna DATETIME.
+        value_cols (list): Colonne numeriche da aggregare.
+        freq (str): ``'min'``, ``'h'``, ``'D'`` o ``'MS'``.
+        operation (str): Una tra ``'sum'``, ``'mean'``, ``'count'``, ``'max'``, ``'min'``.
+        filters (list, optional): Filtri da applicare prima del raggruppamento.
+        unindexed (iterable, optional): Vedi ``where_clause``.
+
+    Returns:
+        tuple[str, list]: Testo SQL e parametri; la prima colonna è l'inizio dell'intervallo (testo).
+
+    Raises:
+        ValueError: Se la frequenza o l'operazione non sono supportate.
+    """
+    if freq not in TIME_BUCKETS:
+        raise ValueError(f"Frequenza non supportata: {freq!r}")
+    if operation not in AGG_FUNCTIONS:
+        raise ValueError(f"Operazione di aggregazione non supportata: {operation!r}")
+    func = AGG_FUNCTIONS[operation]
+    template = "COALESCE(SUM({0}), 0)" if func == "SUM" else func + "({0})"
+    length, suffix = TIME_BUCKETS[freq]
+    ident = quote_ident(time_col)
+    # Il testo a larghezza fissa ha 26 caratteri: quello che segue è l'offset
+    bucket = f"substr({ident}, 1, {length}) || '{suffix}' || substr({ident}, 27)"
+    exprs = ", ".join(f"{template.format(quote_ident(c))} AS {quote_ident(c)}" for c in value_cols)
+    where, params = where_clause(filters, unindexed)
+    where = (where + " AND " if where else " WHERE ") + f"{ident} IS NOT NULL"
+    sql = f"SELECT {bucket} AS {ident}, {exprs} FROM {source_sql(tables)}{where} GROUP BY 1 ORDER BY 1"
+    return sql, params
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# I moduli del progetto (database, modules.*) si importano dalla cartella principale
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    # Database temporaneo, per non toccare csv_analyzer.db (né db_init.log)
+    monkeypatch.setattr(database, "BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "test.db"))
+    database.init_db()
+    return tmp_path
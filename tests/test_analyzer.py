@@ -0,0 +1,87 @@
+"""Test delle funzioni di analisi (``modules.analyzer``)."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.analyzer import parse_filters, profile_dataset
+
+
+def test_parse_filters_accepts_lists_and_dicts():
+    raw = [
+        ["vendite", "between", [1, 10]],
+        {"column": "regione", "op": "in", "value": ["nord", "sud"]},
+        ("regione", "not_in", ()),
+    ]
+    assert parse_filters(raw) == [("vendite", "between", (1, 10)), ("regione", "in", ["nord", "sud"]),
+                                  ("regione", "not_in", [])]
+    assert parse_filters(None) == [] and parse_filters([]) == []
+
+
+@pytest.mark.parametrize("raw", [
+    [["x", "between", 5]],
+    [["x", "between", [1, 2, 3]]],
+    [["x", "between", [0, "z"]]],
+    [["x", "between", [None, 1]]],
+    [["x", "in", 5]],
+    [["x", "not_in", "abc"]],
+    [["x", "like", ["a"]]],
+    [["x", "in"]],
+    [{"op": "in", "value": []}],
+    [[1, "in", []]],
+    {"column": "x", "op": "in", "value": []},
+])
+def test_parse_filters_rejects_malformed_specs(raw):
+    with pytest.raises(ValueError):
+        parse_filters(raw)
+
+
+def test_profile_matches_hand_computed_values():
+    df = pd.DataFrame({
+        "x": [1.0, 2.0, 2.0, np.nan, 5.0],
+        "n": [1, 1, 1, 1, 1],
+        "s": ["a", "b", "a", None, "a"],
+        "t": pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-02", None, "2024-01-05"]),
+        "flag": [True, False, False, True, True],
+    })
+    df.loc[5] = df.loc[2]
+    profile = profile_dataset(df, bins=4, top_k=2)
+
+    assert profile["rows"] == 6 and profile["duplicates"] == 1
+    table = profile["columns"]
+    assert table["valori"].to_dict() == {"x": 5, "n": 6, "s": 5, "t": 5, "flag": 6}
+    assert table["distinti"].to_dict() == {"x": 3, "n": 1, "s": 2, "t": 3, "flag": 2}
+    assert table.loc["x", "% mancanti"] == pytest.approx(16.67)
+    assert table.loc["x", ["media", "min", "mediana", "max"]].tolist() == pytest.approx([2.4, 1.0, 2.0, 5.0])
+    assert table.loc["x", "dev. std"] == pytest.approx(np.std([1, 2, 2, 5, 2], ddof=1))
+    assert np.isnan(table.loc["s", "media"])
+
+    counts, edges = profile["histograms"]["x"]
+    assert counts.tolist() == [1, 3, 0, 1] and edges.tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+    # Colonna costante: intervallo ±0.5 come np.histogram
+    assert profile["histograms"]["n"][1].tolist() == [0.5, 0.75, 1.0, 1.25, 1.5]
+    assert set(profile["histograms"]) == {"x", "n"}
+    assert profile["top_values"]["s"].to_dict("list") == {"valore": ["a", "b"], "conteggio": [4, 1]}
+    assert set(profile["top_values"]) == {"s", "flag"}
+    assert profile["correlation"].shape == (2, 2)
+
+
+@pytest.mark.filterwarnings("ignore:invalid value encountered:RuntimeWarning")  # dev. std con valori infiniti
+def test_profile_histograms_match_numpy():
+    rng = np.random.default_rng(3)
+    rows = 5_000
+    df = pd.DataFrame({
+        "normale": rng.normal(0, 1e-3, rows),
+        "interi": rng.integers(-50, 50, rows),
+        "code": rng.pareto(1.5, rows),
+        "infiniti": np.where(rng.random(rows) < 0.1, np.inf, rng.random(rows)),
+        "vuota": np.full(rows, np.nan),
+    })
+    df.loc[::7, "normale"] = np.nan
+    histograms = profile_dataset(df, bins=13)["histograms"]
+    assert set(histograms) == {"normale", "interi", "code", "infiniti"}
+    for col, (counts, edges) in histograms.items():
+        values = df[col].to_numpy(dtype=float)
+        expected_counts, expected_edges = np.histogram(values[np.isfinite(values)], bins=13)
+        np.testing.assert_array_equal(counts, expected_counts)
+        np.testing.assert_array_equal(edges, expected_edges)
@@ -0,0 +1,77 @@
+"""Test della pipeline batch (``modules.batch``): output per file, salvataggio nel DB e riepilogo."""
+
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import database
+from modules.batch import _output_stems, process_file, run_batch
+
+SPEC = {
+    "filters": [["vendite", "between", [10, 100]]],
+    "statistics": ["Somma", "Conteggio"],
+    "aggregations": [{"group_by": "regione", "values": ["vendite"], "op": "sum"}],
+    "exports": ["csv"],
+}
+
+
+def write_csv(path, rows=20, offset=0):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pd.DataFrame({"regione": ["nord", "sud"] * (rows // 2),
+                  "vendite": [offset + 10 * i for i in range(rows)]}).to_csv(path, index=False)
+    return str(path)
+
+
+def test_process_file_writes_outputs(tmp_path):
+    path = write_csv(tmp_path / "dati" / "vendite.csv")
+    result = process_file(path, SPEC, str(tmp_path / "out"))
+    assert result["status"] == "ok" and result["errors"] == []
+    assert (result["rows"], result["filtered_rows"]) == (20, 10)
+    assert "dataset_id" not in result
+    names = sorted(os.path.basename(p) for p in result["outputs"])
+    assert names == ["vendite_filtered.csv", "vendite_regione_sum.csv", "vendite_statistics.json"]
+    assert all(os.path.dirname(p) == str(tmp_path / "out" / "vendite") for p in result["outputs"])
+    with open(tmp_path / "out" / "vendite" / "vendite_statistics.json", encoding="utf-8") as f:
+        assert json.load(f) == {"Somma": {"vendite": 550}, "Conteggio": {"regione": 10, "vendite": 10}}
+
+
+def test_process_file_reports_errors(tmp_path):
+    path = write_csv(tmp_path / "vendite.csv")
+    result = process_file(path, {"filters": [["manca", "in", ["x"]]]}, str(tmp_path / "out"))
+    assert result["status"] == "error" and "KeyError" in result["errors"][0]
+    # Nessuna riga filtrata: il grafico non può essere generato
+    spec = {"filters": [["vendite", "between", [1_000, 2_000]]], "charts": [{"type": "Barre"}], "exports": []}
+    result = process_file(path, spec, str(tmp_path / "out"))
+    assert result["status"] == "partial" and result["outputs"] == []
+
+
+def test_process_file_persists_in_worker(temp_db, tmp_path):
+    path = write_csv(tmp_path / "vendite.csv")
+    result = process_file(path, SPEC, str(tmp_path / "out"), persist=True)
+    assert result["created"] is True and "df" not in result
+    pd.testing.assert_frame_equal(database.load_dataset(result["dataset_id"]), pd.read_csv(path))
+    # Stesso contenuto: nessun duplicato
+    again = process_file(path, SPEC, str(tmp_path / "out"), persist=True)
+    assert (again["dataset_id"], again["created"]) == (result["dataset_id"], False)
+
+
+def test_output_stems_are_unique():
+    inputs = ["a/vendite.csv", "b/vendite.csv", "b/Vendite.csv", "c/altro.csv", "a_vendite.csv"]
+    assert _output_stems(inputs) == ["a_vendite", "b_vendite", "b_Vendite_2", "altro", "a_vendite_2"]
+
+
+def test_same_names_in_different_folders_do_not_overwrite(tmp_path):
+    inputs = [write_csv(tmp_path / "gennaio" / "vendite.csv"),
+              write_csv(tmp_path / "febbraio" / "vendite.csv", offset=5)]
+    out_dir = tmp_path / "out"
+    results = run_batch(inputs, SPEC, str(out_dir), workers=2)
+    assert [r["status"] for r in results] == ["ok", "ok"]
+    first, second = (pd.read_csv(out_dir / stem / f"{stem}_filtered.csv")
+                     for stem in ("gennaio_vendite", "febbraio_vendite"))
+    assert first["vendite"].tolist() == list(range(10, 101, 10))
+    assert second["vendite"].tolist() == list(range(15, 96, 10))
+    with open(out_dir / "summary.json", encoding="utf-8") as f:
+        summary = json.load(f)
+    assert (summary["files"], summary["ok"]) == (2, 2)
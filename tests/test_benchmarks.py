@@ -0,0 +1,56 @@
+"""Test del confronto dei benchmark (``benchmarks.run_benchmarks``) e del database temporaneo."""
+
+import os
+
+import pandas as pd
+import pytest
+
+import database
+from benchmarks import run_benchmarks
+from benchmarks.run_benchmarks import compare, run_size, temporary_database
+from benchmarks.synthetic import DEFAULT_DTYPES
+
+
+def results(**stages):
+    return {"results": {"1000": stages}}
+
+
+def test_compare_flags_time_and_memory_regressions():
+    baseline = results(load={"seconds": 1.0, "peak_mb": 100.0}, tiny={"seconds": 0.001, "peak_mb": 0.1})
+    current = results(load={"seconds": 1.1, "peak_mb": 180.0}, tiny={"seconds": 0.1, "peak_mb": 50.0})
+    assert [r[:3] for r in compare(current, baseline, 0.2)] == [("1000", "load", "peak_mb")]
+    # Soglia di memoria separata
+    assert compare(current, baseline, 0.2, memory_threshold=1.0) == []
+    slower = results(load={"seconds": 1.5, "peak_mb": 100.0})
+    assert [r[:3] for r in compare(slower, baseline, 0.2)] == [("1000", "load", "seconds")]
+
+
+def test_compare_ignores_unmeasured_memory():
+    baseline = results(load={"seconds": 1.0, "peak_mb": 100.0}, skipped={"skipped": "motivo"})
+    current = results(load={"seconds": 1.0, "peak_mb": 0.0}, skipped={"skipped": "motivo"}, nuova={"seconds": 9.0})
+    assert compare(current, baseline, 0.2) == []
+
+
+def test_temporary_database_restores_globals(tmp_path):
+    saved = database.BASE_DIR, database.DB_PATH
+    with pytest.raises(RuntimeError):
+        with temporary_database(str(tmp_path), "bench.db") as path:
+            assert database.DB_PATH == path and os.path.exists(path)
+            database.save_dataset("x", pd.DataFrame({"a": [1]}), storage="arrow")
+            raise RuntimeError("fase fallita")
+    assert (database.BASE_DIR, database.DB_PATH) == saved
+    # Resta solo il log di init_db
+    assert os.listdir(tmp_path) == ["db_init.log"]
+
+
+def test_run_size_measures_every_stage(tmp_path, monkeypatch):
+    saved = database.BASE_DIR, database.DB_PATH
+    # Export Excel saltato (il più lento): si verifica anche il caso oltre il limite di righe
+    monkeypatch.setattr(run_benchmarks, "EXCEL_MAX_ROWS", 0)
+    stages = run_size(500, str(tmp_path), DEFAULT_DTYPES, 5, seed=1, memory=False)
+    assert (database.BASE_DIR, database.DB_PATH) == saved
+    # Resta solo il log di init_db
+    assert os.listdir(tmp_path) == ["db_init.log"]
+    for name in ("load_csv", "save_dataset", "load_dataset_arrow", "apply_filters", "sql_statistics", "export_csv"):
+        assert stages[name]["seconds"] >= 0 and stages[name]["peak_mb"] == 0
+    assert "skipped" in stages["export_excel"]
@@ -0,0 +1,75 @@
+"""Test del dizionario dei valori (``modules.categorical``) e del filtro ``not_in`` per le colonne categoriche."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import database
+from modules.analyzer import apply_filters, filter_positions
+from modules.categorical import ValueDictionary
+
+
+@pytest.fixture
+def codes():
+    rng = np.random.default_rng(3)
+    values = pd.Series([f"CL{i:05d}" for i in rng.zipf(1.3, 20_000) % 50_000], dtype=object)
+    values[::97] = None
+    return values
+
+
+@pytest.fixture
+def dictionary():
+    return ValueDictionary(["Roma", "rovigo", "Ravenna", "a.b", "a+b", "Ñandú", "roma "], [5, 9, 1, 2, 3, 4, 5])
+
+
+def test_from_series_counts_non_missing_values(codes):
+    d = ValueDictionary.from_series(codes)
+    counts = codes.value_counts()
+    assert len(d) == len(counts) and d.counts.sum() == codes.notna().sum()
+    assert d.top(5) == counts.index[:5].tolist()
+    assert d.count(counts.index[0]) == counts.iloc[0] and d.count("assente") == 0
+
+
+def test_prefix_search_ignores_case_and_orders_by_count(dictionary):
+    assert dictionary.search("RO") == ["rovigo", "Roma", "roma "]
+    assert dictionary.search("ro", limit=2) == ["rovigo", "Roma"]
+    assert dictionary.search("roma") == ["Roma", "roma "]
+    assert dictionary.search("ñ") == ["Ñandú"]
+    assert dictionary.search("x") == []
+    assert dictionary.search("") == dictionary.top(len(dictionary))
+
+
+def test_substring_search_is_literal(dictionary):
+    assert dictionary.search("a.", substring=True) == ["a.b"]
+    assert dictionary.search("+", substring=True) == ["a+b"]
+    assert dictionary.search("EN", substring=True) == ["Ravenna"]
+
+
+def test_prefix_search_matches_linear_scan(codes):
+    d = ValueDictionary.from_series(codes)
+    counts = codes.value_counts()
+    for query in ("cl0", "CL000", "cl4999", "cl1"):
+        expected = counts[counts.index.str.lower().str.startswith(query.lower())]
+        result = d.search(query, limit=len(d))
+        assert sorted(result) == sorted(expected.index)
+        assert [d.count(v) for v in result] == sorted(expected, reverse=True)
+
+
+def test_merge_sums_counts(codes):
+    half = len(codes) // 2
+    merged = ValueDictionary.from_series(codes[:half]).merge(ValueDictionary.from_series(codes[half:]))
+    whole = ValueDictionary.from_series(codes)
+    assert merged.values.tolist() == whole.values.tolist() and merged.counts.tolist() == whole.counts.tolist()
+
+
+def test_empty_exclude_list_keeps_every_non_missing_value(temp_db, codes):
+    df = pd.DataFrame({"codice": codes, "n": np.arange(len(codes))})
+    expected = df[df["codice"].notna()]
+    filters = [("codice", "not_in", [])]
+    pd.testing.assert_frame_equal(apply_filters(df, [], filters), expected)
+    assert filter_positions(df, filters).tolist() == np.flatnonzero(df["codice"].notna()).tolist()
+
+    dataset_id, _ = database.save_dataset_version("codici.csv", df, storage="table")
+    assert database.count_rows(dataset_id, filters=filters) == len(expected)
+    filters = [("codice", "not_in", [codes.dropna().iloc[0]])]
+    assert database.count_rows(dataset_id, filters=filters) == len(apply_filters(df, [], filters))
@@ -0,0 +1,82 @@
+"""Test dei codec di compressione (``modules.compression``) e dei dataset salvati con ogni codec."""
+
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import database
+from modules import compression
+
+CODECS = compression.available_codecs()
+
+
+def _payloads():
+    rng = np.random.default_rng(5)
+    return {
+        "vuoto": b"",
+        "casuale": rng.bytes(100_000),
+        "ripetuto": b"csv;analyzer;" * 50_000,
+        "dataset": pickle.dumps(pd.DataFrame({"x": rng.normal(size=20_000), "g": rng.choice(["a", "b"], 20_000)})),
+    }
+
+
+@pytest.mark.parametrize("codec", CODECS)
+@pytest.mark.parametrize("kind", list(_payloads()))
+def test_round_trip(codec, kind):
+    data = _payloads()[kind]
+    packed = compression.compress(data, codec)
+    assert compression.decompress(packed, codec) == data
+    if kind == "ripetuto" and codec != "none":
+        assert len(packed) < len(data) / 10
+
+
+def test_none_leaves_data_unchanged():
+    assert compression.compress(b"abc", None) == b"abc" and compression.decompress(b"abc", "none") == b"abc"
+    assert CODECS[0] == "none" and {"zlib", "lzma", "bz2"} <= set(CODECS)
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError, match="non supportato"):
+        compression.compress(b"abc", "rar")
+    with pytest.raises(ValueError, match="non supportato"):
+        compression.benchmark(b"abc", ["rar"])
+
+
+def test_benchmark_reports_every_codec():
+    data = _payloads()["dataset"]
+    rows = compression.benchmark(data, repeat=1)
+    assert [r["codec"] for r in rows] == CODECS[1:]
+    assert all(r["size"] > 0 and r["ratio"] > 0 and r["compress_mb_s"] > 0 for r in rows)
+
+
+def _stored_codec(dataset_id):
+    conn = database._connect()
+    try:
+        return conn.execute("SELECT storage, codec FROM datasets WHERE id = ?", (dataset_id,)).fetchone()
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_dataset_round_trip(temp_db, codec):
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame({"valore": rng.normal(size=3_000), "gruppo": rng.choice(["a", "b", None], 3_000),
+                       "quando": pd.date_range("2024-01-01", periods=3_000, freq="h")})
+    dataset_id, _ = database.save_dataset_version(f"{codec}.csv", df, codec=codec, storage="blob")
+    assert _stored_codec(dataset_id) == ("blob", None if codec == "none" else codec)
+    pd.testing.assert_frame_equal(database.load_dataset(dataset_id), df)
+
+    # Versione successiva: viene salvato solo il segmento aggiunto
+    extended = pd.concat([df, df.iloc[:100]], ignore_index=True)
+    assert database.save_dataset_version(f"{codec}.csv", extended, codec=codec, storage="blob")[1] == "appended"
+    pd.testing.assert_frame_equal(database.load_dataset(dataset_id), extended)
+
+
+@pytest.mark.parametrize("codec", [c for c in CODECS if c not in ("none",) + compression.ARROW_IPC_CODECS])
+def test_arrow_falls_back_to_blob_for_other_codecs(temp_db, codec):
+    df = pd.DataFrame({"x": np.arange(1_000)})
+    dataset_id, _ = database.save_dataset_version("fallback.csv", df, codec=codec, storage="arrow")
+    assert _stored_codec(dataset_id) == ("blob", codec)
+    pd.testing.assert_frame_equal(database.load_dataset(dataset_id), df)
@@ -0,0 +1,74 @@
+"""Test del riconoscimento delle date al caricamento (``modules.data_loader``) e del loro salvataggio."""
+
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import database
+from modules.data_loader import load_csv, parse_datetime_columns
+
+
+@pytest.mark.parametrize("values, expected", [
+    (["2024-01-05", "2024-02-01", None], ["2024-01-05", "2024-02-01", None]),
+    (["05/01/2024 10:00", "06/01/2024 11:30"], ["2024-01-05 10:00", "2024-01-06 11:30"]),
+    (["31.12.2023", "01.01.2024"], ["2023-12-31", "2024-01-01"]),
+    (["2024-01-05T10:00:00.250", "2024-01-05T10:00:01"], ["2024-01-05 10:00:00.250", "2024-01-05 10:00:01"]),
+])
+def test_date_columns_are_parsed(values, expected):
+    df = parse_datetime_columns(pd.DataFrame({"quando": values}))
+    assert pd.api.types.is_datetime64_dtype(df["quando"])
+    expected = pd.to_datetime(pd.Series(expected, name="quando"), format="ISO8601")
+    pd.testing.assert_series_equal(df["quando"], expected, check_dtype=False)
+
+
+@pytest.mark.parametrize("values", [
+    ["ordine 2024-01-05", "ordine 2024-01-06"],   # data in mezzo ad altro testo
+    ["2024-01-05 consegnato", "2024-01-06"],      # testo dopo la data
+    ["2024-01-05", "non disponibile"],            # un valore non è una data
+    ["A-12-3", "B-4-5"],                          # codici
+    ["12", "13"],                                 # numeri come testo
+])
+def test_non_date_text_is_kept(values):
+    df = parse_datetime_columns(pd.DataFrame({"testo": values}))
+    assert df["testo"].dtype == object and df["testo"].tolist() == values
+
+
+def test_utc_offsets():
+    df = parse_datetime_columns(pd.DataFrame({
+        "stesso": ["2024-01-01T10:00:00+01:00", "2024-01-02T10:00:00+01:00"],
+        # Ora solare e legale: offset diversi → UTC
+        "misti": ["2024-03-30T10:00:00+01:00", "2024-03-31T10:00:00+02:00"],
+    }))
+    assert str(df["stesso"].dt.tz) == "UTC+01:00"
+    assert str(df["misti"].dt.tz) == "UTC"
+    assert df["misti"].dt.hour.tolist() == [9, 8]
+
+
+def test_load_csv_parses_dates():
+    data = b"quando;valore\n2024-01-05 10:00:00;1\n2024-01-06 11:00:00;2\n"
+    df, err = load_csv(BytesIO(data))
+    assert err is None and pd.api.types.is_datetime64_dtype(df["quando"])
+    df, err = load_csv(BytesIO(data), parse_dates=False)
+    assert err is None and df["quando"].dtype == object
+
+
+@pytest.mark.parametrize("storage", ["table", "blob", "arrow"])
+def test_time_zones_round_trip(temp_db, storage):
+    df = pd.DataFrame({
+        "locale": pd.date_range("2024-03-30", periods=6, freq="12h", tz="Europe/Rome"),
+        "utc": pd.date_range("2024-01-01", periods=6, freq="D", tz="UTC"),
+        "naive": pd.date_range("2024-01-01 08:30", periods=6, freq="h"),
+        "valore": np.arange(6.0),
+    })
+    df.loc[2, "locale"] = pd.NaT
+    dataset_id, _ = database.save_dataset_version(f"tz_{storage}.csv", df, storage=storage)
+    loaded = database.load_dataset(dataset_id)
+    if storage == "table":
+        # Le tabelle conservano gli istanti in UTC, non il nome del fuso
+        expected = df.assign(locale=df["locale"].dt.tz_convert("UTC"))
+    else:
+        expected = df
+    pd.testing.assert_frame_equal(loaded, expected, check_dtype=False)
+    assert str(loaded["utc"].dt.tz) == "UTC" and loaded["naive"].dt.tz is None
@@ -0,0 +1,165 @@
+"""Test di regressione per il salvataggio dei dataset (``database.py``): concorrenza e file Arrow."""
+
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules import compression
+
+import database
+
+
+def _frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({"id": np.arange(rows), "valore": rng.random(rows),
+                         "gruppo": rng.choice(["a", "b", "c"], rows)})
+
+
+def _stored_payloads() -> set:
+    # Tabelle e file Arrow presenti, registrati o meno in `datasets`
+    conn = database._connect()
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'ds_%'")}
+    conn.close()
+    data_dir = database._data_dir()
+    return tables | set(os.listdir(data_dir) if os.path.isdir(data_dir) else [])
+
+
+def _registered_payloads() -> set:
+    conn = database._connect()
+    paths = {row[0] for row in conn.execute("SELECT path FROM datasets UNION SELECT path FROM dataset_segments")}
+    conn.close()
+    return paths - {None}
+
+
+@pytest.mark.parametrize("storage", database.STORAGE_FORMATS)
+def test_concurrent_append_saves_one_segment(temp_db, storage):
+    full = _frame(200_000)
+    base_id, status = database.save_dataset_version("vendite.csv", full.iloc[:100_000], storage=storage)
+    assert status == "created"
+
+    # Due upload simultanei dello stesso file esteso: uno aggiunge il segmento, l'altro è un duplicato
+    barrier = threading.Barrier(2)
+    results = []
+
+    def upload():
+        barrier.wait()
+        results.append(database.save_dataset_version("vendite.csv", full))
+
+    threads = [threading.Thread(target=upload) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(status for _, status in results) == ["appended", "duplicate"]
+    assert {dataset_id for dataset_id, _ in results} == {base_id}
+    assert len(database.load_dataset(base_id)) == len(full)
+    assert [(v, rows) for v, rows, *_ in database.list_versions(base_id)] == [(1, 100_000), (2, 100_000)]
+    # I dati preparati dal salvataggio rimasto duplicato sono stati eliminati
+    assert _stored_payloads() == _registered_payloads()
+
+
+@pytest.mark.parametrize("storage", database.STORAGE_FORMATS)
+def test_concurrent_create_saves_one_record(temp_db, storage):
+    df = _frame(50_000)
+    barrier = threading.Barrier(2)
+    results = []
+
+    def upload():
+        barrier.wait()
+        results.append(database.save_dataset_version("nuovo.csv", df, storage=storage))
+
+    threads = [threading.Thread(target=upload) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(status for _, status in results) == ["created", "duplicate"]
+    assert len(database.list_datasets()) == 1
+    assert _stored_payloads() == _registered_payloads()
+
+
+@pytest.mark.parametrize("storage", ["arrow", "table"])
+def test_failed_save_removes_staged_data(temp_db, monkeypatch, storage):
+    def fail(*args):
+        raise RuntimeError("errore simulato")
+
+    monkeypatch.setattr(database, "_save_cache", fail)
+    assert database.save_dataset_version("errore.csv", _frame(1_000), storage=storage) == (None, None)
+    assert database.save_partitioned_dataset("errore.csv", [_frame(500), _frame(500)], storage=storage) == (None, None)
+    assert database.list_datasets() == [] and _stored_payloads() == set()
+
+
+def test_writes_wait_for_the_lock_instead_of_failing(temp_db):
+    holder = database._connect()
+    assert holder.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    holder.execute("BEGIN IMMEDIATE")
+
+    errors = []
+
+    def write():
+        try:
+            database.save_cache(1, 1, "summary", "", {"ok": True})
+        except Exception as e:
+            errors.append(e)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    # Le letture non attendono la transazione in corso (WAL)
+    assert database.list_datasets() == []
+    time.sleep(0.5)
+    holder.commit()
+    holder.close()
+    writer.join()
+    assert errors == [] and database.load_cache(1, 1, "summary") == {"ok": True}
+
+
+def _mixed_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(1)
+    df = _frame(rows).assign(
+        quando=pd.date_range("2024-01-01", periods=rows, freq="min", tz="Europe/Rome"),
+        flag=np.arange(rows) % 3 == 0,
+        categoria=pd.Categorical(rng.choice(["x", "y"], rows)),
+        mancanti=np.where(np.arange(rows) % 7 == 0, np.nan, rng.random(rows)),
+    )
+    df.loc[::11, "gruppo"] = None
+    return df
+
+
+@pytest.mark.parametrize("codec", [None] + list(compression.ARROW_IPC_CODECS))
+def test_arrow_round_trip(temp_db, codec):
+    if codec is not None and codec not in compression.CODECS:
+        pytest.skip(f"codec {codec} non disponibile in pyarrow")
+    df = _mixed_frame(5_000)
+    dataset_id, _ = database.save_dataset_version("arrow.csv", df, storage="arrow", codec=codec)
+    pd.testing.assert_frame_equal(database.load_dataset(dataset_id), df)
+    # Nuova versione: il segmento aggiunto è un secondo file Arrow
+    extended = pd.concat([df, _mixed_frame(200)], ignore_index=True)
+    assert database.save_dataset_version("arrow.csv", extended, storage="arrow", codec=codec) == (dataset_id, "appended")
+    pd.testing.assert_frame_equal(database.load_dataset(dataset_id), extended)
+    assert len(_stored_payloads()) == 2
+
+
+def test_uncompressed_arrow_is_memory_mapped(temp_db):
+    pa = pytest.importorskip("pyarrow")
+    if "lz4" not in compression.CODECS:
+        pytest.skip("codec lz4 non disponibile in pyarrow")
+    df = _frame(200_000).drop(columns="gruppo")
+    plain_id, _ = database.save_dataset_version("mmap.csv", df, storage="arrow")
+    compressed_id, _ = database.save_dataset_version("lz4.csv", df, storage="arrow", codec="lz4")
+
+    before = pa.total_allocated_bytes()
+    mapped = database.load_dataset(plain_id)
+    # Colonne numeriche: viste in sola lettura sulle pagine del file, nessuna copia in memoria
+    assert pa.total_allocated_bytes() == before
+    assert not mapped["valore"].to_numpy().flags.writeable
+    pd.testing.assert_frame_equal(mapped, df)
+
+    decompressed = database.load_dataset(compressed_id)
+    assert pa.total_allocated_bytes() - before >= df.memory_usage(index=False).sum()
+    pd.testing.assert_frame_equal(decompressed, df)
@@ -0,0 +1,91 @@
+"""Test della cronologia: scrittura a blocchi (``modules.history``) e paginazione a cursore."""
+
+import pytest
+
+import database
+from modules import history
+
+
+@pytest.fixture
+def writer(temp_db):
+    # Intervallo lungo: le scritture avvengono solo con flush()
+    return history.HistoryWriter(batch_size=1_000, interval=60, max_attempts=3)
+
+
+def _operations():
+    rows, cursor = database.query_history(limit=1_000)
+    assert cursor is None
+    return [row[3] for row in reversed(rows)]
+
+
+def test_flush_writes_queued_operations(writer):
+    for i in range(5):
+        writer.record(None, ["a", "b"], f"op{i}", {"i": i})
+    writer.flush()
+    rows, _ = database.query_history(limit=10)
+    assert [row[3] for row in rows] == [f"op{i}" for i in reversed(range(5))]
+    assert rows[0][2] == "a,b" and rows[0][4] == '{"i": 4}'
+    # Timestamp al millisecondo, come quelli di save_history
+    database.save_history(None, ["a"], "legacy")
+    assert {len(row[5]) for row in database.query_history(limit=10)[0]} == {23}
+
+
+def test_cursor_pages_cover_history_once(temp_db):
+    rows = [(None, "a", "filter" if i % 3 else "stats", None, f"2024-01-01T00:00:{i // 4:02d}.000")
+            for i in range(50)]
+    database.save_history_batch(rows)
+
+    for operation, expected in ((None, 50), ("stats", 17)):
+        seen, cursor = [], None
+        while True:
+            page, cursor = database.query_history(operation=operation, limit=7, before=cursor)
+            seen.extend(page)
+            if cursor is None:
+                break
+        assert len(seen) == expected == len({row[0] for row in seen})
+        # Dalla più recente, con gli ID a parità di timestamp
+        assert seen == sorted(seen, key=lambda row: (row[5], row[0]), reverse=True)
+
+
+def test_failed_batch_is_retried_in_order(writer, monkeypatch):
+    failures = [RuntimeError("database is locked")] * 2
+    write = database.save_history_batch
+
+    def flaky(rows):
+        if failures:
+            raise failures.pop()
+        write(rows)
+
+    monkeypatch.setattr(history, "save_history_batch", flaky)
+    writer.record(None, [], "primo")
+    writer.flush()
+    writer.record(None, [], "secondo")
+    writer.flush()
+    assert _operations() == []
+    writer.record(None, [], "terzo")
+    writer.flush()
+    assert _operations() == ["primo", "secondo", "terzo"] and writer.dropped == 0
+
+
+def test_batch_is_dropped_after_max_attempts(writer, monkeypatch):
+    def broken(rows):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(history, "save_history_batch", broken)
+    writer.record(None, [], "perso")
+    writer.record(None, [], "perso")
+    for _ in range(2):
+        writer.flush()
+    writer.record(None, [], "salvato")
+    writer.flush()
+    assert writer.dropped == 2
+
+    monkeypatch.setattr(history, "save_history_batch", database.save_history_batch)
+    writer.flush()
+    assert _operations() == ["salvato"] and writer.dropped == 2
+
+
+def test_init_db_migrates_second_timestamps(temp_db):
+    database.save_history_batch([(None, "a", "vecchio", None, "2024-01-01T10:00:00")])
+    database.init_db()
+    assert database.query_history()[0][0][5] == "2024-01-01T10:00:00.000"
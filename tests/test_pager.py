@@ -0,0 +1,113 @@
+"""Test della paginazione dei risultati (``modules.pager``) e delle posizioni filtrate."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import database
+from modules.analyzer import apply_filters, column_ranges, filter_positions
+from modules.pager import ResultPager, SqlResultPager
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(7)
+    rows = 1_003
+    df = pd.DataFrame({
+        "id": np.arange(rows),
+        "valore": rng.normal(0, 1, rows),
+        "gruppo": rng.choice(["a", "b", "c"], rows),
+    })
+    df.loc[::17, "valore"] = np.nan
+    df.loc[::19, "gruppo"] = None
+    return df
+
+
+FILTERS = [
+    [],
+    [("valore", "between", (-0.5, 0.5))],
+    [("gruppo", "in", ["a", "c"])],
+    [("gruppo", "not_in", [])],
+    [("valore", "between", (-1.0, 1.0)), ("gruppo", "not_in", ["b"])],
+]
+
+
+def reference_filter(df, filters):
+    # Filtri applicati uno alla volta con le maschere pandas
+    for col, op, value in filters:
+        if op == "between":
+            df = df[(df[col] >= value[0]) & (df[col] <= value[1])]
+        elif op == "in":
+            df = df[df[col].isin(value)]
+        else:
+            df = df[df[col].notna() & ~df[col].isin(value)]
+    return df
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_filter_positions_match_apply_filters(frame, filters):
+    expected = reference_filter(frame, filters)
+    pd.testing.assert_frame_equal(frame.iloc[filter_positions(frame, filters)], expected)
+    pd.testing.assert_frame_equal(apply_filters(frame, [], filters), expected)
+
+    # Con le partizioni (saltate tramite min/max) il risultato non cambia
+    partitions = [{"start": start, "stop": min(start + 100, len(frame)),
+                   "stats": column_ranges(frame.iloc[start:start + 100])}
+                  for start in range(0, len(frame), 100)]
+    positions = filter_positions(frame, filters, partitions=partitions)
+    pd.testing.assert_frame_equal(frame.iloc[positions], expected)
+
+
+@pytest.mark.parametrize("page_size", [1, 50, 1_003, 2_000])
+def test_pages_cover_result_exactly_once(frame, page_size):
+    positions = filter_positions(frame, FILTERS[1])
+    pager = ResultPager(frame, len(frame), positions)
+    assert len(pager) == len(positions)
+    assert pager.page_count(page_size) == max(1, -(-len(positions) // page_size))
+
+    pages = [pager.page(n, page_size) for n in range(1, pager.page_count(page_size) + 1)]
+    assert all(len(p) == page_size for p in pages[:-1]) and 0 < len(pages[-1]) <= page_size
+    pd.testing.assert_frame_equal(pd.concat(pages), frame.iloc[positions])
+
+
+def test_page_number_is_clamped(frame):
+    pager = ResultPager(frame)
+    pd.testing.assert_frame_equal(pager.page(0, 100), frame.iloc[:100])
+    pd.testing.assert_frame_equal(pager.page(99, 100), frame.iloc[1_000:])
+
+
+def test_empty_result_has_one_empty_page(frame):
+    pager = ResultPager(frame, rows=filter_positions(frame, [("gruppo", "in", [])]))
+    assert len(pager) == 0 and pager.page_count(50) == 1
+    assert pager.page(1, 50).empty and list(pager.page(1, 50).columns) == list(frame.columns)
+
+
+@pytest.mark.parametrize("ascending", [True, False])
+def test_sorted_pages_keep_missing_values_last(frame, ascending):
+    positions = filter_positions(frame, FILTERS[2])
+    pager = ResultPager(frame, rows=positions)
+    pages = [pager.page(n, 64, "valore", ascending) for n in range(1, pager.page_count(64) + 1)]
+    expected = frame.iloc[positions].sort_values("valore", ascending=ascending, kind="stable", na_position="last")
+    pd.testing.assert_frame_equal(pd.concat(pages), expected)
+
+
+def test_frame_is_not_copied_without_filters(frame):
+    assert ResultPager(frame).frame() is frame
+    assert apply_filters(frame, [], []) is frame
+    assert apply_filters(frame, [], FILTERS[3]) is not frame
+    positions = filter_positions(frame, FILTERS[1])
+    pd.testing.assert_frame_equal(ResultPager(frame, rows=positions).frame(), frame.iloc[positions])
+
+
+@pytest.mark.parametrize("sort_by", [None, "valore", "gruppo"])
+def test_sql_pager_matches_in_memory_pager(temp_db, frame, sort_by):
+    dataset_id, _ = database.save_dataset_version("pager.csv", frame, storage="table")
+    filters = FILTERS[4]
+    columns = list(frame.columns)
+    memory = ResultPager(frame, rows=filter_positions(frame, filters))
+    sql = SqlResultPager(dataset_id, None, columns, filters, len(frame))
+    assert len(sql) == len(memory) and sql.page_count(40) == memory.page_count(40)
+    for number in (1, 2, memory.page_count(40)):
+        expected = memory.page(number, 40, sort_by).reset_index(drop=True)
+        result = sql.page(number, 40, sort_by).reset_index(drop=True)
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
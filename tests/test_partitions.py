@@ -0,0 +1,114 @@
+"""Test dei dataset partizionati: allineamento degli schemi, caricamento e salto delle partizioni."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import database
+from modules.analyzer import apply_filters, filter_positions
+from modules.data_loader import align_schemas, load_many
+
+
+def _day(day: int, rows: int = 200) -> pd.DataFrame:
+    # Un file al giorno: "giorno" e "valore" hanno intervalli disgiunti fra le partizioni
+    rng = np.random.default_rng(day)
+    return pd.DataFrame({"giorno": day, "valore": day * 100 + rng.random(rows) * 99,
+                         "gruppo": rng.choice(["a", "b"], rows)})
+
+
+def test_align_schemas_reorders_columns_and_widens_numbers():
+    first = pd.DataFrame({"a": [1, 2], "b": ["x", "y"]})
+    second = pd.DataFrame({"b": ["z"], "a": [0.5]})
+    frames, err = align_schemas([first, second])
+    assert err is None
+    assert [list(df.columns) for df in frames] == [["a", "b"], ["a", "b"]]
+    assert {str(df["a"].dtype) for df in frames} == {"float64"}
+
+
+@pytest.mark.parametrize("other", [
+    pd.Series(["2024-01-01", "testo"], dtype=object),
+    pd.Series([True, False]),
+    pd.Series(pd.to_datetime(["2024-01-01", "2024-01-02"]).tz_localize("UTC")),
+    pd.Series([1.5, 2.5]),
+])
+def test_align_schemas_rejects_incompatible_types(other):
+    base = pd.DataFrame({"t": pd.to_datetime(["2024-01-01", "2024-01-02"])})
+    frames, err = align_schemas([base, pd.DataFrame({"t": other})])
+    assert frames is None and "'t'" in err
+
+
+def test_align_schemas_rejects_bool_with_numbers_and_different_columns():
+    assert align_schemas([pd.DataFrame({"x": [1, 2]}), pd.DataFrame({"x": [True]})])[0] is None
+    frames, err = align_schemas([pd.DataFrame({"x": [1]}), pd.DataFrame({"y": [1]})])
+    assert frames is None and "mancanti: ['x']" in err
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_load_many_keeps_source_order(tmp_path, executor):
+    paths = []
+    for day in (3, 1, 2):
+        path = tmp_path / f"giorno_{day}.csv"
+        _day(day, 10).to_csv(path, index=False)
+        paths.append(path)
+    loaded = load_many(paths, max_workers=2, executor=executor)
+    assert [name for name, _, _ in loaded] == ["giorno_3.csv", "giorno_1.csv", "giorno_2.csv"]
+    assert all(err is None for _, _, err in loaded)
+    assert [int(df["giorno"].iloc[0]) for _, df, _ in loaded] == [3, 1, 2]
+
+
+@pytest.mark.parametrize("storage", database.STORAGE_FORMATS)
+def test_partitioned_dataset_round_trip(temp_db, storage):
+    frames = [_day(day) for day in range(4)]
+    names = [f"giorno_{day}.csv" for day in range(4)]
+    dataset_id, status = database.save_partitioned_dataset("giorni", frames, names, storage=storage)
+    assert status == "created"
+    assert database.save_partitioned_dataset("giorni", frames, names, storage=storage) == (dataset_id, "duplicate")
+
+    whole = pd.concat(frames, ignore_index=True)
+    pd.testing.assert_frame_equal(database.load_dataset(dataset_id), whole, check_dtype=False)
+    partitions = database.list_partitions(dataset_id)
+    assert [(p["name"], p["start"], p["stop"]) for p in partitions] == [
+        (name, i * 200, (i + 1) * 200) for i, name in enumerate(names)]
+
+    # Lo stesso contenuto esteso viene riconosciuto come nuova versione
+    extended = pd.concat([whole, _day(4)], ignore_index=True)
+    assert database.save_dataset_version("giorni", extended) == (dataset_id, "appended")
+    assert len(database.list_partitions(dataset_id)) == 5
+
+
+def test_partitions_outside_the_filter_are_not_read(temp_db, monkeypatch):
+    frames = [_day(day) for day in range(5)]
+    dataset_id, _ = database.save_partitioned_dataset("giorni", frames, storage="arrow")
+    whole = pd.concat(frames, ignore_index=True)
+    filters = [("valore", "between", (150.0, 250.0))]
+
+    reads = []
+    read_payload = database._read_payload
+    monkeypatch.setattr(database, "_read_payload", lambda *args: reads.append(args[2]) or read_payload(*args))
+    loaded = database.load_dataset(dataset_id, filters=filters)
+    assert len(reads) == 2 and set(loaded["giorno"]) == {1, 2}
+    pd.testing.assert_frame_equal(apply_filters(loaded, [], filters).reset_index(drop=True),
+                                  apply_filters(whole, [], filters).reset_index(drop=True))
+
+    # In memoria: stesse righe saltando le partizioni tramite i min/max
+    partitions = database.list_partitions(dataset_id)
+    pd.testing.assert_frame_equal(apply_filters(whole, [], filters, partitions=partitions),
+                                  apply_filters(whole, [], filters))
+    np.testing.assert_array_equal(filter_positions(whole, filters, partitions=partitions),
+                                  filter_positions(whole, filters))
+
+    # Nessuna partizione utile: resta lo schema
+    empty = database.load_dataset(dataset_id, filters=[("giorno", "between", (10, 20))])
+    assert empty.empty and list(empty.columns) == list(whole.columns)
+
+
+def test_sql_queries_skip_partitions(temp_db):
+    frames = [_day(day) for day in range(5)]
+    dataset_id, _ = database.save_partitioned_dataset("giorni", frames, storage="table")
+    conn = database._connect()
+    try:
+        tables, _ = database._sql_tables(conn.cursor(), dataset_id, None, [("giorno", "between", (3, 9))])
+    finally:
+        conn.close()
+    assert len(tables) == 2
+    assert database.count_rows(dataset_id, filters=[("giorno", "between", (3, 9))]) == 400
@@ -0,0 +1,108 @@
+"""Test del registro dei dataset in memoria (``modules.registry``): riferimenti, rimozione e sola lettura."""
+
+import gc
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.registry import DatasetRegistry
+
+
+def make_frame(rows=1_000):
+    return pd.DataFrame({"x": np.arange(rows, dtype=float), "n": np.arange(rows),
+                         "s": [f"v{i}" for i in range(rows)],
+                         "t": pd.date_range("2024-01-01", periods=rows, freq="min"),
+                         "c": pd.Categorical(np.arange(rows) % 3)})
+
+
+class Loader:
+    """Loader finto: conta le letture (una per ``(id, versione)``)."""
+
+    def __init__(self, rows=1_000):
+        self.rows = rows
+        self.calls = []
+
+    def __call__(self, dataset_id, version=None):
+        self.calls.append((dataset_id, version))
+        return None if dataset_id < 0 else make_frame(self.rows)
+
+
+def test_same_version_is_loaded_once_and_shared():
+    loader = Loader()
+    registry = DatasetRegistry(budget_mb=100, loader=loader)
+    first, second = registry.acquire(1, 1), registry.acquire(1, 1)
+    assert loader.calls == [(1, 1)]
+    assert (registry.hits, registry.misses) == (1, 1)
+    assert np.shares_memory(first.df["x"].to_numpy(), second.df["x"].to_numpy())
+    assert registry.stats()[0]["riferimenti"] == 2
+    assert registry.acquire(-1, 1) is None
+
+
+def test_shared_frame_is_read_only():
+    registry = DatasetRegistry(budget_mb=100, loader=Loader())
+    lease = registry.acquire(1, 1)
+    with pytest.raises(ValueError):
+        lease.df.loc[0, "x"] = -1.0
+    with pytest.raises(ValueError):
+        lease.df.iloc[0, 1] = -1
+    with pytest.raises(ValueError):
+        lease.df.loc[0, "s"] = "nuovo"
+    # La copia superficiale di ogni riferimento accetta colonne nuove senza toccare l'originale
+    lease.df["y"] = 1
+    assert "y" not in registry.acquire(1, 1).df.columns
+    assert lease.df["c"].dtype == "category" and lease.df["t"].iloc[0] == pd.Timestamp("2024-01-01")
+
+
+def test_released_versions_are_evicted_over_budget():
+    registry = DatasetRegistry(budget_mb=0, loader=Loader())
+    lease = registry.acquire(1, 1)
+    registry.acquire(1, 2).release()
+    # Budget zero: la versione rilasciata viene rimossa, quella in uso resta
+    assert [(r["dataset"], r["versione"]) for r in registry.stats()] == [(1, 1)]
+    assert registry.evictions == 1
+    lease.release()
+    lease.release()
+    assert lease.released and registry.stats() == [] and registry.evictions == 2
+
+
+def test_least_recently_used_is_evicted_first():
+    loader = Loader(rows=50_000)
+    registry = DatasetRegistry(budget_mb=100, loader=loader)
+    for version in (1, 2, 3):
+        registry.acquire(1, version).release()
+    registry.acquire(1, 1).release()
+    # Budget pari a due versioni: esce la 2, usata meno di recente
+    registry.budget_bytes = registry.total_bytes * 2 // 3 + 1
+    registry._evict_idle()
+    assert sorted(r["versione"] for r in registry.stats()) == [1, 3]
+
+
+def test_lease_is_released_when_collected():
+    registry = DatasetRegistry(budget_mb=0, loader=Loader())
+    lease = registry.acquire(1, 1)
+    del lease
+    gc.collect()
+    assert registry.stats() == []
+
+
+def test_concurrent_put_registers_one_copy():
+    registry = DatasetRegistry(budget_mb=100, loader=Loader())
+    frames = [make_frame() for _ in range(8)]
+    leases = []
+    barrier = threading.Barrier(len(frames))
+
+    def put(df):
+        barrier.wait()
+        leases.append(registry.put(7, 1, df))
+
+    threads = [threading.Thread(target=put, args=(df,)) for df in frames]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert registry.misses == 1 and registry.hits == len(frames) - 1
+    shared = leases[0].df["x"].to_numpy()
+    assert all(np.shares_memory(lease.df["x"].to_numpy(), shared) for lease in leases)
+    assert registry.stats()[0]["riferimenti"] == len(frames)
@@ -0,0 +1,60 @@
+"""Test del campionamento a reservoir (``modules.sampling``): memoria, strati e intervalli di confidenza."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.analyzer import apply_filters, compute_statistics
+from modules.sampling import MIN_PER_STRATUM, Reservoir, draw_sample
+
+
+def make_frame(seed=0, rows=20_000):
+    rng = np.random.default_rng(seed)
+    # Strati molto sbilanciati: "raro" ha poche righe
+    gruppo = rng.choice(["grande", "medio", "raro"], rows, p=[0.8, 0.195, 0.005])
+    valore = rng.gamma(2.0, 10.0, rows) + np.where(gruppo == "raro", 200.0, 0.0)
+    return pd.DataFrame({"gruppo": gruppo, "valore": valore})
+
+
+def chunks(df, size):
+    return (df.iloc[start:start + size] for start in range(0, len(df), size))
+
+
+def test_stratified_reservoir_memory_is_bounded():
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame({"gruppo": rng.integers(0, 80, 50_000).astype(str), "valore": rng.random(50_000)})
+    reservoir = draw_sample(chunks(df, 5_000), size=500, strata="gruppo", seed=1)
+    sample = reservoir.sample()
+    assert len(sample) <= 500 + 80 * MIN_PER_STRATUM
+    # Ogni strato ha almeno MIN_PER_STRATUM righe (o tutte, se sono meno)
+    per_stratum = sample.df["gruppo"].value_counts()
+    assert (per_stratum >= np.minimum(MIN_PER_STRATUM, reservoir.stratum_sizes[per_stratum.index])).all()
+    assert set(per_stratum.index) == set(reservoir.stratum_sizes.index)
+    assert sample.weights.sum() == pytest.approx(len(df))
+
+
+@pytest.mark.parametrize("strata", [None, "gruppo"])
+def test_sample_does_not_depend_on_chunking(strata):
+    df = make_frame()
+    whole = Reservoir(1_000, strata, seed=5).add(df).sample()
+    chunked = draw_sample(chunks(df, 777), size=1_000, strata=strata, seed=5).sample()
+    pd.testing.assert_frame_equal(chunked.df, whole.df)
+    pd.testing.assert_series_equal(chunked.weights, whole.weights)
+
+
+@pytest.mark.parametrize("strata", [None, "gruppo"])
+@pytest.mark.parametrize("operation", ["Media", "Somma", "Conteggio"])
+def test_confidence_intervals_cover_exact_value(strata, operation):
+    df = make_frame()
+    filters = [("gruppo", "in", ["medio", "raro"])]
+    exact = compute_statistics(apply_filters(df, [], filters), ["valore"], operation)["valore"]
+    runs = 40
+    covered = 0
+    for seed in range(runs):
+        sample = draw_sample(chunks(df, 4_000), size=1_500, strata=strata, seed=seed).sample()
+        estimate = sample.statistics(apply_filters(sample.df, [], filters), ["valore"], operation)["valore"]
+        # Tolleranza per gli arrotondamenti: filtrando per strato il conteggio è esatto (IC di ampiezza zero)
+        slack = 1e-9 * abs(exact)
+        covered += estimate["IC min"] - slack <= exact <= estimate["IC max"] + slack
+    # IC al 95%: con 40 estrazioni ne bastano 34 per non dipendere dal caso
+    assert covered >= 34
@@ -0,0 +1,95 @@
+"""Test degli endpoint del servizio HTTP (``modules.service``)."""
+
+import json
+
+import pandas as pd
+import pytest
+from tornado.testing import AsyncHTTPTestCase
+
+from modules import service
+from modules.registry import DatasetRegistry
+
+CSV = b"regione,vendite,quantita\nnord,10.5,1\nsud,20,2\nnord,30,3\nest,5,4\n"
+
+
+class ServiceTest(AsyncHTTPTestCase):
+
+    @pytest.fixture(autouse=True)
+    def _database(self, temp_db, monkeypatch):
+        # Registro nuovo per ogni test: gli ID dei dataset si ripetono fra database temporanei
+        monkeypatch.setattr(service, "get_registry", lambda: DatasetRegistry(budget_mb=0))
+
+    def get_app(self):
+        return service.make_app(workers=2)
+
+    def post_json(self, path, body):
+        return self.fetch(path, method="POST", body=json.dumps(body))
+
+    def upload(self):
+        response = self.fetch("/datasets?name=vendite.csv", method="POST", body=CSV)
+        assert response.code == 201
+        return json.loads(response.body)["id"]
+
+    def test_upload_and_list(self):
+        dataset_id = self.upload()
+        # Lo stesso file una seconda volta è un duplicato
+        again = self.fetch("/datasets?name=vendite.csv", method="POST", body=CSV)
+        assert again.code == 200 and json.loads(again.body) == {
+            "id": dataset_id, "created": False, "rows": 4, "columns": ["regione", "vendite", "quantita"]}
+        assert [d["name"] for d in json.loads(self.fetch("/datasets").body)] == ["vendite.csv"]
+        assert self.fetch("/datasets/999").code == 404
+
+    def test_filter_pages_result(self):
+        dataset_id = self.upload()
+        response = self.post_json(f"/datasets/{dataset_id}/filter", {
+            "filters": [{"column": "regione", "op": "in", "value": ["nord", "est"]}],
+            "columns": ["regione", "vendite"], "offset": 1, "limit": 1})
+        assert response.code == 200
+        assert json.loads(response.body) == {"total": 3, "offset": 1,
+                                             "rows": [{"regione": "nord", "vendite": 30.0}]}
+
+    def test_statistics(self):
+        dataset_id = self.upload()
+        response = self.post_json(f"/datasets/{dataset_id}/statistics", {
+            "filters": [["vendite", "between", [10, 30]]], "columns": ["vendite", "quantita"], "operation": "Somma"})
+        assert json.loads(response.body) == {"operation": "Somma", "rows": 3,
+                                             "results": {"vendite": 60.5, "quantita": 6}}
+
+    def test_aggregate(self):
+        dataset_id = self.upload()
+        response = self.post_json(f"/datasets/{dataset_id}/aggregate",
+                                  {"group_by": "regione", "values": ["vendite"], "op": "sum"})
+        assert json.loads(response.body)["rows"] == [{"regione": "nord", "vendite": 40.5},
+                                                     {"regione": "sud", "vendite": 20.0},
+                                                     {"regione": "est", "vendite": 5.0}]
+
+    def test_export_csv(self):
+        dataset_id = self.upload()
+        response = self.post_json(f"/datasets/{dataset_id}/export", {
+            "filters": [["regione", "not_in", ["nord"]]], "columns": ["regione"], "format": "csv"})
+        assert response.code == 200 and response.headers["Content-Type"] == "text/csv"
+        assert response.body.decode("utf-8-sig").split() == ["regione", "sud", "est"]
+
+    def test_malformed_requests_are_rejected(self):
+        dataset_id = self.upload()
+        cases = [
+            ("filter", {"filters": [["vendite", "between", 5]]}),
+            ("filter", {"filters": [["regione", "in", 5]]}),
+            ("filter", {"filters": [["vendite", "between", [0, "z"]]]}),
+            ("filter", {"filters": [["regione", "between", ["a", "z"]], ["vendite", "between", ["a", "z"]]]}),
+            ("filter", {"filters": [["vendite", "like", "x"]]}),
+            ("filter", {"filters": {"column": "vendite"}}),
+            ("filter", {"filters": [["manca", "in", []]]}),
+            ("filter", {"limit": "tanti"}),
+            ("statistics", {"operation": "Nope"}),
+            ("aggregate", {"group_by": "regione", "values": ["vendite"], "op": "nope"}),
+            ("aggregate", {"group_by": ["regione"], "values": ["vendite"]}),
+            ("aggregate", {"group_by": "regione", "values": ["manca"]}),
+            ("chart", {"format": "gif"}),
+            ("export", {"format": "parquet"}),
+        ]
+        for endpoint, body in cases:
+            response = self.post_json(f"/datasets/{dataset_id}/{endpoint}", body)
+            assert response.code == 400, (endpoint, body, response.body)
+            assert "error" in json.loads(response.body)
+        assert self.fetch(f"/datasets/{dataset_id}/filter", method="POST", body="[1, 2").code == 400
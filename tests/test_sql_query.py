@@ -0,0 +1,120 @@
+"""Test delle query SQL dei dataset ``table`` confrontate con le funzioni pandas di ``modules.analyzer``."""
+
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import database
+from modules import exporter, sql_query
+from modules.analyzer import aggregate, apply_filters, compute_statistics, resample_aggregate
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(1)
+    rows = 2_000
+    df = pd.DataFrame({
+        "id": np.arange(rows),
+        "valore": rng.normal(100, 20, rows),
+        "codice": [f"c{i}" for i in rng.integers(0, 800, rows)],
+        "gruppo": rng.choice(["nord", "sud", "est"], rows),
+        "quando": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 90 * 24 * 60, rows), unit="min"),
+    })
+    df.loc[::11, "valore"] = np.nan
+    df.loc[::13, "gruppo"] = None
+    return df
+
+
+@pytest.fixture
+def table_id(temp_db, frame):
+    dataset_id, status = database.save_dataset_version("sql.csv", frame, storage="table")
+    assert status == "created"
+    return dataset_id
+
+
+FILTERS = [
+    [("valore", "between", (90.0, 110.0))],
+    [("gruppo", "in", ["nord", "est"])],
+    [("gruppo", "in", [])],
+    [("gruppo", "not_in", ["sud"])],
+    [("gruppo", "not_in", [])],
+    [("quando", "between", (pd.Timestamp("2024-02-01"), pd.Timestamp("2024-02-15 12:00")))],
+    [("valore", "between", (80.0, 120.0)), ("gruppo", "not_in", ["est"])],
+]
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_query_dataset_matches_apply_filters(frame, table_id, filters):
+    columns = list(frame.columns)
+    expected = apply_filters(frame, columns, filters)[columns].reset_index(drop=True)
+    result = database.query_dataset(table_id, columns=columns, filters=filters)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    assert database.count_rows(table_id, filters=filters) == len(expected)
+
+
+@pytest.mark.parametrize("op", ["in", "not_in"])
+def test_long_value_lists_use_json_each(frame, table_id, op):
+    values = sorted(frame["codice"].unique())[:sql_query.MAX_INLINE_VALUES + 50]
+    where, params = sql_query.where_clause([("codice", op, values)])
+    assert "json_each" in where and len(params) == 1
+
+    filters = [("codice", op, values)]
+    expected = apply_filters(frame, ["id"], filters)["id"].tolist()
+    assert database.query_dataset(table_id, columns=["id"], filters=filters)["id"].tolist() == expected
+
+
+@pytest.mark.parametrize("operation", ["Media", "Somma", "Conteggio", "Massimo", "Minimo"])
+def test_statistics_match_pandas(frame, table_id, operation):
+    filters = FILTERS[1]
+    expected = compute_statistics(apply_filters(frame, [], filters), ["valore", "id"], operation)
+    result = database.query_statistics(table_id, None, ["valore", "id"], operation, filters)
+    assert result == pytest.approx(expected)
+
+
+def test_aggregate_matches_pandas(frame, table_id):
+    expected = aggregate(frame, "gruppo", ["valore"], "mean").reset_index(drop=True)
+    result = database.query_aggregate(table_id, None, "gruppo", ["valore"], "mean")
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+@pytest.mark.parametrize("freq", ["h", "D", "MS"])
+@pytest.mark.parametrize("operation", ["sum", "count", "max"])
+def test_resample_matches_pandas(frame, table_id, freq, operation):
+    filters = FILTERS[0]
+    filtered = apply_filters(frame, [], filters)
+    expected = resample_aggregate(filtered, "quando", ["valore"], freq, operation)
+    result = database.query_resample(table_id, None, "quando", ["valore"], freq, operation, filters)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_resample_keeps_utc_for_tz_columns(temp_db):
+    df = pd.DataFrame({"t": pd.date_range("2024-03-30", periods=72, freq="h", tz="Europe/Rome"),
+                       "x": np.arange(72.0)})
+    dataset_id, _ = database.save_dataset_version("tz.csv", df, storage="table")
+    result = database.query_resample(dataset_id, None, "t", ["x"], "D", "sum")
+    expected = resample_aggregate(df.assign(t=df["t"].dt.tz_convert("UTC")), "t", ["x"], "D", "sum")
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_column_bounds_with_filters(frame, table_id):
+    filters = FILTERS[1]
+    filtered = apply_filters(frame, [], filters)
+    assert database.column_bounds(table_id, None, "quando", filters) == (filtered["quando"].min(),
+                                                                         filtered["quando"].max())
+
+
+def test_streamed_export_matches_whole_frame(frame, table_id):
+    filters = FILTERS[3]
+    columns = ["id", "valore", "gruppo", "quando"]
+    whole = database.query_dataset(table_id, columns=columns, filters=filters)
+    chunks = list(database.iter_query_dataset(table_id, columns=columns, filters=filters, chunk_rows=250))
+    assert len(chunks) > 1 and all(len(c) <= 250 for c in chunks)
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), whole)
+
+    streamed, err = exporter.export_chunks_to_csv(iter(chunks))
+    assert err is None and streamed == exporter.export_to_csv(whole)[0]
+    data, err = exporter.export_chunks_to_excel(iter(chunks), "filtrato.xlsx")
+    assert err is None
+    pd.testing.assert_frame_equal(pd.read_excel(BytesIO(data)), whole, check_dtype=False)